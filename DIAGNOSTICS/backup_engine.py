@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Backup Engine
+Deduplikované přírůstkové zálohy: soubory se dělí na bloky podle obsahu
+(content-defined chunking), bloky se ukládají jednou pod svým SHA-256,
+každá záloha je jen manifest se seznamy bloků. Každou noc se zapíšou jen
+změněné bloky, komprese (zstd / lz4 / zlib) běží ve více vláknech
+"""
+
+import os
+import json
+import stat
+import zlib
+import time
+import fnmatch
+import hashlib
+import logging
+import argparse
+import datetime
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CHUNKS_DIR = "chunks"
+SNAPSHOTS_DIR = "snapshots"
+
+# Velikosti bloků (FastCDC s normalizací kolem průměru)
+MIN_CHUNK = 256 * 1024
+AVG_CHUNK = 1024 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+READ_BUFFER = 8 * 1024 * 1024
+
+# SQLite mění celé stránky na místě, obsah se neposouvá - pevné bloky
+# zarovnané na stránky deduplikují stejně dobře a bez počítání hashe
+SQLITE_HEADER = b"SQLite format 3\x00"
+FIXED_CHUNK = 1024 * 1024
+
+# Gear hash v čistém Pythonu zvládne jednotky MB/s - podle obsahu se dělí jen
+# malé soubory (YAML, JSON v .storage), kde se obsah posouvá vkládáním řádků.
+# Velké soubory a média (nahrávky, snímky) se nepřepisují uprostřed, stačí pevné bloky
+CDC_MAX_FILE = 16 * 1024 * 1024
+FIXED_SUFFIXES = (
+    ".mp4", ".mkv", ".avi", ".mov", ".ts", ".mp3", ".wav", ".flac", ".ogg", ".m4a",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".zip", ".gz", ".tar", ".xz", ".zst", ".7z", ".bin"
+)
+
+# Gear tabulka: 256 deterministických 64bitových hodnot
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'little') for i in range(256)]
+_MASK64 = (1 << 64) - 1
+# Přísnější maska před průměrnou velikostí, volnější za ní (horní bity hashe)
+_MASK_SMALL = ((1 << 22) - 1) << 42
+_MASK_LARGE = ((1 << 18) - 1) << 46
+
+# Kodek je první bajt uloženého bloku
+CODEC_NONE = b"N"
+CODEC_ZLIB = b"G"
+CODEC_ZSTD = b"Z"
+CODEC_LZ4 = b"L"
+
+# Retence podle úrovní backups/ z optimalizované struktury (úroveň: počet záloh, perioda ve dnech)
+RETENTION = {
+    "daily": (7, 1),
+    "weekly": (4, 7),
+    "monthly": (12, 30),
+    "yearly": (3, 365),
+}
+
+DEFAULT_EXCLUDE = ("*.log", "*.log.[0-9]*", "*.db-shm", "__pycache__", "tts", "*.ha_partial", "ha_registry_cache")
+
+
+def _compressor():
+    if zstandard is not None:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=3).compress
+    if lz4 is not None:
+        return CODEC_LZ4, lz4.frame.compress
+    return CODEC_ZLIB, lambda data: zlib.compress(data, 1)
+
+
+def decompress(blob: bytes) -> bytes:
+    codec, payload = blob[:1], blob[1:]
+    if codec == CODEC_NONE:
+        return payload
+    if codec == CODEC_ZLIB:
+        return zlib.decompress(payload)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Blok je komprimovaný zstd - nainstalujte 'zstandard'")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == CODEC_LZ4:
+        if lz4 is None:
+            raise RuntimeError("Blok je komprimovaný lz4 - nainstalujte 'lz4'")
+        return lz4.frame.decompress(payload)
+    raise ValueError(f"Neznámý kodek bloku: {codec!r}")
+
+
+def cut_point(data: bytes, start: int, end: int) -> int:
+    """Konec bloku začínajícího na start (FastCDC); end je konec dostupných dat"""
+    if end - start <= MIN_CHUNK:
+        return end
+    limit = min(end, start + MAX_CHUNK)
+    normal = min(limit, start + AVG_CHUNK)
+    gear, mask64 = _GEAR, _MASK64
+    h = 0
+    position = start + MIN_CHUNK
+    for byte in data[position:normal]:
+        h = ((h << 1) + gear[byte]) & mask64
+        position += 1
+        if not h & _MASK_SMALL:
+            return position
+    for byte in data[position:limit]:
+        h = ((h << 1) + gear[byte]) & mask64
+        position += 1
+        if not h & _MASK_LARGE:
+            return position
+    return limit
+
+
+def uses_fixed_chunks(path: Path, size: int, header: bytes) -> bool:
+    """Pevné bloky pro SQLite, velké soubory a média; podle obsahu jen malé textové soubory"""
+    return (header == SQLITE_HEADER or size > CDC_MAX_FILE
+            or Path(path).suffix.lower() in FIXED_SUFFIXES)
+
+
+def iter_chunks(path: Path) -> Iterator[bytes]:
+    """Bloky souboru - podle obsahu, u SQLite databází, velkých souborů a médií pevné"""
+    with open(path, 'rb') as f:
+        fixed = uses_fixed_chunks(path, os.fstat(f.fileno()).st_size, f.read(len(SQLITE_HEADER)))
+        f.seek(0)
+        if fixed:
+            while True:
+                chunk = f.read(FIXED_CHUNK)
+                if not chunk:
+                    return
+                yield chunk
+
+        buffer = b""
+        position = 0
+        eof = False
+        while True:
+            # Před hledáním konce bloku musí být k dispozici celé maximum (nebo konec souboru)
+            while not eof and len(buffer) - position < MAX_CHUNK:
+                data = f.read(READ_BUFFER)
+                eof = not data
+                buffer = buffer[position:] + data
+                position = 0
+            if position >= len(buffer):
+                return
+            end = cut_point(buffer, position, len(buffer))
+            yield buffer[position:end]
+            position = end
+
+
+def _excluded(relative: str, exclude) -> bool:
+    parts = relative.split("/")
+    return any(fnmatch.fnmatch(part, pattern) for pattern in exclude for part in parts)
+
+
+class BackupRepository:
+    """Úložiště záloh: chunks/<2 znaky>/<sha256> a snapshots/<id>.json"""
+
+    def __init__(self, path: Path, jobs: int = 4):
+        self.path = Path(path)
+        self.jobs = jobs
+        self.chunks_path = self.path / CHUNKS_DIR
+        self.snapshots_path = self.path / SNAPSHOTS_DIR
+        self.chunks_path.mkdir(parents=True, exist_ok=True)
+        self.snapshots_path.mkdir(parents=True, exist_ok=True)
+        self.index = self.load_index()
+
+    def load_index(self) -> Set[str]:
+        """Množina uložených bloků (jeden průchod adresáři místo stat na blok)"""
+        index = set()
+        for prefix in os.scandir(self.chunks_path):
+            if prefix.is_dir():
+                index.update(entry.name for entry in os.scandir(prefix.path) if not entry.name.endswith(".tmp"))
+        return index
+
+    def chunk_path(self, chunk_id: str) -> Path:
+        return self.chunks_path / chunk_id[:2] / chunk_id
+
+    def store_chunk(self, chunk_id: str, data: bytes) -> int:
+        """Komprese a zápis bloku (běží ve vláknech - zlib/zstd/lz4 uvolňují GIL)"""
+        codec, compress = _compressor()
+        payload = compress(data)
+        # Nekomprimovatelná data (fotky, videa) se uloží tak, jak jsou
+        blob = codec + payload if len(payload) < len(data) else CODEC_NONE + data
+
+        path = self.chunk_path(chunk_id)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(chunk_id + ".tmp")
+        with open(tmp, 'wb') as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return len(blob)
+
+    def read_chunk(self, chunk_id: str) -> bytes:
+        with open(self.chunk_path(chunk_id), 'rb') as f:
+            return decompress(f.read())
+
+    def snapshots(self) -> List[str]:
+        """Id záloh od nejstarší (id je časové razítko)"""
+        return sorted(entry.name[:-5] for entry in os.scandir(self.snapshots_path) if entry.name.endswith(".json"))
+
+    def load_snapshot(self, snapshot_id: str) -> Dict:
+        with open(self.snapshots_path / f"{snapshot_id}.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def write_snapshot(self, manifest: Dict):
+        path = self.snapshots_path / f"{manifest['id']}.json"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def backup(self, source: Path, exclude=DEFAULT_EXCLUDE, snapshot_id: str = None,
+               substitutes: Dict[str, Path] = None) -> Dict:
+        """Nová záloha; nezměněné soubory (velikost, mtime, inode) převezme z poslední bez čtení
+
+        substitutes: relativní cesta -> soubor, který se zálohuje místo ní
+        (konzistentní snímek databáze recorderu místo živého souboru a jeho -wal)
+        """
+        source = Path(source)
+        substitutes = substitutes or {}
+        replaced = {f"{relative}{suffix}" for relative in substitutes for suffix in ("-wal", "-journal")}
+        existing = self.snapshots()
+        snapshot_id = snapshot_id or datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        if snapshot_id in existing:
+            snapshot_id += f".{sum(other.startswith(snapshot_id) for other in existing)}"
+        previous = self.load_snapshot(existing[-1])["files"] if existing else {}
+
+        files: Dict[str, Dict] = {}
+        stats = {"files": 0, "unchanged": 0, "chunks": 0, "new_chunks": 0, "bytes": 0, "stored_bytes": 0}
+        pending = []
+        started = time.monotonic()
+
+        def collect(limit):
+            while len(pending) > limit:
+                stats["stored_bytes"] += pending.pop(0).result()
+
+        def iter_entries():
+            for relative, info in self.iter_source(source, exclude):
+                if relative not in substitutes and relative not in replaced:
+                    yield relative, info, source / relative
+            for relative, path in substitutes.items():
+                yield relative, os.stat(path), Path(path)
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for relative, info, path in iter_entries():
+                entry = {"size": info.st_size, "mtime_ns": info.st_mtime_ns, "mode": info.st_mode, "inode": info.st_ino}
+
+                if stat.S_ISDIR(info.st_mode):
+                    entry["dir"] = True
+                    files[relative] = entry
+                    continue
+                stats["files"] += 1
+                if stat.S_ISLNK(info.st_mode):
+                    entry["link"] = os.readlink(path)
+                    files[relative] = entry
+                    continue
+
+                old = previous.get(relative)
+                if old and all(old.get(key) == entry[key] for key in ("size", "mtime_ns", "inode")) \
+                        and all(chunk_id in self.index for chunk_id in old["chunks"]):
+                    entry["chunks"] = old["chunks"]
+                    files[relative] = entry
+                    stats["unchanged"] += 1
+                    continue
+
+                chunks = []
+                try:
+                    for data in iter_chunks(path):
+                        chunk_id = hashlib.sha256(data).hexdigest()
+                        chunks.append(chunk_id)
+                        stats["chunks"] += 1
+                        stats["bytes"] += len(data)
+                        if chunk_id not in self.index:
+                            self.index.add(chunk_id)
+                            stats["new_chunks"] += 1
+                            pending.append(executor.submit(self.store_chunk, chunk_id, data))
+                            # Omezený počet bloků v paměti
+                            collect(self.jobs * 4)
+                except OSError as e:
+                    logger.warning(f"Nelze zálohovat {relative}: {e}")
+                    continue
+                entry["chunks"] = chunks
+                files[relative] = entry
+            collect(0)
+
+        manifest = {"id": snapshot_id, "source": str(source), "created": time.time(), "stats": stats, "files": files}
+        self.write_snapshot(manifest)
+        logger.info(
+            f"💾 Záloha {snapshot_id}: {stats['files']} souborů ({stats['unchanged']} beze změny), "
+            f"nových bloků {stats['new_chunks']}/{stats['chunks']}, zapsáno {stats['stored_bytes'] / 1e6:.1f} MB "
+            f"za {time.monotonic() - started:.1f} s"
+        )
+        return manifest
+
+    def iter_source(self, source: Path, exclude) -> Iterator[Tuple[str, os.stat_result]]:
+        stack = [source]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                logger.warning(f"Nelze číst {directory}: {e}")
+                continue
+            for entry in entries:
+                relative = os.path.relpath(entry.path, source).replace(os.sep, "/")
+                if _excluded(relative, exclude):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                    yield relative, entry.stat(follow_symlinks=False)
+                elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                    yield relative, entry.stat(follow_symlinks=False)
+
+    def restore(self, snapshot_id: str, target: Path):
+        target = Path(target)
+        manifest = self.load_snapshot(snapshot_id)
+        for relative, entry in manifest["files"].items():
+            path = target / relative
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if entry.get("dir"):
+                path.mkdir(exist_ok=True)
+                os.chmod(path, entry["mode"] & 0o7777)
+                continue
+            if "link" in entry:
+                if os.path.lexists(path):
+                    path.unlink()
+                os.symlink(entry["link"], path)
+                continue
+            with open(path, 'wb') as f:
+                for chunk_id in entry["chunks"]:
+                    f.write(self.read_chunk(chunk_id))
+            os.chmod(path, entry["mode"] & 0o7777)
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        logger.info(f"♻️  Záloha {snapshot_id} obnovena do {target} ({manifest['stats']['files']} souborů)")
+
+    def transfer(self, snapshot_id: str, other: "BackupRepository") -> int:
+        """Zkopíruje zálohu do jiného úložiště (jiná úroveň) - jen bloky, které tam chybí"""
+        manifest = self.load_snapshot(snapshot_id)
+        copied = 0
+        for entry in manifest["files"].values():
+            for chunk_id in entry.get("chunks", []):
+                if chunk_id in other.index:
+                    continue
+                with open(self.chunk_path(chunk_id), 'rb') as f:
+                    blob = f.read()
+                path = other.chunk_path(chunk_id)
+                path.parent.mkdir(exist_ok=True)
+                tmp = path.with_name(chunk_id + ".tmp")
+                with open(tmp, 'wb') as f:
+                    f.write(blob)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+                other.index.add(chunk_id)
+                copied += len(blob)
+        other.write_snapshot(manifest)
+        logger.info(f"📦 Záloha {snapshot_id} -> {other.path} (zapsáno {copied / 1e6:.1f} MB)")
+        return copied
+
+    def prune(self, keep: int) -> Tuple[int, int]:
+        """Ponechá posledních keep záloh a smaže bloky, na které už nic neodkazuje"""
+        snapshots = self.snapshots()
+        removed = snapshots[:-keep] if keep else snapshots
+        for snapshot_id in removed:
+            (self.snapshots_path / f"{snapshot_id}.json").unlink()
+
+        referenced = set()
+        for snapshot_id in self.snapshots():
+            for entry in self.load_snapshot(snapshot_id)["files"].values():
+                referenced.update(entry.get("chunks", []))
+
+        freed = 0
+        for chunk_id in self.index - referenced:
+            path = self.chunk_path(chunk_id)
+            try:
+                freed += path.stat().st_size
+                path.unlink()
+            except OSError:
+                pass
+        self.index &= referenced
+        if removed:
+            logger.info(f"🧹 {self.path}: smazáno {len(removed)} záloh, uvolněno {freed / 1e6:.1f} MB")
+        return len(removed), freed
+
+
+def snapshot_age_days(snapshot_id: str) -> float:
+    created = datetime.datetime.strptime(snapshot_id[:15], "%Y%m%dT%H%M%S")
+    return (datetime.datetime.now() - created).total_seconds() / 86400
+
+
+def tier_directories(layout: Dict[str, List[str]]) -> Dict[str, Path]:
+    """Úrovně záloh (daily/weekly/...) podle adresářů backups/<úroveň> v layoutu, jen existující"""
+    tiers = {}
+    for base_path, directories in layout.items():
+        for directory in directories:
+            tier = directory.split("/")[-1]
+            if directory.startswith("backups/") and tier in RETENTION and os.path.isdir(os.path.join(base_path, directory)):
+                tiers[tier] = Path(base_path) / directory
+    return tiers
+
+
+def run_tiered_backup(source: Path, tiers: Dict[str, Path], jobs: int = 4, exclude=DEFAULT_EXCLUDE,
+                      substitutes: Dict[str, Path] = None) -> Optional[Dict]:
+    """Denní záloha do první úrovně; do vyšších úrovní se přenese, když je jejich poslední záloha starší než perioda"""
+    ordered = [tier for tier in RETENTION if tier in tiers]
+    if not ordered:
+        logger.error("❌ Žádný adresář backups/<úroveň> neexistuje")
+        return None
+
+    primary = BackupRepository(tiers[ordered[0]], jobs)
+    manifest = primary.backup(source, exclude, substitutes=substitutes)
+
+    for tier in ordered[1:]:
+        repository = BackupRepository(tiers[tier], jobs)
+        existing = repository.snapshots()
+        if not existing or snapshot_age_days(existing[-1]) >= RETENTION[tier][1] - 0.5:
+            primary.transfer(manifest["id"], repository)
+        repository.prune(RETENTION[tier][0])
+
+    primary.prune(RETENTION[ordered[0]][0])
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Backup Engine")
+    parser.add_argument("--repo", type=Path, required=True, help="Adresář úložiště záloh")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Počet vláken pro kompresi (výchozí: 4)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    backup = subparsers.add_parser("backup", help="Nová záloha")
+    backup.add_argument("source", type=Path, help="Zálohovaný adresář (např. /config)")
+    backup.add_argument("--exclude", action="append", default=None,
+                        help=f"Vynechat jména podle masky (výchozí: {' '.join(DEFAULT_EXCLUDE)})")
+
+    subparsers.add_parser("list", help="Seznam záloh")
+
+    restore = subparsers.add_parser("restore", help="Obnova zálohy")
+    restore.add_argument("snapshot", help="Id zálohy")
+    restore.add_argument("target", type=Path, help="Cílový adresář")
+
+    prune = subparsers.add_parser("prune", help="Smazání starých záloh a nepoužitých bloků")
+    prune.add_argument("--keep", type=int, required=True, help="Kolik posledních záloh ponechat")
+
+    args = parser.parse_args()
+    repository = BackupRepository(args.repo, args.jobs)
+
+    if args.command == "backup":
+        repository.backup(args.source, tuple(args.exclude) if args.exclude else DEFAULT_EXCLUDE)
+    elif args.command == "list":
+        for snapshot_id in repository.snapshots():
+            stats = repository.load_snapshot(snapshot_id)["stats"]
+            print(f"{snapshot_id}: {stats['files']} souborů, {stats['bytes'] / 1e6:.1f} MB čteno, "
+                  f"{stats['stored_bytes'] / 1e6:.1f} MB zapsáno")
+    elif args.command == "restore":
+        repository.restore(args.snapshot, args.target)
+    else:
+        repository.prune(args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Dead Entity Detector
+Entity, které se dlouho nezměnily, na které nic neodkazuje nebo patří
+zařízení bez oblasti / smazanému zařízení - s odhadem, kolik řádků
+a bajtů recorderu ušetří jejich vypnutí. Aktivita z recorderu jedním
+GROUP BY dotazem, spojení s registry a indexem odkazů přes slovníky
+"""
+
+import json
+import argparse
+import datetime
+import logging
+from typing import Dict, List, Optional
+
+from device_structure_scan import HomeAssistantDeviceScanner
+from recorder_analyzer import STATE_ROW_OVERHEAD
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_STALE_DAYS = 7
+SECONDS_PER_DAY = 86400
+
+# Tyto domény se nemění z principu - bez změny stavu nejsou "mrtvé"
+IGNORED_DOMAINS = {"automation", "script", "scene", "zone", "person", "input_button", "button", "update"}
+
+
+def detect_dead_entities(scanner: HomeAssistantDeviceScanner, stale_days: float = DEFAULT_STALE_DAYS,
+                         registry: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """Označí entity (stale / unreferenced / orphaned_device) a seřadí je podle úspory zápisů"""
+    if scanner.recorder is None:
+        logger.error("Recorder není načtený - spusťte nejdřív scan_from_database()")
+        return []
+    if scanner.references is None:
+        scanner.scan_automations_and_scripts()
+    registry = scanner.registries.entities.index() if registry is None else registry
+
+    logger.info("Načítám aktivitu entit z recorderu...")
+    activity = {row[0]: row[1:] for row in scanner.recorder.entity_activity()}
+    if not activity:
+        return []
+
+    # Okno uchování recorderu (purge_keep_days) - z nejstaršího a nejnovějšího zápisu
+    window_start = min(row[2] for row in activity.values() if row[2] is not None)
+    now = max(row[4] for row in activity.values() if row[4] is not None)
+    window_days = max((now - window_start) / SECONDS_PER_DAY, 1 / 24)
+    stale_before = now - stale_days * SECONDS_PER_DAY
+
+    devices = scanner.scan_results["devices"]
+    areas = scanner.scan_results["areas"]
+    references = scanner.references
+
+    flagged = []
+    for entity_id, (rows, changes, first_updated, last_changed, last_updated,
+                    state_bytes, attribute_bytes) in activity.items():
+        if entity_id.split(".", 1)[0] in IGNORED_DOMAINS:
+            continue
+        entry = registry.get(entity_id) or {}
+        if entry.get("disabled_by"):
+            continue
+
+        flags = []
+        # Zapisuje se (atributy), ale stav se v okně nezměnil
+        if last_changed is not None and last_changed < stale_before and first_updated < stale_before:
+            flags.append("stale")
+        if not references.is_used(entity_id):
+            flags.append("unreferenced")
+
+        device_id = entry.get("device_id")
+        device = devices.get(device_id) if device_id else None
+        if device_id and device is None:
+            flags.append("orphaned_device")          # zařízení z registru zmizelo
+        elif device is not None and not device.area_id:
+            flags.append("orphaned_device")          # zařízení bez oblasti
+
+        if not flags:
+            continue
+
+        # Atributy bývají u "stale" entit většina zápisů (stav stojí, atributy se mění)
+        total_bytes = rows * STATE_ROW_OVERHEAD + (state_bytes or 0) + (attribute_bytes or 0)
+        flagged.append({
+            "entity_id": entity_id,
+            "flags": flags,
+            "last_changed": datetime.datetime.fromtimestamp(last_changed).isoformat() if last_changed else None,
+            "changes": changes or 0,
+            "rows": rows,
+            "rows_per_day": round(rows / window_days, 1),
+            "bytes": total_bytes,
+            "attribute_bytes": attribute_bytes or 0,
+            "bytes_per_day": round(total_bytes / window_days),
+            "device": device.name if device else device_id,
+            "area": areas[device.area_id].name if device and device.area_id in areas else None,
+            "platform": entry.get("platform")
+        })
+
+    # Víc příznaků = jistější kandidát; samotné "unreferenced" (jen historie/grafy) jde na konec
+    flagged.sort(key=lambda item: (len(item["flags"]), item["bytes"]), reverse=True)
+    logger.info(f"Označeno {len(flagged)} entit z {len(activity)} (okno recorderu {window_days:.1f} dní)")
+    return flagged
+
+
+def summarize(flagged: List[Dict]) -> Dict:
+    return {
+        "entities": len(flagged),
+        "rows_per_day": round(sum(item["rows_per_day"] for item in flagged), 1),
+        "bytes_per_day": sum(item["bytes_per_day"] for item in flagged),
+        "by_flag": {
+            flag: sum(flag in item["flags"] for item in flagged)
+            for flag in ("stale", "unreferenced", "orphaned_device")
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Dead Entity Detector")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--db-url", help="URL databáze recorderu (výchozí: recorder.db_url z konfigurace)")
+    parser.add_argument("--ha-stopped", action="store_true", help="HA je zastavený - databáze jako immutable")
+    parser.add_argument("--stale-days", type=float, default=DEFAULT_STALE_DAYS,
+                        help=f"Bez změny stavu déle než N dní = stale (výchozí: {DEFAULT_STALE_DAYS})")
+    parser.add_argument("--top", type=int, default=30, help="Počet vypsaných entit (výchozí: 30)")
+    parser.add_argument("--output", help="Uložit celý výsledek jako JSON")
+    args = parser.parse_args()
+
+    scanner = HomeAssistantDeviceScanner(args.config, ha_stopped=args.ha_stopped, db_url=args.db_url)
+    scanner.scan_from_database()
+    scanner.scan_from_config_files()
+    flagged = detect_dead_entities(scanner, args.stale_days)
+    summary = summarize(flagged)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "entities": flagged}, f, indent=2, ensure_ascii=False)
+
+    print(f"💤 MRTVÉ A OSIŘELÉ ENTITY: {summary['entities']}")
+    print(f"   stale: {summary['by_flag']['stale']}, bez odkazu: {summary['by_flag']['unreferenced']}, "
+          f"osiřelé zařízení: {summary['by_flag']['orphaned_device']}")
+    print("   (unreferenced = bez odkazu z automatizací, skriptů a šablon; dashboardy se nekontrolují)")
+    print(f"   Vypnutím ušetříte ~{summary['rows_per_day']:.0f} řádků / "
+          f"{summary['bytes_per_day'] / 1e6:.2f} MB za den")
+    print("-" * 40)
+    for item in flagged[:args.top]:
+        print(f"{item['entity_id']} [{', '.join(item['flags'])}]: {item['rows_per_day']:.0f} řádků/den, "
+              f"{item['bytes_per_day'] / 1e3:.1f} kB/den, poslední změna {item['last_changed'] or '?'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,36 @@ Prozkoumá celou instalaci a vygeneruje podrobný report
 
 import os
 import json
-import yaml
+import argparse
 import subprocess
 import datetime
 from pathlib import Path
 import hashlib
+import sys
 import logging
-from typing import Dict, List, Any
+import sqlite3
+from typing import Dict, Any
+
+from scan_cache import ScanCache, hash_content
+from scan_history import file_scan_items, record_scan
+
+# Společný YAML engine sdílený s scripts/validate_ha_config.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from ha_yaml_engine import ParseResult, parse_files, add_jobs_argument
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SCAN_CACHE_FILE = "ha_scanner_cache.db"
+
 class HomeAssistantScanner:
-    def __init__(self, config_path: str = "/config"):
+    def __init__(self, config_path: str = "/config", use_cache: bool = True, jobs: int = None,
+                 use_history: bool = True):
         self.config_path = Path(config_path)
+        self.use_cache = use_cache
+        self.use_history = use_history
+        self.history_scan_id = None
+        self.jobs = jobs
         self.scan_results = {
             "scan_date": datetime.datetime.now().isoformat(),
             "system_info": {},
@@ -34,6 +50,10 @@ class HomeAssistantScanner:
             "issues": [],
             "recommendations": []
         }
+        # Strom souborů z jednoho průchodu (viz build_file_tree)
+        self._file_tree = None
+        self._tree_index = {}
+        self._stat_index = {}
     
     def get_system_info(self):
         """Získá informace o systému"""
@@ -55,76 +75,187 @@ class HomeAssistantScanner:
         # Informace o adresáři
         self.scan_results["system_info"]["config_path"] = str(self.config_path)
         self.scan_results["system_info"]["total_size"] = self.get_directory_size(self.config_path)
-        
-    def get_directory_structure(self):
-        """Získá kompletní strukturu adresářů"""
-        logger.info("Skenuji strukturu adresářů...")
-        
-        def scan_dir(path: Path, level: int = 0):
-            structure = {
-                "name": path.name,
-                "path": str(path),
+    
+    def build_file_tree(self) -> Dict:
+        """Jedním průchodem (os.scandir) načte strom souborů a sečte velikosti adresářů
+        
+        Každý soubor se stat-uje právě jednou, velikosti se přičítají zdola
+        nahoru do rodičovských adresářů. Výsledek se drží v paměti a čtou
+        z něj všechny další kroky skenu.
+        """
+        if self._file_tree is not None:
+            return self._file_tree
+        
+        logger.info("Načítám strom souborů...")
+        
+        def scan_dir(path: str, name: str) -> Dict:
+            node = {
+                "name": name,
+                "path": path,
                 "type": "directory",
-                "size": self.get_directory_size(path),
+                "size": 0,
                 "children": []
             }
+            self._tree_index[path] = node
             
             try:
-                for item in path.iterdir():
-                    if item.is_dir():
-                        if level < 5:  # Omezení hloubky rekurze
-                            structure["children"].append(scan_dir(item, level + 1))
-                    else:
-                        file_info = {
-                            "name": item.name,
-                            "path": str(item),
-                            "type": "file",
-                            "size": item.stat().st_size,
-                            "modified": datetime.datetime.fromtimestamp(item.stat().st_mtime).isoformat()
-                        }
-                        structure["children"].append(file_info)
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                child = scan_dir(entry.path, entry.name)
+                            else:
+                                st = entry.stat(follow_symlinks=False)
+                                child = {
+                                    "name": entry.name,
+                                    "path": entry.path,
+                                    "type": "file",
+                                    "size": st.st_size,
+                                    "modified": datetime.datetime.fromtimestamp(st.st_mtime).isoformat()
+                                }
+                                self._tree_index[entry.path] = child
+                                self._stat_index[entry.path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+                        except OSError:
+                            continue
+                        node["size"] += child["size"]
+                        node["children"].append(child)
             except PermissionError:
-                structure["error"] = "Permission denied"
+                node["error"] = "Permission denied"
+            except OSError as e:
+                node["error"] = str(e)
+            
+            return node
+        
+        self._file_tree = scan_dir(str(self.config_path), self.config_path.name)
+        return self._file_tree
+    
+    def iter_tree_files(self, root: Path = None, suffixes: tuple = None):
+        """Prochází soubory z načteného stromu (volitelně jen s danými příponami)"""
+        self.build_file_tree()
+        node = self._tree_index.get(str(root or self.config_path))
+        if node is None or node["type"] != "directory":
+            return
+        
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for child in current["children"]:
+                if child["type"] == "directory":
+                    stack.append(child)
+                elif suffixes is None or child["name"].endswith(suffixes):
+                    yield child
+        
+    def get_directory_structure(self):
+        """Získá kompletní strukturu adresářů"""
+        logger.info("Skenuji strukturu adresářů...")
+        
+        def copy_dir(node: Dict, level: int = 0):
+            structure = {key: value for key, value in node.items() if key != "children"}
+            structure["children"] = []
+            
+            for child in node["children"]:
+                if child["type"] == "directory":
+                    if level < 5:  # Omezení hloubky rekurze
+                        structure["children"].append(copy_dir(child, level + 1))
+                else:
+                    structure["children"].append(child)
             
             return structure
         
-        self.scan_results["directory_structure"] = scan_dir(self.config_path)
+        self.scan_results["directory_structure"] = copy_dir(self.build_file_tree())
     
     def analyze_configuration_files(self):
         """Analyzuje všechny konfigurační soubory"""
         logger.info("Analyzuji konfigurační soubory...")
         
-        yaml_files = list(self.config_path.glob("**/*.yaml")) + list(self.config_path.glob("**/*.yml"))
+        yaml_files = [
+            Path(file_node["path"])
+            for file_node in self.iter_tree_files(suffixes=(".yaml", ".yml"))
+        ]
+        cache = self.open_scan_cache()
+        pending = {}
         
         for yaml_file in yaml_files:
+            path_key = str(yaml_file)
+            size, mtime_ns, inode = self._stat_index[path_key]
             try:
-                with open(yaml_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                file_analysis = {
-                    "size": yaml_file.stat().st_size,
-                    "lines": len(content.splitlines()),
-                    "is_valid_yaml": True,
-                    "entities_found": [],
-                    "errors": []
-                }
-                
-                # Validace YAML
-                try:
-                    data = yaml.safe_load(content)
-                    if data:
-                        # Analýza obsahu
-                        self.analyze_yaml_content(yaml_file.name, data, file_analysis)
-                except yaml.YAMLError as e:
-                    file_analysis["is_valid_yaml"] = False
-                    file_analysis["errors"].append(f"YAML chyba: {e}")
+                cached = cache.lookup(path_key, size, mtime_ns, inode) if cache else None
+                if cached is None:
+                    with open(yaml_file, 'rb') as f:
+                        raw = f.read()
+                    content_hash = hash_content(raw)
+                    
+                    cached = cache.lookup_by_hash(path_key, content_hash) if cache else None
+                    if cached is None:
+                        # Parsování proběhne hromadně (paralelně) níže
+                        pending[path_key] = (size, mtime_ns, inode, content_hash, len(raw.decode('utf-8').splitlines()))
+                        continue
+                    if cache:
+                        cache.store(path_key, size, mtime_ns, inode, content_hash, cached)
                 
-                self.scan_results["file_analysis"][str(yaml_file)] = file_analysis
+                self.store_file_analysis(path_key, cached)
                 
             except Exception as e:
-                self.scan_results["file_analysis"][str(yaml_file)] = {
+                self.scan_results["file_analysis"][path_key] = {
                     "error": f"Chyba při čtení: {e}"
                 }
+        
+        for result in parse_files(pending, jobs=self.jobs):
+            size, mtime_ns, inode, content_hash, lines = pending[result.path]
+            if result.error is not None and not result.is_yaml_error:
+                self.scan_results["file_analysis"][result.path] = {
+                    "error": f"Chyba při čtení: {result.error}"
+                }
+                continue
+            
+            analysis = self.analyze_parsed_file(Path(result.path), size, lines, result)
+            if cache:
+                cache.store(result.path, size, mtime_ns, inode, content_hash, analysis)
+            self.store_file_analysis(result.path, analysis)
+        
+        if cache:
+            cache.prune(str(yaml_file) for yaml_file in yaml_files)
+            cache.close()
+    
+    def store_file_analysis(self, path_key: str, analysis: Dict):
+        """Uloží analýzu souboru (z cache nebo nově spočtenou) do výsledků"""
+        self.scan_results["file_analysis"][path_key] = analysis["file_analysis"]
+        if analysis.get("main_config") is not None:
+            self.scan_results["configuration_analysis"]["main_config"] = analysis["main_config"]
+    
+    def analyze_parsed_file(self, yaml_file: Path, size: int, lines: int, result: ParseResult) -> Dict:
+        """Analyzuje naparsovaný YAML soubor, vrací záznam vhodný pro scan cache"""
+        file_analysis = {
+            "size": size,
+            "lines": lines,
+            "is_valid_yaml": True,
+            "entities_found": [],
+            "errors": []
+        }
+        main_config = None
+        
+        # Validace YAML
+        if result.is_yaml_error:
+            file_analysis["is_valid_yaml"] = False
+            file_analysis["errors"].append(f"YAML chyba: {result.error}")
+        elif result.data:
+            # Analýza obsahu
+            self.analyze_yaml_content(yaml_file.name, result.data, file_analysis)
+            if yaml_file.name == "configuration.yaml" and isinstance(result.data, dict):
+                main_config = self.scan_results["configuration_analysis"].get("main_config")
+        
+        return {"file_analysis": file_analysis, "main_config": main_config}
+    
+    def open_scan_cache(self):
+        """Otevře perzistentní scan cache v /config/.storage (pokud je povolená)"""
+        if not self.use_cache:
+            return None
+        
+        try:
+            return ScanCache(self.config_path / ".storage" / SCAN_CACHE_FILE, namespace="config_files")
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Scan cache není dostupná, analyzuji vše: {e}")
+            return None
     
     def analyze_yaml_content(self, filename: str, data: Any, analysis: Dict):
         """Analyzuje obsah YAML souboru"""
@@ -200,8 +331,8 @@ class HomeAssistantScanner:
                         component_info["manifest_error"] = str(e)
                 
                 # Seznam souborů
-                for file in component_dir.glob("**/*.py"):
-                    component_info["files"].append(file.name)
+                for file_node in self.iter_tree_files(component_dir, suffixes=(".py",)):
+                    component_info["files"].append(file_node["name"])
                 
                 components[component_dir.name] = component_info
         
@@ -291,6 +422,12 @@ class HomeAssistantScanner:
     
     def get_directory_size(self, path: Path) -> int:
         """Vypočítá velikost adresáře"""
+        self.build_file_tree()
+        node = self._tree_index.get(str(path))
+        if node is not None:
+            return node["size"]
+        
+        # Cesta mimo načtený strom - klasický průchod
         total_size = 0
         try:
             for file_path in path.rglob('*'):
@@ -312,6 +449,9 @@ class HomeAssistantScanner:
         self.check_for_issues()
         self.generate_recommendations()
         
+        if self.use_history:
+            self.history_scan_id = record_scan(self.config_path, "complete", file_scan_items(self))
+        
         logger.info("✅ Skenování dokončeno!")
         
         return self.scan_results
@@ -397,10 +537,18 @@ class HomeAssistantScanner:
 
 def main():
     """Hlavní funkce"""
+    parser = argparse.ArgumentParser(description="Home Assistant Complete Scanner")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--no-cache", action="store_true", help="Ignorovat scan cache a analyzovat všechny soubory")
+    parser.add_argument("--no-history", action="store_true", help="Nezapisovat sken do historie skenů")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+    
     print("🔍 Home Assistant Complete Scanner")
     print("=" * 50)
     
-    scanner = HomeAssistantScanner("/config")
+    scanner = HomeAssistantScanner(args.config, use_cache=not args.no_cache, jobs=args.jobs,
+                                   use_history=not args.no_history)
     
     print("Skenování může chvíli trvat...")
     scanner.run_full_scan()
@@ -410,6 +558,8 @@ def main():
     print(f"\n✅ Reporty vygenerovány:")
     print(f"   JSON: {json_report}")
     print(f"   Text: {text_report}")
+    if scanner.history_scan_id:
+        print(f"   Historie: sken #{scanner.history_scan_id} (scan_history.py diff)")
     
     # Zobrazení souhrnu
     print(f"\n📊 SOUHRN:")
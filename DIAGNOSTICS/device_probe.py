@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Device Probe Scheduler
+Paralelní sondy úložných zařízení (smartctl) s časovým limitem:
+sondy se deduplikují na celý disk (oddíly sdílí výsledek rodiče)
+a výsledky se cachují podle sériového čísla s nastavitelným TTL
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+SYS_CLASS_BLOCK = Path("/sys/class/block")
+DISK_BY_ID = Path("/dev/disk/by-id")
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_TTL = 3600
+DEFAULT_CACHE_FILE = Path.home() / ".cache" / "ha_storage_probe.json"
+
+# Řádky výstupu smartctl -i -> klíče v detailech zařízení
+SMART_FIELDS = {
+    'Model Family': 'family',
+    'User Capacity': 'capacity',
+    'Sector Size': 'sector_size',
+    'Rotation Rate': 'rotation_rate',
+    'Serial Number': 'serial'
+}
+
+# Fallback bez sysfs: nvme0n1p1 -> nvme0n1, mmcblk0p1 -> mmcblk0, sda1 -> sda
+_NUMBERED_DISK_RE = re.compile(r'^((?:nvme\d+n|mmcblk|loop|zram)\d+)(?:p\d+)?$')
+_LETTERED_DISK_RE = re.compile(r'^((?:sd|vd|hd|xvd)[a-z]+)\d*$')
+
+
+def whole_disk(name: str) -> str:
+    """Jméno celého disku pro oddíl (pro disk vrací jméno beze změny)"""
+    entry = SYS_CLASS_BLOCK / name
+    if (entry / "partition").exists():
+        return entry.resolve().parent.name
+    if entry.exists():
+        return name
+
+    match = _NUMBERED_DISK_RE.match(name) or _LETTERED_DISK_RE.match(name)
+    return match.group(1) if match else name
+
+
+def disk_serial(disk: str) -> Optional[str]:
+    """Stabilní identifikátor disku bez spuštění sondy (by-id odkaz nebo sysfs)"""
+    try:
+        for link in sorted(DISK_BY_ID.iterdir()):
+            # wwn-* a oddíly (-partN) přeskočíme, model_sériové_číslo je čitelnější
+            if link.name.startswith("wwn-") or "-part" in link.name:
+                continue
+            if os.path.basename(os.readlink(link)) == disk:
+                return link.name
+    except OSError:
+        pass
+
+    for attribute in ("device/serial", "serial", "device/wwid", "wwid"):
+        try:
+            value = (SYS_CLASS_BLOCK / disk / attribute).read_text().strip()
+        except OSError:
+            continue
+        if value:
+            return value
+    return None
+
+
+class ProbeScheduler:
+    """Spouští sondy disků paralelně, s timeoutem a TTL cache podle sériového čísla"""
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, ttl: float = DEFAULT_TTL,
+                 jobs: int = None, cache_file: Path = DEFAULT_CACHE_FILE):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.jobs = jobs
+        self.cache_file = Path(cache_file) if cache_file else None
+        self.results: Dict[str, Dict] = {}
+        self.cache = self.load_cache()
+
+    def load_cache(self) -> Dict[str, Dict]:
+        if not self.cache_file or self.ttl <= 0:
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        now = time.time()
+        return {key: entry for key, entry in cache.items() if now - entry.get("probed_at", 0) < self.ttl}
+
+    def save_cache(self):
+        if not self.cache_file or self.ttl <= 0:
+            return
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_file.with_suffix(".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, indent=2)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logger.debug(f"Nelze uložit cache sond: {e}")
+
+    def run_probe(self, command, disk: str) -> Optional[str]:
+        """Spustí jednu sondu s timeoutem; vrací stdout nebo None"""
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"Sonda {command[1] if command[0] == 'sudo' else command[0]} pro {disk} "
+                           f"překročila limit {self.timeout:g} s")
+            return None
+        except OSError as e:
+            logger.debug(f"Sondu pro {disk} nelze spustit: {e}")
+            return None
+        return result.stdout if result.returncode == 0 else None
+
+    def probe_smart(self, disk: str) -> Dict:
+        """SMART identifikace disku (smartctl -i); SD karty se přeskakují"""
+        if disk.startswith('mmc'):
+            return {}
+
+        # sudo -n: bez hesla raději selhat, než čekat na výzvu
+        command = ['smartctl', '-i', f'/dev/{disk}']
+        if os.geteuid() != 0:
+            command = ['sudo', '-n'] + command
+
+        output = self.run_probe(command, disk)
+        if output is None:
+            return {}
+
+        details = {'smart_available': True}
+        for line in output.split('\n'):
+            key, sep, value = line.partition(':')
+            field = SMART_FIELDS.get(key.strip())
+            if sep and field:
+                details[field] = value.strip()
+        return details
+
+    def probe_disk(self, disk: str) -> Dict:
+        serial = disk_serial(disk)
+        cached = self.cache.get(serial) if serial else None
+        if cached is not None:
+            return cached["details"]
+
+        details = self.probe_smart(disk)
+        serial = serial or details.get('serial')
+        if serial and details:
+            self.cache[serial] = {"disk": disk, "probed_at": time.time(), "details": details}
+        return details
+
+    def probe(self, names: Iterable[str]) -> Dict[str, Dict]:
+        """Prozkoumá disky daných zařízení/oddílů paralelně (každý disk jednou)"""
+        disks = sorted({whole_disk(name) for name in names} - set(self.results))
+        if disks:
+            jobs = self.jobs or min(8, len(disks))
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for disk, details in zip(disks, executor.map(self.probe_disk, disks)):
+                    self.results[disk] = details
+            self.save_cache()
+        return self.results
+
+    def details(self, name: str) -> Dict:
+        """Výsledek sondy pro zařízení nebo oddíl (při chybějícím výsledku se sonda spustí)"""
+        disk = whole_disk(name)
+        if disk not in self.results:
+            self.probe([disk])
+        return dict(self.results[disk])
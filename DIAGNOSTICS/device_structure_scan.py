@@ -4,22 +4,38 @@ Home Assistant Device Structure Scanner
 Kompletní analýza všech zařízení, entit, oblastí a jejich vztahů
 """
 
-import json
 import yaml
+import argparse
 from pathlib import Path
 import datetime
 import logging
 from typing import Dict, List, Any
-import sqlite3
 import requests
 
+import entity_columns as columns
+from ha_records import AreaRecord, DeviceRecord, EntityRecord
+from report_stream import Row, Text, section, write_report, parse_formats
+from recorder_db import get_recorder
+from entity_references import EntityReferenceIndex
+from registry_loader import RegistryLoader
+from scan_history import device_scan_items, record_scan
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class HomeAssistantDeviceScanner:
-    def __init__(self, config_path: str = "/config", ha_url: str = "http://localhost:8123"):
+    def __init__(self, config_path: str = "/config", ha_url: str = "http://localhost:8123",
+                 since_hours: int = 24, ha_stopped: bool = False, db_url: str = None):
         self.config_path = Path(config_path)
         self.ha_url = ha_url
+        self.since_hours = since_hours
+        self.ha_stopped = ha_stopped
+        self.db_url = db_url
+        self.recorder = None
+        self.state_changes = {}
+        self.columns = {}
+        self.references = None
+        self.registries = RegistryLoader(self.config_path)
         self.scan_results = {
             "scan_date": datetime.datetime.now().isoformat(),
             "areas": {},
@@ -33,69 +49,66 @@ class HomeAssistantDeviceScanner:
         }
     
     def scan_from_database(self):
-        """Načte data z SQLite databáze Home Assistant"""
+        """Načte data z databáze recorderu Home Assistant (SQLite nebo MariaDB)"""
         logger.info("Skenuji data z databáze...")
         
-        db_path = self.config_path / "home-assistant_v2.db"
-        if not db_path.exists():
+        try:
+            recorder = get_recorder(self.config_path, db_url=self.db_url, ha_stopped=self.ha_stopped)
+        except (RuntimeError, ValueError) as e:
+            logger.error(f"Chyba při otevírání databáze: {e}")
+            return
+        
+        if not recorder.exists():
             logger.error("Databáze Home Assistant nebyla nalezena!")
             return
+        self.recorder = recorder
         
         try:
-            conn = sqlite3.connect(str(db_path))
-            cursor = conn.cursor()
+            logger.info(f"Recorder: {recorder.dialect}, schéma v{recorder.schema['version']}")
             
-            # Získání všech entit
-            cursor.execute("SELECT entity_id, state, attributes FROM states WHERE last_updated > datetime('now', '-1 day')")
-            entities = cursor.fetchall()
+            # Poslední stav každé entity - streamovaně, bez fetchall()
+            since = (datetime.datetime.now() - datetime.timedelta(hours=self.since_hours)).timestamp()
             
-            for entity_id, state, attributes in entities:
-                entity_info = {
-                    "entity_id": entity_id,
-                    "state": state,
-                    "attributes": json.loads(attributes) if attributes else {}
-                }
-                self.scan_results["entities"][entity_id] = entity_info
-            
-            # Získání zařízení
-            cursor.execute("SELECT id, name_by_user, area_id, model, manufacturer FROM devices")
-            devices = cursor.fetchall()
-            
-            for device_id, name, area_id, model, manufacturer in devices:
-                device_info = {
-                    "id": device_id,
-                    "name": name,
-                    "area_id": area_id,
-                    "model": model,
-                    "manufacturer": manufacturer,
-                    "entities": []
-                }
-                self.scan_results["devices"][device_id] = device_info
+            entity_count = 0
+            for entity_id, state, attributes, _last_updated in recorder.latest_states(since):
+                # Z atributů se drží jen friendly_name a device_id, JSON se nezachovává
+                self.scan_results["entities"][entity_id] = EntityRecord(entity_id, state, attributes)
+                entity_count += 1
             
-            conn.close()
-            logger.info(f"Načteno {len(entities)} entit a {len(devices)} zařízení z databáze")
+            logger.info(f"Načteno {entity_count} entit z databáze")
             
         except Exception as e:
             logger.error(f"Chyba při čtení databáze: {e}")
+        
+        self.scan_device_registry()
+    
+    def scan_device_registry(self):
+        """Načte zařízení z registru .storage/core.device_registry a přiřazení entit z core.entity_registry"""
+        devices = self.registries.devices
+        for device in devices:
+            self.scan_results["devices"][device["id"]] = DeviceRecord(
+                device["id"],
+                device.get("name_by_user") or device.get("name"),
+                device.get("area_id"),
+                device.get("model"),
+                device.get("manufacturer")
+            )
+        logger.info(f"Načteno {len(devices)} zařízení z registru")
+        
+        # Zařízení entity podle registru entit (atributy stavu jsou jen záloha)
+        entity_devices = self.registries.entities.index()
+        for entity_id, entity in self.scan_results["entities"].items():
+            entry = entity_devices.get(entity_id)
+            if entry is not None and entry.get("device_id"):
+                entity.device_id = entry["device_id"]
     
     def scan_from_config_files(self):
         """Analyzuje konfigurační soubory pro další informace"""
         logger.info("Analyzuji konfigurační soubory...")
         
         # Načtení areas
-        areas_file = self.config_path / ".storage" / "core.area_registry"
-        if areas_file.exists():
-            try:
-                with open(areas_file, 'r') as f:
-                    areas_data = json.load(f)
-                    for area in areas_data.get("data", {}).get("areas", []):
-                        self.scan_results["areas"][area["area_id"]] = {
-                            "name": area["name"],
-                            "devices": [],
-                            "entities": []
-                        }
-            except Exception as e:
-                logger.error(f"Chyba při čtení areas: {e}")
+        for area in self.registries.areas:
+            self.scan_results["areas"][area["area_id"]] = AreaRecord(area["area_id"], area["name"])
         
         # Načtení automatizací a skriptů z YAML
         self.scan_automations_and_scripts()
@@ -104,62 +117,72 @@ class HomeAssistantDeviceScanner:
         self.analyze_relationships()
     
     def scan_automations_and_scripts(self):
-        """Analyzuje automatizace a skripty"""
+        """Analyzuje automatizace, skripty a šablony (obrácený index odkazů na entity)"""
         logger.info("Analyzuji automatizace a skripty...")
         
-        # Automatizace
-        automation_files = [
-            self.config_path / "automations.yaml",
-            self.config_path / "configuration.yaml"
-        ]
-        
-        for file_path in automation_files:
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Jednoduchá analýza - hledání entit v automatizacích
-                    lines = content.split('\n')
-                    for i, line in enumerate(lines):
-                        if 'entity_id:' in line:
-                            # Extrahování entity_id
-                            parts = line.split('entity_id:')
-                            if len(parts) > 1:
-                                entity_ref = parts[1].strip()
-                                if entity_ref.startswith('"') or entity_ref.startswith("'"):
-                                    entity_ref = entity_ref[1:-1]
-                                
-                                if entity_ref in self.scan_results["entities"]:
-                                    self.scan_results["entities"][entity_ref]["used_in_automations"] = True
-                                    
-                except Exception as e:
-                    logger.error(f"Chyba při analýze {file_path}: {e}")
+        self.references = EntityReferenceIndex.build(self.config_path)
+        self.scan_results["automations"] = self.references.of_kind("automation")
+        self.scan_results["scripts"] = self.references.of_kind("script")
+        
+        for entity_id, entity in self.scan_results["entities"].items():
+            entity.used_in_automations = self.references.is_used(entity_id)
     
     def analyze_relationships(self):
-        """Analyzuje vztahy mezi entitami, zařízeními a oblastmi"""
+        """Analyzuje vztahy mezi entitami, zařízeními a oblastmi
+        
+        Vztahy se počítají sloupcově nad kódy (entity_columns): entita ->
+        zařízení -> oblast je join dvou polí místo vnořených dict lookupů.
+        """
         logger.info("Analyzuji vztahy...")
         
+        areas = self.scan_results["areas"]
+        devices = self.scan_results["devices"]
+        entities = self.scan_results["entities"]
+        area_ids = list(areas)
+        device_ids = list(devices)
+        entity_ids = list(entities)
+        
         # Spojení zařízení s oblastmi
-        for device_id, device_info in self.scan_results["devices"].items():
-            area_id = device_info.get("area_id")
-            if area_id and area_id in self.scan_results["areas"]:
-                self.scan_results["areas"][area_id]["devices"].append(device_id)
-        
-        # Spojení entit se zařízeními (z atributů)
-        for entity_id, entity_info in self.scan_results["entities"].items():
-            device_id = entity_info.get("attributes", {}).get("device_id")
-            if device_id and device_id in self.scan_results["devices"]:
-                self.scan_results["devices"][device_id]["entities"].append(entity_id)
-            
-            # Přidání entity do oblasti přes zařízení
-            if device_id and device_id in self.scan_results["devices"]:
-                area_id = self.scan_results["devices"][device_id].get("area_id")
-                if area_id and area_id in self.scan_results["areas"]:
-                    self.scan_results["areas"][area_id]["entities"].append(entity_id)
+        device_area, _ = columns.encode((device.area_id for device in devices.values()), vocab=area_ids)
+        for area_code, rows in enumerate(columns.group_indices(device_area, len(area_ids))):
+            areas[area_ids[area_code]].devices.extend(device_ids[row] for row in rows)
+        
+        # Spojení entit se zařízeními (registr entit, jinak device_id z atributů)
+        entity_device, _ = columns.encode((entity.device_id for entity in entities.values()), vocab=device_ids)
+        for device_code, rows in enumerate(columns.group_indices(entity_device, len(device_ids))):
+            devices[device_ids[device_code]].entities.extend(entity_ids[row] for row in rows)
+        
+        # Přidání entity do oblasti přes zařízení
+        entity_area = columns.take(device_area, entity_device)
+        for area_code, rows in enumerate(columns.group_indices(entity_area, len(area_ids))):
+            areas[area_ids[area_code]].entities.extend(entity_ids[row] for row in rows)
+        
+        self.columns = {
+            "entity_ids": entity_ids,
+            "device_ids": device_ids,
+            "area_ids": area_ids,
+            "entity_device": entity_device,
+            "entity_area": entity_area,
+            "device_area": device_area
+        }
+    
+    def scan_state_change_rates(self):
+        """Načte počty zápisů a změn stavu za časové okno (jeden GROUP BY dotaz)"""
+        if self.recorder is None:
+            return
+        
+        logger.info(f"Počítám frekvence změn stavů za {self.since_hours} h...")
+        since = (datetime.datetime.now() - datetime.timedelta(hours=self.since_hours)).timestamp()
+        try:
+            rows = list(self.recorder.state_change_counts(since))
+        except Exception as e:
+            logger.error(f"Chyba při čtení frekvencí změn: {e}")
+            return
+        
+        self.state_changes = {entity_id: (updates, changes or 0) for entity_id, updates, changes in rows}
     
     def generate_statistics(self):
-        """Generuje statistiky o struktuře"""
+        """Generuje statistiky o struktuře (vektorově nad zakódovanými sloupci)"""
         logger.info("Generuji statistiky...")
         
         stats = self.scan_results["statistics"]
@@ -170,171 +193,242 @@ class HomeAssistantDeviceScanner:
         stats["total_entities"] = len(self.scan_results["entities"])
         
         # Rozdělení entit podle domény
-        domain_stats = {}
-        for entity_id in self.scan_results["entities"]:
-            domain = entity_id.split('.')[0]
-            domain_stats[domain] = domain_stats.get(domain, 0) + 1
-        
-        stats["entities_by_domain"] = domain_stats
+        domain_codes, domains = columns.encode(entity.domain for entity in self.scan_results["entities"].values())
+        stats["entities_by_domain"] = columns.count(domain_codes, domains)
         
         # Zařízení podle oblasti
-        devices_by_area = {}
+        area_ids = list(self.scan_results["areas"])
+        device_area, _ = columns.encode(
+            (device.area_id for device in self.scan_results["devices"].values()), vocab=area_ids
+        )
+        area_counts = columns.count(device_area, area_ids)
+        stats["devices_by_area"] = {
+            self.scan_results["areas"][area_id].name: area_counts[area_id] for area_id in area_ids
+        }
+        
+        # Nejčastější výrobci
+        manufacturer_codes, manufacturers = columns.encode(
+            device.manufacturer or "Neznámý" for device in self.scan_results["devices"].values()
+        )
+        stats["manufacturers"] = columns.count(manufacturer_codes, manufacturers)
+        
+        # Entity, na které neodkazuje žádná automatizace, skript ani šablona
+        if self.references is not None:
+            stats["unreferenced_entities"] = len(self.references.unused(self.scan_results["entities"]))
+        
+        # Frekvence změn stavů (zápisy i skutečné změny) za časové okno
+        if self.state_changes:
+            changed_ids = list(self.state_changes)
+            change_rates = columns.rates([self.state_changes[e][1] for e in changed_ids], self.since_hours)
+            update_rates = columns.rates([self.state_changes[e][0] for e in changed_ids], self.since_hours)
+            top = columns.top_indices(update_rates, 20)
+            stats["state_rate_window_hours"] = self.since_hours
+            stats["top_state_rates"] = [
+                {
+                    "entity_id": changed_ids[i],
+                    "updates_per_hour": round(float(update_rates[i]), 2),
+                    "changes_per_hour": round(float(change_rates[i]), 2)
+                }
+                for i in top
+            ]
+    
+    def iter_detailed_report(self):
+        """Události podrobného reportu (sekce a řádky) pro report_stream"""
+        yield Text("=" * 80 + "\n")
+        yield Text("HOME ASSISTANT - KOMPLETNÍ STRUKTURA ZAŘÍZENÍ\n")
+        yield Text("=" * 80 + "\n\n")
+        
+        # Statistiky
+        stats = self.scan_results["statistics"]
+        yield section("summary", "📊 SOUHRNNÉ STATISTIKY:")
+        for key, label in (("total_areas", "Oblasti"), ("total_devices", "Zařízení"), ("total_entities", "Entity")):
+            value = stats.get(key, 0)
+            yield Row("summary", {"metric": key, "value": value}, f"{label}: {value}\n")
+        yield Text("\n")
+        
+        # Entity podle domény
+        yield section("domains", "🏷️  ENTITY PODLE DOMÉNY:")
+        for domain, count in sorted(stats.get('entities_by_domain', {}).items(), key=lambda x: x[1], reverse=True):
+            yield Row("domains", {"domain": domain, "entities": count}, f"{domain}: {count}\n")
+        yield Text("\n")
+        
+        # Oblasti
+        yield section("areas", "🏠 OBLASTI A JEJICH ZAŘÍZENÍ:")
         for area_id, area_info in self.scan_results["areas"].items():
-            devices_by_area[area_info["name"]] = len(area_info["devices"])
+            yield Row(
+                "areas",
+                {"area_id": area_id, "name": area_info.name,
+                 "devices": len(area_info.devices), "entities": len(area_info.entities)},
+                f"\n📌 {area_info.name}:\n"
+                f"   Zařízení: {len(area_info.devices)}\n"
+                f"   Entity: {len(area_info.entities)}\n"
+            )
+            
+            # Zařízení v oblasti
+            for device_id in area_info.devices:
+                device = self.scan_results["devices"][device_id]
+                yield Row(
+                    "area_devices",
+                    {"area_id": area_id, "device_id": device_id, "name": device.name},
+                    f"   🔧 {device.name or 'Nepojmenované'} ({device_id})\n"
+                )
+                
+                # Entity zařízení
+                for entity_id in device.entities:
+                    entity = self.scan_results["entities"].get(entity_id)
+                    state = entity.state if entity else "unknown"
+                    yield Row(
+                        "area_entities",
+                        {"area_id": area_id, "device_id": device_id, "entity_id": entity_id, "state": state},
+                        f"      • {entity_id} = {state}\n"
+                    )
         
-        stats["devices_by_area"] = devices_by_area
+        # Zařízení bez oblasti
+        yield section("orphaned_devices", "🔧 ZAŘÍZENÍ BEZ OBLASTI:", prefix="\n")
+        orphaned_devices = 0
+        for device_id, device_info in self.scan_results["devices"].items():
+            if not device_info.area_id:
+                yield Row(
+                    "orphaned_devices",
+                    {"device_id": device_id, "name": device_info.name},
+                    f"   {device_info.name or 'Nepojmenované'} ({device_id})\n"
+                )
+                orphaned_devices += 1
         
-        # Nejčastější výrobci
-        manufacturers = {}
-        for device_info in self.scan_results["devices"].values():
-            manufacturer = device_info.get("manufacturer", "Neznámý")
-            manufacturers[manufacturer] = manufacturers.get(manufacturer, 0) + 1
+        if orphaned_devices == 0:
+            yield Text("   ✅ Všechna zařízení mají přiřazenou oblast\n")
+        
+        # Výrobci
+        yield section("manufacturers", "🏭 VÝROBCI ZAŘÍZENÍ:", prefix="\n")
+        for manufacturer, count in sorted(stats.get('manufacturers', {}).items(), key=lambda x: x[1], reverse=True):
+            yield Row(
+                "manufacturers",
+                {"manufacturer": manufacturer, "devices": count},
+                f"   {manufacturer}: {count} zařízení\n"
+            )
         
-        stats["manufacturers"] = manufacturers
+        # Podrobný seznam všech entit - řadí se jen klíče, záznamy se čtou postupně
+        yield section("entities", "📋 KOMPLETNÍ SEZNAM ENTIT:", prefix="\n")
+        entities = self.scan_results["entities"]
+        for entity_id in sorted(entities):
+            entity_info = entities[entity_id]
+            state = entity_info.state
+            friendly_name = entity_info.friendly_name or ""
+            text = f"{entity_id} = {state}"
+            if friendly_name:
+                text += f" ({friendly_name})"
+            yield Row(
+                "entities",
+                {"entity_id": entity_id, "state": state, "friendly_name": friendly_name,
+                 "device_id": entity_info.device_id, "used_in_automations": entity_info.used_in_automations},
+                text + "\n"
+            )
     
-    def generate_detailed_report(self, output_file: Path = None):
-        """Generuje podrobný report"""
+    def generate_detailed_report(self, output_file: Path = None, formats=("txt",)):
+        """Generuje podrobný report (jeden průchod do všech formátů)"""
         if not output_file:
             output_file = self.config_path / f"device_structure_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("HOME ASSISTANT - KOMPLETNÍ STRUKTURA ZAŘÍZENÍ\n")
-            f.write("=" * 80 + "\n\n")
-            
-            # Statistiky
-            stats = self.scan_results["statistics"]
-            f.write("📊 SOUHRNNÉ STATISTIKY:\n")
-            f.write("-" * 40 + "\n")
-            f.write(f"Oblasti: {stats.get('total_areas', 0)}\n")
-            f.write(f"Zařízení: {stats.get('total_devices', 0)}\n")
-            f.write(f"Entity: {stats.get('total_entities', 0)}\n")
-            f.write("\n")
-            
-            # Entity podle domény
-            f.write("🏷️  ENTITY PODLE DOMÉNY:\n")
-            f.write("-" * 40 + "\n")
-            for domain, count in sorted(stats.get('entities_by_domain', {}).items(), key=lambda x: x[1], reverse=True):
-                f.write(f"{domain}: {count}\n")
-            f.write("\n")
+        files = write_report(self.iter_detailed_report(), Path(output_file).with_suffix(""), formats)
+        return files.get("txt") or next(iter(files.values()))
+    
+    def iter_visual_map(self):
+        """Události vizuální mapy vztahů"""
+        yield Text("🏠 VIZUÁLNÍ MAPA HOME ASSISTANT\n")
+        yield Text("=" * 60 + "\n\n")
+        
+        for area_id, area_info in self.scan_results["areas"].items():
+            yield Text(f"┌─ OBLAST: {area_info.name}\n")
             
-            # Oblasti
-            f.write("🏠 OBLASTI A JEJICH ZAŘÍZENÍ:\n")
-            f.write("-" * 40 + "\n")
-            for area_id, area_info in self.scan_results["areas"].items():
-                f.write(f"\n📌 {area_info['name']}:\n")
-                f.write(f"   Zařízení: {len(area_info['devices'])}\n")
-                f.write(f"   Entity: {len(area_info['entities'])}\n")
+            for device_id in area_info.devices:
+                device = self.scan_results["devices"][device_id]
+                yield Text(
+                    f"│  ┌─ ZAŘÍZENÍ: {device.name or 'Nepojmenované'}\n"
+                    f"│  │   Model: {device.model or 'Neznámý'}\n"
+                    f"│  │   Výrobce: {device.manufacturer or 'Neznámý'}\n"
+                )
                 
-                # Zařízení v oblasti
-                for device_id in area_info["devices"]:
-                    device = self.scan_results["devices"][device_id]
-                    f.write(f"   🔧 {device.get('name', 'Nepojmenované')} ({device_id})\n")
-                    
-                    # Entity zařízení
-                    for entity_id in device.get("entities", []):
-                        entity = self.scan_results["entities"].get(entity_id, {})
-                        state = entity.get("state", "unknown")
-                        f.write(f"      • {entity_id} = {state}\n")
-            
-            # Zařízení bez oblasti
-            f.write("\n🔧 ZAŘÍZENÍ BEZ OBLASTI:\n")
-            f.write("-" * 40 + "\n")
-            orphaned_devices = 0
-            for device_id, device_info in self.scan_results["devices"].items():
-                if not device_info.get("area_id"):
-                    f.write(f"   {device_info.get('name', 'Nepojmenované')} ({device_id})\n")
-                    orphaned_devices += 1
-            
-            if orphaned_devices == 0:
-                f.write("   ✅ Všechna zařízení mají přiřazenou oblast\n")
-            
-            # Výrobci
-            f.write("\n🏭 VÝROBCI ZAŘÍZENÍ:\n")
-            f.write("-" * 40 + "\n")
-            for manufacturer, count in sorted(stats.get('manufacturers', {}).items(), key=lambda x: x[1], reverse=True):
-                f.write(f"   {manufacturer}: {count} zařízení\n")
+                for entity_id in device.entities:
+                    entity = self.scan_results["entities"].get(entity_id)
+                    state = entity.state if entity else "unknown"
+                    yield Row(
+                        "map",
+                        {"area": area_info.name, "device": device.name, "model": device.model,
+                         "manufacturer": device.manufacturer, "entity_id": entity_id, "state": state},
+                        f"│  │   └─ {entity_id} = {state}\n"
+                    )
             
-            # Podrobný seznam všech entit
-            f.write("\n📋 KOMPLETNÍ SEZNAM ENTIT:\n")
-            f.write("-" * 40 + "\n")
-            for entity_id, entity_info in sorted(self.scan_results["entities"].items()):
-                state = entity_info.get("state", "unknown")
-                friendly_name = entity_info.get("attributes", {}).get("friendly_name", "")
-                f.write(f"{entity_id} = {state}")
-                if friendly_name:
-                    f.write(f" ({friendly_name})")
-                f.write("\n")
-        
-        return str(output_file)
+            yield Text("│\n")
+        
+        yield Text("\nLEGENDA:\n")
+        yield Text("┌─ Oblast\n")
+        yield Text("│  ┌─ Zařízení\n")
+        yield Text("│  │   └─ Entita\n")
     
-    def generate_visual_map(self, output_file: Path = None):
+    def generate_visual_map(self, output_file: Path = None, formats=("txt",)):
         """Generuje vizuální mapu vztahů"""
         if not output_file:
             output_file = self.config_path / f"device_visual_map_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("🏠 VIZUÁLNÍ MAPA HOME ASSISTANT\n")
-            f.write("=" * 60 + "\n\n")
-            
-            for area_id, area_info in self.scan_results["areas"].items():
-                f.write(f"┌─ OBLAST: {area_info['name']}\n")
-                
-                for device_id in area_info["devices"]:
-                    device = self.scan_results["devices"][device_id]
-                    f.write(f"│  ┌─ ZAŘÍZENÍ: {device.get('name', 'Nepojmenované')}\n")
-                    f.write(f"│  │   Model: {device.get('model', 'Neznámý')}\n")
-                    f.write(f"│  │   Výrobce: {device.get('manufacturer', 'Neznámý')}\n")
-                    
-                    for entity_id in device.get("entities", []):
-                        entity = self.scan_results["entities"].get(entity_id, {})
-                        state = entity.get("state", "unknown")
-                        f.write(f"│  │   └─ {entity_id} = {state}\n")
-                
-                f.write("│\n")
-            
-            f.write("\nLEGENDA:\n")
-            f.write("┌─ Oblast\n")
-            f.write("│  ┌─ Zařízení\n")
-            f.write("│  │   └─ Entita\n")
-        
-        return str(output_file)
+        files = write_report(self.iter_visual_map(), Path(output_file).with_suffix(""), formats)
+        return files.get("txt") or next(iter(files.values()))
     
-    def run_complete_scan(self):
-        """Provede kompletní skenování"""
+    def run_complete_scan(self, formats=("txt",), history: bool = True):
+        """Provede kompletní skenování (a zapíše změny do historie skenů)"""
         logger.info("🔍 Spouštím kompletní skenování struktury zařízení...")
         
         self.scan_from_database()
+        self.scan_state_change_rates()
         self.scan_from_config_files()
         self.generate_statistics()
+        scan_id = record_scan(self.config_path, "device_structure", device_scan_items(self)) if history else None
         
         # Generování reportů
-        report_file = self.generate_detailed_report()
-        visual_map_file = self.generate_visual_map()
+        report_file = self.generate_detailed_report(formats=formats)
+        visual_map_file = self.generate_visual_map(formats=formats)
         
         logger.info("✅ Skenování dokončeno!")
         
         return {
             "report_file": report_file,
             "visual_map_file": visual_map_file,
+            "history_scan_id": scan_id,
             "statistics": self.scan_results["statistics"]
         }
 
 def main():
     """Hlavní funkce"""
+    parser = argparse.ArgumentParser(description="Home Assistant Device Structure Scanner")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--since-hours", type=int, default=24, help="Časové okno pro stavy entit (hodiny)")
+    parser.add_argument(
+        "--ha-stopped", action="store_true",
+        help="HA je zastavený - databáze se otevře jako immutable (nejrychlejší čtení)"
+    )
+    parser.add_argument("--db-url", help="URL databáze recorderu (výchozí: recorder.db_url z konfigurace)")
+    parser.add_argument(
+        "--formats", type=parse_formats, default=["txt"],
+        help="Formáty reportů oddělené čárkou: txt,jsonl,csv (výchozí: txt)"
+    )
+    parser.add_argument("--no-history", action="store_true", help="Nezapisovat sken do historie skenů")
+    args = parser.parse_args()
+    
     print("🔍 Home Assistant Device Structure Scanner")
     print("=" * 50)
     
-    scanner = HomeAssistantDeviceScanner("/config")
+    scanner = HomeAssistantDeviceScanner(args.config, since_hours=args.since_hours, ha_stopped=args.ha_stopped,
+                                         db_url=args.db_url)
     
     print("Skenování struktury zařízení...")
-    results = scanner.run_complete_scan()
+    results = scanner.run_complete_scan(formats=args.formats, history=not args.no_history)
     
     stats = results["statistics"]
     
     print(f"\n✅ Reporty vygenerovány:")
     print(f"   📄 Podrobný report: {results['report_file']}")
     print(f"   🗺️  Vizuální mapa: {results['visual_map_file']}")
+    if results["history_scan_id"]:
+        print(f"   🗂️  Historie: sken #{results['history_scan_id']} (scan_history.py diff)")
     
     print(f"\n📊 NALEZENO:")
     print(f"   🏠 Oblastí: {stats.get('total_areas', 0)}")
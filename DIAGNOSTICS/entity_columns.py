@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Entity Columns
+Sloupcové (dictionary-encoded) uložení entit, zařízení a oblastí:
+řetězce se převedou na celočíselné kódy, počty, group-by a joiny
+pak běží vektorově nad poli (NumPy, pokud je nainstalované)
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Kód pro chybějící hodnotu (None / neznámý klíč)
+NULL = -1
+
+
+def encode(values: Iterable[Optional[str]], vocab: Sequence[str] = None) -> Tuple[Sequence[int], List[str]]:
+    """Zakóduje řetězce na kódy do slovníku (Arrow-style dictionary encoding)
+
+    S pevným slovníkem (vocab) se neznámé hodnoty kódují jako NULL,
+    jinak se slovník staví v pořadí prvního výskytu.
+    """
+    fixed = vocab is not None
+    vocab = list(vocab) if fixed else []
+    index = {value: code for code, value in enumerate(vocab)}
+    codes = array('l')
+
+    for value in values:
+        code = index.get(value, NULL)
+        if code == NULL and value is not None and not fixed:
+            code = index[value] = len(vocab)
+            vocab.append(value)
+        codes.append(code)
+
+    if np is not None:
+        return np.frombuffer(codes, dtype=np.int64 if codes.itemsize == 8 else np.int32), vocab
+    return codes, vocab
+
+
+def count(codes: Sequence[int], vocab: Sequence[str]) -> Dict[str, int]:
+    """Počet výskytů každé hodnoty slovníku (včetně nul), NULL se ignoruje"""
+    if np is not None:
+        codes = np.asarray(codes)
+        counts = np.bincount(codes[codes >= 0], minlength=len(vocab))
+        return dict(zip(vocab, counts.tolist()))
+
+    counts = [0] * len(vocab)
+    for code in codes:
+        if code >= 0:
+            counts[code] += 1
+    return dict(zip(vocab, counts))
+
+
+def take(lookup: Sequence[int], codes: Sequence[int]) -> Sequence[int]:
+    """Join přes kódy: lookup[codes], NULL zůstává NULL (např. entita -> zařízení -> oblast)"""
+    if np is not None:
+        lookup = np.asarray(lookup)
+        codes = np.asarray(codes)
+        if len(lookup) == 0:
+            return np.full(len(codes), NULL, dtype=codes.dtype)
+        return np.where(codes >= 0, lookup[np.clip(codes, 0, None)], NULL)
+
+    return array('l', (lookup[code] if code >= 0 else NULL for code in codes))
+
+
+def group_indices(codes: Sequence[int], size: int) -> List[List[int]]:
+    """Indexy řádků pro každý kód 0..size-1 (stabilně, v původním pořadí)"""
+    groups = [[] for _ in range(size)]
+    if np is not None:
+        codes = np.asarray(codes)
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        bounds = np.searchsorted(sorted_codes, np.arange(size + 1))
+        for code in range(size):
+            groups[code] = order[bounds[code]:bounds[code + 1]].tolist()
+        return groups
+
+    for row, code in enumerate(codes):
+        if code >= 0:
+            groups[code].append(row)
+    return groups
+
+
+def rates(counts: Sequence[int], hours: float) -> Sequence[float]:
+    """Počty událostí převedené na frekvenci za hodinu"""
+    hours = max(hours, 1e-9)
+    if np is not None:
+        return np.asarray(counts, dtype=np.float64) / hours
+    return [value / hours for value in counts]
+
+
+def top_indices(values: Sequence[float], n: int) -> List[int]:
+    """Indexy n největších hodnot (sestupně)"""
+    if np is not None:
+        values = np.asarray(values)
+        n = min(n, len(values))
+        if n == 0:
+            return []
+        top = np.argpartition(-values, n - 1)[:n]
+        return top[np.argsort(-values[top], kind="stable")].tolist()
+    return sorted(range(len(values)), key=lambda i: values[i], reverse=True)[:n]
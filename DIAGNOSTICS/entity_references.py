@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Entity References
+Index odkazů na entity z naparsovaného YAML (automatizace, skripty,
+šablony, balíčky včetně !include): entity_id ve všech tvarech (řetězec,
+seznam, target:, entities:) i entity v Jinja šablonách. Ukládá se jako
+obrácený index entita -> kdo ji používá, dotazy jsou O(1)
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from ha_yaml_engine import SECRETS_FILE, IncludeGraph, find_include_dir_files, parse_file
+from registry_loader import RegistryLoader
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Klíče, jejichž hodnotou jsou přímo entity
+ENTITY_KEYS = {"entity_id", "entity", "entities"}
+
+# Akce služeb - "{{ 'light.turn_on' if ... }}" v šabloně akce je služba, ne entita
+SERVICE_VERBS = {
+    "turn_on", "turn_off", "toggle", "reload", "press", "trigger", "select_option", "select_first",
+    "select_last", "select_next", "select_previous", "set_value", "set_datetime", "increment",
+    "decrement", "reset", "start", "pause", "cancel", "finish", "change", "open_cover", "close_cover",
+    "stop_cover", "toggle_cover_tilt", "set_cover_position", "open_valve", "close_valve", "lock",
+    "unlock", "open", "set_temperature", "set_hvac_mode", "set_preset_mode", "set_fan_mode",
+    "set_percentage", "set_direction", "oscillate", "play_media", "media_play", "media_pause",
+    "media_stop", "media_next_track", "media_previous_track", "volume_set", "volume_mute",
+    "send_command", "return_to_base", "clean_spot", "locate", "snapshot", "record", "install",
+    "skip", "apply", "create", "set_level", "set_options", "set_humidity", "set_mode",
+}
+
+# Domény entit - jen ty se v šablonách považují za odkaz (ne trigger.entity_id, now().hour...)
+ENTITY_DOMAINS = (
+    "air_quality", "alarm_control_panel", "automation", "binary_sensor", "button", "calendar",
+    "camera", "climate", "counter", "cover", "date", "datetime", "device_tracker", "event", "fan",
+    "group", "humidifier", "image", "input_boolean", "input_button", "input_datetime",
+    "input_number", "input_select", "input_text", "lawn_mower", "light", "lock", "media_player",
+    "number", "person", "plant", "remote", "scene", "schedule", "script", "select", "sensor",
+    "siren", "sun", "switch", "text", "time", "timer", "todo", "update", "vacuum", "valve",
+    "water_heater", "weather", "zone"
+)
+
+# states('sensor.x'), is_state("light.y", ...), states.sensor.x.state, expand('group.z')...
+_TEMPLATE_ENTITY_RE = re.compile(
+    r"(?<![\w.])(?:states\.)?((?:" + "|".join(ENTITY_DOMAINS) + r")\.[a-z0-9_]+)(?![\w(])"
+)
+_ENTITY_ID_RE = re.compile(r"^[a-z0-9_]+\.[a-z0-9_]+$")
+_TEMPLATE_MARKERS = ("{{", "{%")
+
+# Klíče configuration.yaml (i v balíčcích) - "automation manual:" apod. se počítá taky
+AUTOMATION_KEY = "automation"
+SCRIPT_KEY = "script"
+TEMPLATE_KEY = "template"
+CONVENTIONAL_FILES = {
+    AUTOMATION_KEY: "automations.yaml",
+    SCRIPT_KEY: "scripts.yaml",
+    TEMPLATE_KEY: "templates.yaml",
+}
+PACKAGES_DIR = "packages"
+
+
+def slugify(text: str) -> str:
+    """Zjednodušené slugify jako v HA (bez diakritiky, malá písmena, podtržítka)"""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", text.lower()).strip("_")
+
+
+def template_entities(text: str) -> Iterator[str]:
+    """Entity zmíněné v Jinja šabloně (bez jmen služeb a bez částí jmen skládaných šablonou)"""
+    for match in _TEMPLATE_ENTITY_RE.finditer(text):
+        entity_id = match.group(1)
+        if entity_id.partition(".")[2] in SERVICE_VERBS:
+            continue
+        if text.startswith(("{{", "{%"), match.end()):
+            continue  # "switch.turn_{{ ... }}" - začátek jména, ne celá entita
+        yield entity_id
+
+
+def iter_entity_values(value: Any) -> Iterator[str]:
+    """Entity z hodnoty klíče entity_id/entities: řetězec, 'a, b', seznam, slovník (scény)"""
+    if isinstance(value, str):
+        if any(marker in value for marker in _TEMPLATE_MARKERS):
+            yield from template_entities(value)
+            return
+        for part in value.split(","):
+            part = part.strip()
+            if _ENTITY_ID_RE.match(part):
+                yield part
+    elif isinstance(value, list):
+        for item in value:
+            if isinstance(item, dict):
+                # entities: [{entity: light.x}, ...] (karty, skupiny)
+                yield from iter_references(item)
+            else:
+                yield from iter_entity_values(item)
+    elif isinstance(value, dict):
+        for key in value:
+            if isinstance(key, str) and _ENTITY_ID_RE.match(key):
+                yield key
+        yield from iter_references(value)
+
+
+def iter_references(node: Any) -> Iterator[str]:
+    """Všechny entity v libovolně zanořené konfiguraci (iterativně, bez rekurze Pythonu)"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key in ENTITY_KEYS:
+                    yield from iter_entity_values(value)
+                elif isinstance(value, str):
+                    if any(marker in value for marker in _TEMPLATE_MARKERS):
+                        yield from template_entities(value)
+                elif isinstance(value, (dict, list)):
+                    stack.append(value)
+        elif isinstance(node, list):
+            stack.extend(item for item in node if isinstance(item, (dict, list)) or
+                         (isinstance(item, str) and any(marker in item for marker in _TEMPLATE_MARKERS)))
+        elif isinstance(node, str):
+            yield from template_entities(node)
+
+
+class IncludeResolver:
+    """Nahradí zástupné řetězce '!include ...' a '!secret ...' z ha_yaml_engine obsahem"""
+
+    def __init__(self, config_dir: Optional[str] = None):
+        self.cache: Dict[str, Any] = {}
+        self.files: List[str] = []
+        # secrets.yaml se hledá jako v HA - od adresáře souboru nahoru po konfiguraci
+        self.graph = IncludeGraph(config_dir) if config_dir else None
+
+    def secret(self, key: str, base_dir: str) -> Any:
+        if self.graph is None:
+            return None
+        secrets_file = self.graph.find_secret(os.path.join(base_dir, SECRETS_FILE), key)
+        if secrets_file is None:
+            return None
+        return self.graph.results[secrets_file].data.get(key)
+
+    def load(self, path: str, active: Tuple[str, ...] = ()) -> Any:
+        path = os.path.abspath(path)
+        if path in active:
+            logger.warning(f"Cyklický !include: {path}")
+            return None
+        if path not in self.cache:
+            result = parse_file(path)
+            if result.error:
+                logger.warning(f"Nelze načíst {path}: {result.error}")
+            self.files.append(path)
+            self.cache[path] = self.resolve(result.data, os.path.dirname(path), active + (path,))
+        return self.cache[path]
+
+    def resolve(self, value: Any, base_dir: str, active: Tuple[str, ...] = ()) -> Any:
+        if isinstance(value, dict):
+            return {key: self.resolve(item, base_dir, active) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.resolve(item, base_dir, active) for item in value]
+        if isinstance(value, str) and value.startswith("!secret "):
+            return self.secret(value[len("!secret "):].strip(), base_dir)
+        if not isinstance(value, str) or not value.startswith("!include"):
+            return value
+
+        tag, _, target = value.partition(" ")
+        target = os.path.normpath(os.path.join(base_dir, target))
+        if tag == "!include":
+            return self.load(target, active) if os.path.isfile(target) else None
+
+        files = find_include_dir_files(target) if os.path.isdir(target) else []
+        contents = [(file, self.load(file, active)) for file in files]
+        if tag == "!include_dir_list":
+            return [data for _, data in contents if data is not None]
+        if tag == "!include_dir_merge_list":
+            return [item for _, data in contents if isinstance(data, list) for item in data]
+        if tag == "!include_dir_named":
+            return {Path(file).stem: data for file, data in contents}
+        if tag == "!include_dir_merge_named":
+            merged = {}
+            for _, data in contents:
+                if isinstance(data, dict):
+                    merged.update(data)
+            return merged
+        return value
+
+
+class EntityReferenceIndex:
+    """Obrácený index: entita -> automatizace/skripty/šablony, které ji používají"""
+
+    def __init__(self):
+        self.referrers: Dict[str, Set[str]] = {}      # entita -> kdo ji používá
+        self.references: Dict[str, Set[str]] = {}     # automatizace/skript -> entity
+        self.kinds: Dict[str, str] = {}               # automatizace/skript -> druh
+        self.files: List[str] = []
+
+    def add(self, referrer: str, kind: str, config: Any):
+        entities = self.references.setdefault(referrer, set())
+        self.kinds[referrer] = kind
+        for entity_id in iter_references(config):
+            if entity_id == referrer:
+                continue
+            entities.add(entity_id)
+            self.referrers.setdefault(entity_id, set()).add(referrer)
+
+    def used_by(self, entity_id: str) -> Set[str]:
+        return self.referrers.get(entity_id, set())
+
+    def is_used(self, entity_id: str) -> bool:
+        return entity_id in self.referrers
+
+    def unused(self, entity_ids: Iterable[str]) -> List[str]:
+        return [entity_id for entity_id in entity_ids if entity_id not in self.referrers]
+
+    def of_kind(self, kind: str) -> Dict[str, List[str]]:
+        return {
+            referrer: sorted(self.references[referrer])
+            for referrer, referrer_kind in self.kinds.items() if referrer_kind == kind
+        }
+
+    def add_automations(self, config: Any):
+        automations = config if isinstance(config, list) else [config] if isinstance(config, dict) else []
+        for position, automation in enumerate(automations):
+            if not isinstance(automation, dict):
+                continue
+            name = automation.get("alias") or automation.get("id") or str(position)
+            self.add(f"automation.{slugify(name)}", "automation", automation)
+
+    def add_scripts(self, config: Any):
+        if isinstance(config, dict):
+            for script_id, script in config.items():
+                self.add(f"script.{script_id}", "script", script)
+
+    def add_templates(self, config: Any):
+        blocks = config if isinstance(config, list) else [config] if isinstance(config, dict) else []
+        for block in blocks:
+            if not isinstance(block, dict):
+                continue
+            # Spouštěče bloku platí pro všechny jeho entity
+            shared = {key: block[key] for key in ("trigger", "triggers", "condition", "conditions",
+                                                  "action", "actions") if key in block}
+            for domain, entities in block.items():
+                if domain not in ENTITY_DOMAINS:
+                    continue
+                for position, entity in enumerate(entities if isinstance(entities, list) else [entities]):
+                    if not isinstance(entity, dict):
+                        continue
+                    name = entity.get("name") or entity.get("unique_id") or f"template_{position}"
+                    if isinstance(name, str) and any(marker in name for marker in _TEMPLATE_MARKERS):
+                        name = entity.get("unique_id") or f"template_{position}"
+                    self.add(f"{domain}.{slugify(name)}", "template", [entity, shared])
+
+    def add_legacy_templates(self, domain: str, config: Any):
+        """sensor: - platform: template / sensors: {...}"""
+        for platform in config if isinstance(config, list) else []:
+            if isinstance(platform, dict) and platform.get("platform") == "template":
+                for object_id, entity in (platform.get("sensors") or {}).items():
+                    self.add(f"{domain}.{object_id}", "template", entity)
+
+    def add_configuration(self, config: Dict):
+        for key, value in config.items():
+            if not isinstance(key, str):
+                continue
+            integration = key.split(" ", 1)[0]
+            if integration == AUTOMATION_KEY:
+                self.add_automations(value)
+            elif integration == SCRIPT_KEY:
+                self.add_scripts(value)
+            elif integration == TEMPLATE_KEY:
+                self.add_templates(value)
+            elif integration in ("sensor", "binary_sensor"):
+                self.add_legacy_templates(integration, value)
+
+    @classmethod
+    def build(cls, config_path: Path) -> "EntityReferenceIndex":
+        """Index z configuration.yaml (s includy a balíčky), případně z konvenčních souborů"""
+        config_path = Path(config_path)
+        index = cls()
+        resolver = IncludeResolver(str(config_path))
+        configuration = config_path / "configuration.yaml"
+
+        config = resolver.load(str(configuration)) if configuration.exists() else None
+        if isinstance(config, dict):
+            index.add_configuration(config)
+            packages = (config.get("homeassistant") or {}).get("packages") if isinstance(config.get("homeassistant"), dict) else None
+            if isinstance(packages, dict):
+                for package in packages.values():
+                    if isinstance(package, dict):
+                        index.add_configuration(package)
+        else:
+            # Bez configuration.yaml: automations.yaml, scripts.yaml, templates.yaml, packages/
+            for key, name in CONVENTIONAL_FILES.items():
+                if (config_path / name).exists():
+                    index.add_configuration({key: resolver.load(str(config_path / name))})
+            packages_dir = config_path / PACKAGES_DIR
+            if packages_dir.is_dir():
+                packages = resolver.resolve(f"!include_dir_named {packages_dir}", str(config_path))
+                for package in packages.values():
+                    if isinstance(package, dict):
+                        index.add_configuration(package)
+
+        index.files = resolver.files
+        logger.info(
+            f"Index odkazů: {len(index.references)} automatizací/skriptů/šablon, "
+            f"{len(index.referrers)} odkazovaných entit, {len(index.files)} souborů"
+        )
+        return index
+
+    def to_dict(self) -> Dict:
+        return {
+            "referrers": {entity_id: sorted(users) for entity_id, users in sorted(self.referrers.items())},
+            "references": {referrer: sorted(entities) for referrer, entities in sorted(self.references.items())},
+            "files": self.files
+        }
+
+
+def registry_entity_ids(config_path: Path) -> List[str]:
+    """Entity z registru .storage/core.entity_registry"""
+    return list(RegistryLoader(config_path).entities.index())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Entity References")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--uses", metavar="ENTITY_ID", action="append", default=[],
+                        help="Kdo entitu používá (lze opakovat)")
+    parser.add_argument("--unused", action="store_true", help="Entity z registru, na které nic neodkazuje")
+    parser.add_argument("--json", action="store_true", help="Celý index jako JSON")
+    args = parser.parse_args()
+
+    index = EntityReferenceIndex.build(args.config)
+
+    if args.json:
+        json.dump(index.to_dict(), sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+
+    for entity_id in args.uses:
+        users = sorted(index.used_by(entity_id))
+        print(f"🔗 {entity_id}: {', '.join(users) if users else 'nikdo'}")
+
+    if args.unused:
+        unused = index.unused(registry_entity_ids(args.config))
+        print(f"💤 NEODKAZOVANÉ ENTITY ({len(unused)}):")
+        for entity_id in sorted(unused):
+            print(f"   {entity_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Scan Records
+Kompaktní záznamy (__slots__) pro oblasti, zařízení a entity:
+opakující se řetězce (domény, stavy, oblasti, výrobci) se internují
+a z JSON atributů se při vytvoření vytáhne jen to, co sken používá
+"""
+
+import sys
+import json
+from typing import List, Optional
+
+# Stavy delší než tento limit (např. JSON v senzoru) se neinternují
+_INTERN_STATE_MAX = 32
+
+
+def intern(value: Optional[str]) -> Optional[str]:
+    """Internuje řetězec (sdílená instance pro opakované hodnoty)"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class AreaRecord:
+    __slots__ = ("area_id", "name", "devices", "entities")
+
+    def __init__(self, area_id: str, name: str):
+        self.area_id = intern(area_id)
+        self.name = name
+        self.devices: List[str] = []
+        self.entities: List[str] = []
+
+
+class DeviceRecord:
+    __slots__ = ("id", "name", "area_id", "model", "manufacturer", "entities")
+
+    def __init__(self, device_id: str, name: Optional[str], area_id: Optional[str],
+                 model: Optional[str], manufacturer: Optional[str]):
+        self.id = device_id
+        self.name = name
+        self.area_id = intern(area_id)
+        self.model = intern(model)
+        self.manufacturer = intern(manufacturer)
+        self.entities: List[str] = []
+
+
+class EntityRecord:
+    """Entita bez slovníku atributů - JSON se dekóduje jednou a drží se jen použité klíče"""
+
+    __slots__ = ("entity_id", "domain", "state", "friendly_name", "device_id", "used_in_automations")
+
+    def __init__(self, entity_id: str, state: Optional[str], attributes_json: Optional[str] = None):
+        self.entity_id = entity_id
+        self.domain = sys.intern(entity_id.split('.', 1)[0])
+        self.state = intern(state) if state is not None and len(state) <= _INTERN_STATE_MAX else state
+        attributes = {}
+        if attributes_json:
+            try:
+                attributes = json.loads(attributes_json)
+            except ValueError:
+                pass
+            if not isinstance(attributes, dict):
+                attributes = {}
+        self.friendly_name = attributes.get("friendly_name")
+        # Záloha z atributů stavu - registr entit ji při skenu přepíše
+        self.device_id = intern(attributes.get("device_id"))
+        self.used_in_automations = False
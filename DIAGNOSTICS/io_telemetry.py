@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Home Assistant I/O Telemetry
+Lehký sběrač I/O statistik úložišť: v pevném intervalu čte /proc/diskstats,
+počítá zápis B/s, IOPS, frontu a await po zařízeních a ukládá řadu do
+kruhového bufferu na disku (binární soubor pevné velikosti)
+"""
+
+import os
+import sys
+import time
+import struct
+import signal
+import logging
+import argparse
+import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import storage_inventory
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DISKSTATS = Path("/proc/diskstats")
+SYS_BLOCK = Path("/sys/block")
+
+DEFAULT_RING_FILE = Path.home() / ".cache" / "ha_io_telemetry.ring"
+DEFAULT_INTERVAL = 30                          # s
+DEFAULT_CAPACITY = 7 * 24 * 3600 // DEFAULT_INTERVAL   # týden vzorků
+# Počet slotů zařízení se určí při vytvoření bufferu: zařízení v diskstats + rezerva
+# (USB disky připojené později), nejméně MIN_DEVICE_SLOTS
+MIN_DEVICE_SLOTS = 16
+SPARE_DEVICE_SLOTS = 8
+
+SECTOR_SIZE = 512
+U32_MAX = 0xFFFFFFFF
+
+# Zařízení, která nesledujeme (loop image, ramdisky, komprimovaný swap v RAM)
+IGNORED_PREFIXES = ("loop", "ram", "zram")
+
+MAGIC = b"HAIO"
+VERSION = 1
+# magic, verze, počet slotů zařízení, kapacita, další slot k zápisu, celkem zapsáno
+HEADER = struct.Struct("<4sHHIIQ")
+DEVICE_NAME_SIZE = 32
+
+# Pořadí čítačů ve vzorku (delty za interval)
+FIELDS = ("reads", "sectors_read", "read_ms", "writes", "sectors_written", "write_ms", "io_ms", "weighted_ms")
+
+
+class DiskCounters(NamedTuple):
+    reads: int
+    sectors_read: int
+    read_ms: int
+    writes: int
+    sectors_written: int
+    write_ms: int
+    in_flight: int
+    io_ms: int
+    weighted_ms: int
+
+
+def _parse_counters(values: List[str]) -> DiskCounters:
+    # reads, reads_merged, sectors_read, read_ms, writes, writes_merged, sectors_written,
+    # write_ms, in_flight, io_ms, weighted_ms
+    v = [int(value) for value in values[:11]]
+    return DiskCounters(v[0], v[2], v[3], v[4], v[6], v[7], v[8], v[9], v[10])
+
+
+def read_diskstats() -> Dict[str, DiskCounters]:
+    """Čítače všech zařízení jedním čtením /proc/diskstats (záloha: /sys/block/*/stat)"""
+    stats = {}
+    try:
+        with open(DISKSTATS, 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 14 and not fields[2].startswith(IGNORED_PREFIXES):
+                    stats[fields[2]] = _parse_counters(fields[3:])
+        return stats
+    except OSError:
+        pass
+
+    for stat_file in SYS_BLOCK.glob("*/stat"):
+        name = stat_file.parent.name
+        if name.startswith(IGNORED_PREFIXES):
+            continue
+        try:
+            stats[name] = _parse_counters(stat_file.read_text().split())
+        except (OSError, ValueError, IndexError):
+            continue
+    return stats
+
+
+def device_mountpoints() -> Dict[str, List[str]]:
+    """Jméno zařízení -> přípojné body (přes major:minor z mountinfo)"""
+    mounts = storage_inventory.read_mounts()
+    result = {}
+    for entry in storage_inventory.SYS_CLASS_BLOCK.iterdir():
+        try:
+            dev = (entry / "dev").read_text().strip()
+        except OSError:
+            continue
+        if dev in mounts:
+            result[entry.name] = [mount["mountpoint"] for mount in mounts[dev]]
+    return result
+
+
+class Sample(NamedTuple):
+    timestamp: float
+    interval: float
+    devices: Dict[str, Tuple[int, ...]]   # jméno -> delty v pořadí FIELDS
+
+
+class RingBuffer:
+    """Kruhový buffer vzorků v souboru pevné velikosti
+
+    Hlavička + tabulka jmen zařízení (pevný počet slotů), pak `capacity`
+    záznamů stejné délky. Zápis vzorku = jeden pwrite záznamu + hlavičky.
+    """
+
+    def __init__(self, path: Path, capacity: int = DEFAULT_CAPACITY, max_devices: Optional[int] = None):
+        self.path = Path(path)
+        exists = self.path.exists() and self.path.stat().st_size >= HEADER.size
+        if not exists:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        if exists:
+            magic, version, max_devices, capacity, self.head, self.total = HEADER.unpack(
+                os.pread(self.fd, HEADER.size, 0)
+            )
+            if magic != MAGIC or version != VERSION:
+                os.close(self.fd)
+                raise ValueError(f"{self.path} není soubor I/O telemetrie (verze {VERSION})")
+        else:
+            self.head = self.total = 0
+            if max_devices is None:
+                max_devices = max(MIN_DEVICE_SLOTS, len(read_diskstats()) + SPARE_DEVICE_SLOTS)
+
+        self.capacity = capacity
+        self.max_devices = max_devices
+        self.record = struct.Struct(f"<df{len(FIELDS) * max_devices}I")
+        self.data_offset = HEADER.size + DEVICE_NAME_SIZE * max_devices
+        self.refused = set()
+
+        if exists:
+            table = os.pread(self.fd, DEVICE_NAME_SIZE * max_devices, HEADER.size)
+            self.devices = [
+                table[i:i + DEVICE_NAME_SIZE].rstrip(b"\0").decode()
+                for i in range(0, len(table), DEVICE_NAME_SIZE)
+            ]
+        else:
+            self.devices = [""] * max_devices
+            os.ftruncate(self.fd, self.data_offset + self.record.size * capacity)
+            self._write_header()
+            self._write_device_table()
+
+    def _write_header(self):
+        os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, self.max_devices, self.capacity, self.head, self.total), 0)
+
+    def _write_device_table(self):
+        table = b"".join(name.encode()[:DEVICE_NAME_SIZE].ljust(DEVICE_NAME_SIZE, b"\0") for name in self.devices)
+        os.pwrite(self.fd, table, HEADER.size)
+
+    def slot(self, device: str) -> Optional[int]:
+        """Slot zařízení; nové zařízení obsadí volný slot (plná tabulka -> None)"""
+        try:
+            return self.devices.index(device)
+        except ValueError:
+            pass
+        try:
+            index = self.devices.index("")
+        except ValueError:
+            if device not in self.refused:
+                self.refused.add(device)
+                logger.warning(f"⚠️  Tabulka zařízení v {self.path} je plná ({self.max_devices} slotů) - "
+                               f"{device} se nesleduje (smažte soubor, vytvoří se větší)")
+            return None
+        self.devices[index] = device
+        self._write_device_table()
+        return index
+
+    def append(self, sample: Sample):
+        values = [0] * (len(FIELDS) * self.max_devices)
+        for device, deltas in sample.devices.items():
+            index = self.slot(device)
+            if index is None:
+                continue
+            start = index * len(FIELDS)
+            values[start:start + len(FIELDS)] = [min(max(delta, 0), U32_MAX) for delta in deltas]
+
+        record = self.record.pack(sample.timestamp, sample.interval, *values)
+        os.pwrite(self.fd, record, self.data_offset + self.head * self.record.size)
+        self.head = (self.head + 1) % self.capacity
+        self.total += 1
+        self._write_header()
+
+    def __iter__(self) -> Iterator[Sample]:
+        """Vzorky od nejstaršího"""
+        count = min(self.total, self.capacity)
+        first = (self.head - count) % self.capacity
+        width = len(FIELDS)
+        for i in range(count):
+            position = (first + i) % self.capacity
+            data = os.pread(self.fd, self.record.size, self.data_offset + position * self.record.size)
+            timestamp, interval, *values = self.record.unpack(data)
+            devices = {
+                name: tuple(values[slot * width:(slot + 1) * width])
+                for slot, name in enumerate(self.devices) if name
+            }
+            yield Sample(timestamp, interval, devices)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def deltas(previous: Dict[str, DiskCounters], current: Dict[str, DiskCounters]) -> Dict[str, Tuple[int, ...]]:
+    """Rozdíly čítačů mezi dvěma čteními (nová/zmizelá zařízení se přeskočí)"""
+    result = {}
+    for name, now in current.items():
+        before = previous.get(name)
+        if before is None:
+            continue
+        result[name] = tuple(getattr(now, field) - getattr(before, field) for field in FIELDS)
+    return result
+
+
+def collect(ring: RingBuffer, interval: float = DEFAULT_INTERVAL, samples: int = None):
+    """Smyčka sběru: čtení diskstats v pevném intervalu (bez driftu), zápis do bufferu"""
+    running = True
+
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    previous = read_diskstats()
+    previous_time = time.monotonic()
+    next_tick = previous_time + interval
+    written = 0
+    while running and (samples is None or written < samples):
+        time.sleep(max(0.0, next_tick - time.monotonic()))
+        next_tick += interval
+        if not running:
+            break
+
+        current = read_diskstats()
+        now = time.monotonic()
+        ring.append(Sample(time.time(), now - previous_time, deltas(previous, current)))
+        previous, previous_time = current, now
+        written += 1
+
+
+def summarize(ring: RingBuffer, since: float = 0.0) -> Dict[str, Dict]:
+    """Souhrn po zařízeních: zapsané bajty, průměrné a špičkové B/s, IOPS, await, fronta"""
+    totals: Dict[str, Dict] = {}
+    for sample in ring:
+        if sample.timestamp < since or sample.interval <= 0:
+            continue
+        for name, values in sample.devices.items():
+            d = dict(zip(FIELDS, values))
+            entry = totals.setdefault(name, {
+                "seconds": 0.0, "write_bytes": 0, "read_bytes": 0, "ios": 0,
+                "io_ms": 0, "weighted_ms": 0, "peak_write_bps": 0.0
+            })
+            entry["seconds"] += sample.interval
+            entry["write_bytes"] += d["sectors_written"] * SECTOR_SIZE
+            entry["read_bytes"] += d["sectors_read"] * SECTOR_SIZE
+            entry["ios"] += d["reads"] + d["writes"]
+            entry["io_ms"] += d["read_ms"] + d["write_ms"]
+            entry["weighted_ms"] += d["weighted_ms"]
+            entry["peak_write_bps"] = max(entry["peak_write_bps"], d["sectors_written"] * SECTOR_SIZE / sample.interval)
+
+    summary = {}
+    for name, entry in totals.items():
+        seconds = entry["seconds"] or 1.0
+        summary[name] = {
+            "seconds": round(entry["seconds"], 1),
+            "write_bytes": entry["write_bytes"],
+            "read_bytes": entry["read_bytes"],
+            "write_bps": round(entry["write_bytes"] / seconds, 1),
+            "peak_write_bps": round(entry["peak_write_bps"], 1),
+            "iops": round(entry["ios"] / seconds, 2),
+            "await_ms": round(entry["io_ms"] / entry["ios"], 2) if entry["ios"] else 0.0,
+            "queue_depth": round(entry["weighted_ms"] / (seconds * 1000), 3),
+            "write_gb_per_day": round(entry["write_bytes"] / seconds * 86400 / 1e9, 3)
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant I/O Telemetry")
+    parser.add_argument("--ring", type=Path, default=DEFAULT_RING_FILE,
+                        help=f"Soubor kruhového bufferu (výchozí: {DEFAULT_RING_FILE})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Spustí sběr vzorků")
+    run.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                     help=f"Interval vzorkování v sekundách (výchozí: {DEFAULT_INTERVAL})")
+    run.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                     help=f"Počet vzorků v bufferu při jeho vytvoření (výchozí: {DEFAULT_CAPACITY})")
+    run.add_argument("--samples", type=int, default=None, help="Ukončit po N vzorcích")
+
+    report = subparsers.add_parser("report", help="Souhrn zápisů po zařízeních")
+    report.add_argument("--since-hours", type=float, default=None, help="Jen vzorky za posledních N hodin")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        ring = RingBuffer(args.ring, capacity=args.capacity)
+        logger.info(f"📈 Sběr I/O telemetrie každých {args.interval:g} s do {args.ring}")
+        try:
+            collect(ring, args.interval, args.samples)
+        finally:
+            ring.close()
+        return
+
+    if not args.ring.exists():
+        print(f"❌ Soubor telemetrie {args.ring} neexistuje - spusťte nejdřív 'run'")
+        sys.exit(1)
+
+    ring = RingBuffer(args.ring)
+    since = time.time() - args.since_hours * 3600 if args.since_hours else 0.0
+    summary = summarize(ring, since)
+    ring.close()
+    mountpoints = device_mountpoints()
+
+    print("💾 ZÁPISY PODLE ZAŘÍZENÍ")
+    print("-" * 40)
+    for name, entry in sorted(summary.items(), key=lambda item: item[1]["write_bytes"], reverse=True):
+        print(f"{name} ({', '.join(mountpoints.get(name, [])) or 'nepřipojeno'}):")
+        print(f"   Zapsáno: {entry['write_bytes'] / 1e6:.1f} MB za {datetime.timedelta(seconds=int(entry['seconds']))} "
+              f"({entry['write_gb_per_day']} GB/den)")
+        print(f"   Zápis: průměr {entry['write_bps'] / 1e3:.1f} kB/s, špička {entry['peak_write_bps'] / 1e3:.1f} kB/s")
+        print(f"   IOPS: {entry['iops']}, await: {entry['await_ms']} ms, fronta: {entry['queue_depth']}")
+
+
+if __name__ == "__main__":
+    main()
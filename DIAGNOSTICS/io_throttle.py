@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Home Assistant I/O Throttle
+Šetrná hromadná kopie za běhu HA: idle I/O třída (ioprio_set / ionice),
+strop propustnosti a adaptivní zpomalení podle latence fsync měřené
+na zařízení recorderu - commity databáze mají přednost před migrací
+"""
+
+import os
+import time
+import ctypes
+import threading
+import logging
+import platform
+import subprocess
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ioprio_set(2): číslo syscallu podle architektury
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "armv7l": 314, "armv6l": 314, "i686": 289}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+
+PROBE_NAME = ".ha_fsync_probe"
+PROBE_BLOCK = 4096
+DEFAULT_PROBE_INTERVAL = 1.0      # s mezi měřeními fsync
+DEFAULT_MAX_FSYNC_MS = 50.0       # nad touto latencí commitu recorderu zpomalujeme
+MIN_RATE = 1024 * 1024            # B/s - kopie se nikdy úplně nezastaví
+RECOVERY_STEP = 0.1               # o kolik (podíl stropu) se rychlost vrací po každém klidném měření
+BURST_SECONDS = 0.5               # max. naspořený kredit - pauza se nepromění v dávku plnou rychlostí
+
+
+def set_idle_priority() -> bool:
+    """Přepne volající proces do idle I/O třídy (disk dostane, jen když nikdo jiný nečeká)"""
+    number = _IOPRIO_SET.get(platform.machine())
+    if number is not None:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.syscall(number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0:
+            return True
+        logger.debug(f"ioprio_set selhal: {os.strerror(ctypes.get_errno())}")
+
+    try:
+        subprocess.run(['ionice', '-c', '3', '-p', str(os.getpid())], check=True,
+                       capture_output=True, timeout=5)
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+class FsyncProbe:
+    """Latence zápisu 4k + fdatasync v adresáři recorderu - to, co čeká commit SQLite"""
+
+    def __init__(self, directory: Path):
+        self.path = Path(directory) / PROBE_NAME
+        self.data = os.urandom(PROBE_BLOCK)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    def measure(self) -> float:
+        """Jedno měření v ms (přepisuje stále stejný blok - žádný růst souboru)"""
+        start = time.perf_counter()
+        os.pwrite(self.fd, self.data, 0)
+        os.fdatasync(self.fd)
+        return (time.perf_counter() - start) * 1000
+
+    def close(self):
+        os.close(self.fd)
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+class Throttle:
+    """Strop propustnosti kopie (token bucket s omezeným kreditem); se sondou fsync ho
+    při zahlcení snižuje na polovinu a po uklidnění postupně vrací (AIMD jako TCP)
+
+    Kredit za nečinnost (ověřování, přechod mezi migracemi) je omezený na
+    BURST_SECONDS stropu - další kopie nezačne plnou rychlostí. Sdílí se
+    mezi vlákny (paralelní ověřování), čekání probíhá mimo zámek.
+    """
+
+    def __init__(self, bwlimit: Optional[float] = None, probe: Optional[FsyncProbe] = None,
+                 max_fsync_ms: float = DEFAULT_MAX_FSYNC_MS, probe_interval: float = DEFAULT_PROBE_INTERVAL):
+        self.bwlimit = bwlimit            # B/s, None = bez pevného stropu
+        self.rate = bwlimit
+        self.probe = probe
+        self.max_fsync_ms = max_fsync_ms
+        self.probe_interval = probe_interval
+        self.started = time.monotonic()
+        self.tokens = 0.0
+        self.last_refill = self.started
+        # Okno jen pro měření dosažené rychlosti (výchozí bod adaptace bez stropu)
+        self.window_start = self.started
+        self.window_bytes = 0
+        self.next_probe = self.started + probe_interval
+        self.last_latency: Optional[float] = None
+        self.backoffs = 0
+        self.lock = threading.Lock()
+
+    def consume(self, count: int):
+        """Započítá přenesené bajty a počká, pokud je kredit vyčerpaný (dluh se splácí čekáním)"""
+        with self.lock:
+            self.window_bytes += count
+            now = time.monotonic()
+            if self.probe and now >= self.next_probe:
+                self.adapt(now)
+                now = time.monotonic()
+            if not self.rate:
+                return
+            self.tokens = min(self.rate * BURST_SECONDS, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= count
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+    def adapt(self, now: float):
+        latency = self.last_latency = self.probe.measure()
+        self.next_probe = now + self.probe_interval
+        observed = self.window_bytes / max(now - self.window_start, 1e-3)
+
+        if latency > self.max_fsync_ms:
+            # Bez pevného stropu se začíná od skutečně dosažené rychlosti
+            self.rate = max(MIN_RATE, (self.rate or observed) / 2)
+            self.backoffs += 1
+            logger.info(f"🐢 fsync recorderu {latency:.1f} ms > {self.max_fsync_ms:g} ms - "
+                        f"kopie zpomalena na {self.rate / 1e6:.1f} MB/s")
+        elif self.rate and latency < self.max_fsync_ms / 2:
+            if self.bwlimit:
+                self.rate = min(self.bwlimit, self.rate + self.bwlimit * RECOVERY_STEP)
+            else:
+                self.rate *= 1 + RECOVERY_STEP
+        if self.rate:
+            # Nižší strop platí hned - naspořený kredit se zkrátí na nový limit
+            self.tokens = min(self.tokens, self.rate * BURST_SECONDS)
+        self.window_start, self.window_bytes = now, 0
+
+    def close(self):
+        if self.probe:
+            self.probe.close()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Migration Engine
+Přesun dat mezi úložišti: kopie v jádře (copy_file_range/sendfile) po
+blocích, paralelní ověření kontrolních součtů a žurnál, podle kterého
+přerušená migrace (recorder, media) pokračuje tam, kde skončila;
+za běhu HA lze kopii omezit (io_throttle.Throttle)
+"""
+
+import os
+import json
+import stat
+import errno
+import shutil
+import hashlib
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from io_throttle import Throttle
+
+logger = logging.getLogger(__name__)
+
+# Žurnál leží vedle cílového adresáře (.<cíl>.ha_migration_journal.jsonl), ne v migrovaných datech
+JOURNAL_SUFFIX = ".ha_migration_journal.jsonl"
+PARTIAL_SUFFIX = ".ha_partial"
+
+CHUNK_SIZE = 64 * 1024 * 1024          # jedno volání copy_file_range / sendfile
+CHECKPOINT_SIZE = 256 * 1024 * 1024    # po kolika bajtech fsync a záznam pozice do žurnálu
+HASH_BUFFER = 4 * 1024 * 1024
+THROTTLED_CHUNK_SIZE = 4 * 1024 * 1024  # s omezením menší bloky, ať zápisy netečou v dávkách
+
+
+def file_checksum(path: Path, throttle: Optional[Throttle] = None) -> str:
+    """SHA-256 souboru (hashlib uvolňuje GIL - vlákna hashují paralelně); čtení podléhá stropu"""
+    digest = hashlib.sha256()
+    with open(path, 'rb', buffering=0) as f:
+        buffer = bytearray(HASH_BUFFER)
+        view = memoryview(buffer)
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+            if throttle:
+                throttle.consume(count)
+    return digest.hexdigest()
+
+
+def _copy_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """Zkopíruje až count bajtů od offsetu v jádře; vrací počet zkopírovaných"""
+    if hasattr(os, "copy_file_range"):
+        try:
+            return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+        except OSError as e:
+            # EXDEV na starších jádrech, EINVAL/ENOSYS/EOPNOTSUPP na některých filesystémech
+            if e.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                raise
+
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    try:
+        return os.sendfile(dst_fd, src_fd, offset, count)
+    except OSError as e:
+        if e.errno not in (errno.EINVAL, errno.ENOSYS):
+            raise
+
+    # Poslední možnost: čtení/zápis v uživatelském prostoru
+    data = os.pread(src_fd, min(count, HASH_BUFFER), offset)
+    return os.pwrite(dst_fd, data, offset) if data else 0
+
+
+class MigrationJournal:
+    """Žurnál migrace (JSON lines vedle cílového adresáře) - poslední záznam souboru platí"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # useknutý poslední řádek po pádu
+                    self.entries[entry["file"]] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, file: str, state: str, sync: bool = False, **fields):
+        entry = {"file": file, "state": state, **fields}
+        self.entries[file] = entry
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        if sync:
+            os.fsync(self.file.fileno())
+
+    def get(self, file: str) -> Optional[Dict]:
+        return self.entries.get(file)
+
+    def close(self):
+        self.file.close()
+
+
+class MigrationEngine:
+    """Kopie adresáře/souboru na nové úložiště s ověřením a možností pokračovat"""
+
+    def __init__(self, source: Path, target: Path, jobs: int = 4, verify: bool = True,
+                 throttle: Optional[Throttle] = None):
+        self.source = Path(source)
+        self.target = Path(target)
+        self.jobs = jobs
+        self.verify = verify
+        self.throttle = throttle
+        # Jeden soubor (např. databáze recorderu) se kopíruje do cílového adresáře
+        self.single_file = self.source.is_file()
+        self.journal_path = self.target.with_name(f".{self.target.name}{JOURNAL_SUFFIX}")
+        self.journal = MigrationJournal(self.journal_path)
+        self.stats = {"files": 0, "skipped": 0, "bytes": 0, "verified": 0, "failed": []}
+
+    def iter_files(self) -> Iterator[Tuple[str, os.stat_result]]:
+        """(relativní cesta, stat) běžných souborů a symlinků zdroje; nic nevytváří
+
+        FIFO, sockety a zařízení se přeskočí - open() na FIFO by zablokoval kopii.
+        """
+        if self.single_file:
+            yield self.source.name, self.source.stat()
+            return
+
+        stack = [self.source]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                logger.warning(f"Nelze číst {directory}: {e}")
+                continue
+            for entry in entries:
+                path = Path(entry.path)
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(path)
+                    continue
+                info = entry.stat(follow_symlinks=False)
+                if stat.S_ISREG(info.st_mode) or stat.S_ISLNK(info.st_mode):
+                    yield str(path.relative_to(self.source)), info
+                else:
+                    logger.warning(f"⚠️  Přeskakuji speciální soubor {path} (FIFO/socket/zařízení)")
+
+    def source_path(self, relative: str) -> Path:
+        return self.source if self.single_file else self.source / relative
+
+    def is_done(self, relative: str, info: os.stat_result) -> bool:
+        entry = self.journal.get(relative)
+        return (
+            entry is not None
+            and entry["state"] in ("copied", "verified")
+            and entry.get("size") == info.st_size
+            and entry.get("mtime_ns") == info.st_mtime_ns
+            and os.path.lexists(self.target / relative)
+        )
+
+    def copy_file(self, relative: str, info: os.stat_result):
+        """Kopie po blocích přes .ha_partial; po pádu pokračuje od posledního checkpointu"""
+        src = self.source_path(relative)
+        dst = self.target / relative
+        partial = dst.with_name(dst.name + PARTIAL_SUFFIX)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+
+        if stat.S_ISLNK(info.st_mode):
+            if os.path.lexists(dst):
+                dst.unlink()
+            os.symlink(os.readlink(src), dst)
+            self.journal.record(relative, "copied", size=info.st_size, mtime_ns=info.st_mtime_ns)
+            return
+
+        # Pokračování jen pro stejnou verzi zdroje a do potvrzeného (fsync) offsetu
+        entry = self.journal.get(relative)
+        offset = 0
+        if (entry and entry["state"] == "partial" and entry.get("size") == info.st_size
+                and entry.get("mtime_ns") == info.st_mtime_ns and partial.exists()):
+            offset = entry.get("offset", 0)
+            logger.info(f"↪️  Pokračuji v kopii {relative} od {offset / 1e6:.0f} MB")
+
+        src_fd = os.open(src, os.O_RDONLY)
+        dst_fd = os.open(partial, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            os.ftruncate(dst_fd, offset)
+            checkpoint = offset
+            while offset < info.st_size:
+                copied = self.copy_chunk(src_fd, dst_fd, offset, min(CHUNK_SIZE, info.st_size - offset))
+                if copied <= 0:
+                    raise IOError(f"Zdroj {src} se během kopie zkrátil")
+                offset += copied
+                self.stats["bytes"] += copied
+                if offset - checkpoint >= CHECKPOINT_SIZE:
+                    os.fsync(dst_fd)
+                    self.journal.record(relative, "partial", size=info.st_size,
+                                        mtime_ns=info.st_mtime_ns, offset=offset)
+                    checkpoint = offset
+            os.fsync(dst_fd)
+        finally:
+            os.close(src_fd)
+            os.close(dst_fd)
+
+        shutil.copystat(src, partial)
+        try:
+            os.chown(partial, info.st_uid, info.st_gid)
+        except PermissionError:
+            pass
+        os.replace(partial, dst)
+        self.journal.record(relative, "copied", sync=True, size=info.st_size, mtime_ns=info.st_mtime_ns)
+
+    def copy_chunk(self, src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+        if not self.throttle:
+            return _copy_range(src_fd, dst_fd, offset, count)
+
+        # Každý blok hned zapsat na disk - jinak by ho jádro z page cache
+        # odepsalo najednou a strop by platil jen pro plnění cache
+        copied = _copy_range(src_fd, dst_fd, offset, min(count, THROTTLED_CHUNK_SIZE))
+        if copied > 0:
+            os.fdatasync(dst_fd)
+            self.throttle.consume(copied)
+        return copied
+
+    def verify_file(self, relative: str) -> Tuple[str, bool, Optional[str]]:
+        src = self.source_path(relative)
+        dst = self.target / relative
+        if src.is_symlink():
+            return relative, os.readlink(src) == os.readlink(dst), None
+        source_sum = file_checksum(src, self.throttle)
+        return relative, source_sum == file_checksum(dst, self.throttle), source_sum
+
+    def verify_files(self, files: List[str]):
+        """Paralelní ověření SHA-256 zdroje a cíle"""
+        if not files:
+            return
+        logger.info(f"🔍 Ověřuji kontrolní součty {len(files)} souborů ({self.jobs} vláken)...")
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for relative, ok, checksum in executor.map(self.verify_file, files):
+                entry = self.journal.get(relative) or {}
+                if ok:
+                    self.journal.record(relative, "verified", size=entry.get("size"),
+                                        mtime_ns=entry.get("mtime_ns"), sha256=checksum)
+                    self.stats["verified"] += 1
+                else:
+                    # Kopie se při dalším běhu zopakuje
+                    self.journal.record(relative, "mismatch", size=entry.get("size"), mtime_ns=entry.get("mtime_ns"))
+                    self.stats["failed"].append(relative)
+                    logger.error(f"❌ Kontrolní součet nesouhlasí: {relative}")
+
+    def run(self) -> Dict:
+        logger.info(f"🚚 Migrace {self.source} -> {self.target}")
+        self.target.mkdir(parents=True, exist_ok=True)
+        to_verify = []
+        try:
+            for relative, info in self.iter_files():
+                if self.is_done(relative, info):
+                    self.stats["skipped"] += 1
+                    if self.journal.get(relative)["state"] != "verified":
+                        to_verify.append(relative)
+                    continue
+                try:
+                    self.copy_file(relative, info)
+                except OSError as e:
+                    logger.error(f"❌ Kopie {relative} selhala: {e}")
+                    self.stats["failed"].append(relative)
+                    continue
+                self.stats["files"] += 1
+                to_verify.append(relative)
+
+            if self.verify:
+                self.verify_files(to_verify)
+        finally:
+            self.journal.close()
+
+        logger.info(
+            f"✅ Zkopírováno {self.stats['files']} souborů ({self.stats['bytes'] / 1e6:.1f} MB), "
+            f"přeskočeno {self.stats['skipped']}, ověřeno {self.stats['verified']}, "
+            f"chyby {len(self.stats['failed'])}"
+        )
+        return self.stats
+
+    @staticmethod
+    def unchanged_since_verify(entry: Optional[Dict], info: os.stat_result) -> bool:
+        """Ověřený soubor, který od kopie nikdo nezměnil (velikost a mtime podle žurnálu)"""
+        return (
+            entry is not None
+            and entry["state"] == "verified"
+            and entry.get("size") == info.st_size
+            and entry.get("mtime_ns") == info.st_mtime_ns
+        )
+
+    def remove_source(self):
+        """Smaže zdroj - jen pokud jsou všechny soubory ověřené a od ověření nezměněné
+
+        Za běhu HA se soubor může změnit i po ověření, proto se stat porovná
+        se žurnálem ještě jednou těsně před smazáním každého souboru. Soubory,
+        které mezitím přibyly, zůstanou (adresář se pak nesmaže).
+        """
+        journal = MigrationJournal(self.journal_path)
+        journal.close()
+        files = list(self.iter_files())
+        for relative, info in files:
+            if not self.unchanged_since_verify(journal.get(relative), info):
+                raise RuntimeError(f"Soubor {relative} není ověřen nebo se od ověření změnil - zdroj se nemaže")
+
+        for relative, _ in files:
+            path = self.source_path(relative)
+            if not self.unchanged_since_verify(journal.get(relative), os.lstat(path)):
+                raise RuntimeError(f"Soubor {relative} se změnil během mazání - zbytek zdroje zůstává")
+            path.unlink()
+
+        if not self.single_file:
+            kept = []
+            for directory, _, _ in os.walk(self.source, topdown=False):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    kept.append(directory)
+            if kept:
+                logger.warning(f"⚠️  Ve zdroji přibyly soubory, ponechány adresáře: {', '.join(kept)}")
+                return
+        # Zdroj je pryč, není v čem pokračovat
+        self.journal_path.unlink(missing_ok=True)
+        logger.info(f"🗑️  Zdroj {self.source} smazán")
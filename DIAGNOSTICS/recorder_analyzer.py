@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Recorder Bloat Analyzer
+Zjistí, odkud pochází velikost databáze recorderu (entity, domény, atributy,
+statistics_short_term), a navrhne blok recorder: exclude: s odhadem úspory
+"""
+
+import os
+import argparse
+import datetime
+import logging
+from pathlib import Path
+from typing import Dict, Any
+
+from recorder_db import get_recorder
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Přibližná režie jednoho řádku (timestampy, id, context) bez textu stavu/atributů
+STATE_ROW_OVERHEAD = 90
+STATISTICS_ROW_BYTES = 80
+
+
+class RecorderBloatAnalyzer:
+    def __init__(self, config_path: str = "/config", db_url: str = None, ha_stopped: bool = False,
+                 rate_threshold: float = 60.0, min_share: float = 0.01, top: int = 20):
+        self.config_path = Path(config_path)
+        self.recorder = get_recorder(self.config_path, db_url=db_url, ha_stopped=ha_stopped)
+        self.rate_threshold = rate_threshold
+        self.min_share = min_share
+        self.top = top
+
+    def scan_states(self) -> Dict[str, Dict]:
+        """Jeden průchod tabulkou states v pořadí state_id (≈ chronologicky)
+
+        Paměť je omezená počtem entit - pro každou se drží jen konstantní
+        agregace. Nový blob atributů se počítá při změně attributes_id
+        oproti předchozímu řádku entity (u starého schématu je každý řádek blob),
+        proto ORDER BY - MariaDB pořadí bez něj nezaručuje (primární klíč = levné).
+        """
+        logger.info("Procházím tabulku states...")
+        schema = self.recorder.schema
+        attributes_join, attributes = self.recorder.attributes_column()
+        key = "s.metadata_id" if schema["states_meta"] else "s.entity_id"
+        attributes_id = "s.attributes_id" if schema["state_attributes"] else "NULL"
+        updated = self.recorder.timestamp_column()
+
+        stats = {}
+        for entity_key, attr_id, state_len, ts, attr_len in self.recorder.stream(f"""
+            SELECT {key}, {attributes_id}, LENGTH(s.state), {updated}, LENGTH({attributes})
+            FROM states s
+            {attributes_join}
+            ORDER BY s.state_id
+        """):
+            entry = stats.get(entity_key)
+            if entry is None:
+                entry = stats[entity_key] = {
+                    "rows": 0, "state_bytes": 0, "attribute_bytes": 0, "attribute_blobs": 0,
+                    "first_ts": ts, "last_ts": ts, "last_attributes_id": None
+                }
+            entry["rows"] += 1
+            entry["state_bytes"] += STATE_ROW_OVERHEAD + (state_len or 0)
+            if attr_id is None or attr_id != entry["last_attributes_id"]:
+                entry["attribute_blobs"] += 1
+                entry["attribute_bytes"] += attr_len or 0
+                entry["last_attributes_id"] = attr_id
+            if ts is not None:
+                if entry["first_ts"] is None or ts < entry["first_ts"]:
+                    entry["first_ts"] = ts
+                if entry["last_ts"] is None or ts > entry["last_ts"]:
+                    entry["last_ts"] = ts
+
+        if schema["states_meta"]:
+            names = dict(self.recorder.query("SELECT metadata_id, entity_id FROM states_meta"))
+            stats = {names.get(k, f"metadata_id:{k}"): v for k, v in stats.items()}
+
+        for entity_id, entry in stats.items():
+            del entry["last_attributes_id"]
+            hours = max(1.0, ((entry["last_ts"] or 0) - (entry["first_ts"] or 0)) / 3600)
+            entry["states_per_hour"] = round(entry["rows"] / hours, 2)
+            entry["bytes"] = entry["state_bytes"] + entry["attribute_bytes"]
+            entry["domain"] = entity_id.split(".")[0]
+
+        return stats
+
+    def scan_attribute_duplicates(self) -> Dict[str, int]:
+        """Bloby atributů uložené vícekrát se stejným hashem (duplicitní obsah)"""
+        if not self.recorder.schema["state_attributes"]:
+            return {"total_blobs": 0, "total_bytes": 0, "duplicate_blobs": 0, "duplicate_bytes": 0}
+
+        total_blobs, total_bytes = self.recorder.query(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(shared_attrs)), 0) FROM state_attributes"
+        )[0]
+        duplicate_blobs = duplicate_bytes = 0
+        for count, size in self.recorder.stream("""
+            SELECT COUNT(*), SUM(LENGTH(shared_attrs)) / COUNT(*)
+            FROM state_attributes
+            GROUP BY hash
+            HAVING COUNT(*) > 1
+        """):
+            duplicate_blobs += count - 1
+            duplicate_bytes += (count - 1) * int(size or 0)
+
+        return {
+            "total_blobs": total_blobs,
+            "total_bytes": int(total_bytes),
+            "duplicate_blobs": duplicate_blobs,
+            "duplicate_bytes": duplicate_bytes
+        }
+
+    def scan_short_term_statistics(self) -> Dict[str, Dict]:
+        """Počty řádků statistics_short_term podle statistic_id (přes index metadata_id)"""
+        if "statistics_short_term" not in self.recorder.schema["tables"]:
+            return {}
+
+        results = {}
+        for statistic_id, rows in self.recorder.stream("""
+            SELECT m.statistic_id, COUNT(*)
+            FROM statistics_short_term st
+            JOIN statistics_meta m ON m.id = st.metadata_id
+            GROUP BY m.statistic_id
+        """):
+            results[statistic_id] = {"rows": rows, "bytes": rows * STATISTICS_ROW_BYTES}
+        return results
+
+    def database_size(self) -> int:
+        """Skutečná velikost databáze (SQLite soubor vč. WAL, u MariaDB data+indexy)"""
+        if self.recorder.dialect == "sqlite":
+            path = self.recorder.sqlite_path
+            return sum(
+                os.path.getsize(f"{path}{suffix}")
+                for suffix in ("", "-wal")
+                if os.path.exists(f"{path}{suffix}")
+            )
+        return int(self.recorder.scalar(
+            "SELECT COALESCE(SUM(data_length + index_length), 0) "
+            "FROM information_schema.tables WHERE table_schema = DATABASE()"
+        ) or 0)
+
+    def plan_excludes(self, entities: Dict[str, Dict], statistics: Dict[str, Dict]) -> Dict[str, Any]:
+        """Vybere hlučné entity (vysoká frekvence nebo podíl na velikosti) a celé domény"""
+        total_bytes = sum(e["bytes"] for e in entities.values()) or 1
+        noisy = {
+            entity_id for entity_id, entry in entities.items()
+            if entry["states_per_hour"] >= self.rate_threshold
+            and entry["bytes"] / total_bytes >= self.min_share
+        }
+
+        by_domain = {}
+        for entity_id, entry in entities.items():
+            by_domain.setdefault(entry["domain"], []).append(entity_id)
+        domains = sorted(
+            domain for domain, members in by_domain.items()
+            if len(members) > 1 and all(member in noisy for member in members)
+        )
+        excluded_entities = sorted(e for e in noisy if entities[e]["domain"] not in domains)
+
+        saved = sum(entities[e]["bytes"] + statistics.get(e, {}).get("bytes", 0) for e in noisy)
+        return {
+            "domains": domains,
+            "entities": excluded_entities,
+            "estimated_bytes": saved,
+            "share": saved / total_bytes
+        }
+
+    def format_exclude_block(self, plan: Dict[str, Any], entities: Dict[str, Dict]) -> str:
+        """Blok recorder: exclude: pro vložení do configuration.yaml"""
+        lines = ["recorder:", "  exclude:"]
+        if plan["domains"]:
+            lines.append("    domains:")
+            lines.extend(f"      - {domain}" for domain in plan["domains"])
+        if plan["entities"]:
+            lines.append("    entities:")
+            for entity_id in plan["entities"]:
+                entry = entities[entity_id]
+                lines.append(
+                    f"      - {entity_id}  # {entry['rows']} řádků, "
+                    f"{entry['bytes'] / 1024 / 1024:.1f} MB, {entry['states_per_hour']}/h"
+                )
+        if not plan["domains"] and not plan["entities"]:
+            lines.append("    entities: []  # žádní výrazní producenti zápisů")
+        return "\n".join(lines)
+
+    def run_analysis(self) -> Dict[str, Any]:
+        """Provede kompletní analýzu"""
+        logger.info("🔍 Spouštím analýzu databáze recorderu...")
+
+        entities = self.scan_states()
+        statistics = self.scan_short_term_statistics()
+        attributes = self.scan_attribute_duplicates()
+
+        domains = {}
+        for entry in entities.values():
+            domain = domains.setdefault(entry["domain"], {"entities": 0, "rows": 0, "bytes": 0})
+            domain["entities"] += 1
+            domain["rows"] += entry["rows"]
+            domain["bytes"] += entry["bytes"]
+
+        plan = self.plan_excludes(entities, statistics)
+        db_size = self.database_size()
+        estimated_total = sum(e["bytes"] for e in entities.values()) + sum(s["bytes"] for s in statistics.values())
+        # Odhad přepočtený na skutečnou velikost souboru (indexy, volné stránky)
+        plan["estimated_db_bytes"] = int(db_size * plan["estimated_bytes"] / estimated_total) if estimated_total else 0
+
+        top_entities = sorted(entities.items(), key=lambda item: item[1]["bytes"], reverse=True)[:self.top]
+        top_statistics = sorted(statistics.items(), key=lambda item: item[1]["rows"], reverse=True)[:self.top]
+
+        return {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "schema_version": self.recorder.schema["version"],
+            "database_size": db_size,
+            "total_entities": len(entities),
+            "total_rows": sum(e["rows"] for e in entities.values()),
+            "domains": domains,
+            "top_entities": top_entities,
+            "attributes": attributes,
+            "top_short_term_statistics": top_statistics,
+            "exclude_plan": plan,
+            "exclude_block": self.format_exclude_block(plan, entities)
+        }
+
+    def generate_report(self, results: Dict, output_file: str = None):
+        """Vygeneruje textový report"""
+        if not output_file:
+            output_file = f"recorder_analysis_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+
+        mb = 1024 * 1024
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write("=" * 80 + "\n")
+            f.write("HOME ASSISTANT - ANALÝZA DATABÁZE RECORDERU\n")
+            f.write("=" * 80 + "\n\n")
+
+            f.write("📊 SOUHRN:\n")
+            f.write("-" * 50 + "\n")
+            f.write(f"Verze schématu: {results['schema_version']}\n")
+            f.write(f"Velikost databáze: {results['database_size'] / mb:.1f} MB\n")
+            f.write(f"Entit: {results['total_entities']}\n")
+            f.write(f"Řádků states: {results['total_rows']}\n")
+
+            f.write("\n🏷️  DOMÉNY:\n")
+            f.write("-" * 50 + "\n")
+            for domain, entry in sorted(results['domains'].items(), key=lambda x: x[1]['bytes'], reverse=True):
+                f.write(f"{domain}: {entry['rows']} řádků, {entry['bytes'] / mb:.1f} MB ({entry['entities']} entit)\n")
+
+            f.write("\n🔝 NEJVĚTŠÍ ENTITY:\n")
+            f.write("-" * 50 + "\n")
+            for entity_id, entry in results['top_entities']:
+                f.write(f"{entity_id}: {entry['rows']} řádků, {entry['bytes'] / mb:.2f} MB, "
+                        f"{entry['states_per_hour']} stavů/h, {entry['attribute_blobs']} blobů atributů\n")
+
+            attributes = results['attributes']
+            f.write("\n🧩 ATRIBUTY:\n")
+            f.write("-" * 50 + "\n")
+            f.write(f"Bloby: {attributes['total_blobs']}\n")
+            f.write(f"Duplicitní bloby: {attributes['duplicate_blobs']} "
+                    f"({attributes['duplicate_bytes'] / mb:.2f} MB)\n")
+
+            f.write("\n📈 STATISTICS_SHORT_TERM:\n")
+            f.write("-" * 50 + "\n")
+            for statistic_id, entry in results['top_short_term_statistics']:
+                f.write(f"{statistic_id}: {entry['rows']} řádků\n")
+
+            plan = results['exclude_plan']
+            f.write("\n💡 NÁVRH recorder: exclude:\n")
+            f.write("-" * 50 + "\n")
+            f.write(results['exclude_block'] + "\n")
+            f.write(f"\nOdhad úspory: {plan['estimated_db_bytes'] / mb:.1f} MB "
+                    f"({plan['share'] * 100:.1f} % zapisovaných dat)\n")
+
+        logger.info(f"✅ Report uložen do: {output_file}")
+        return output_file
+
+
+def main():
+    """Hlavní funkce"""
+    parser = argparse.ArgumentParser(description="Home Assistant Recorder Bloat Analyzer")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--db-url", help="URL databáze recorderu (výchozí: recorder.db_url z konfigurace)")
+    parser.add_argument("--ha-stopped", action="store_true", help="HA je zastavený - databáze se otevře jako immutable")
+    parser.add_argument("--rate-threshold", type=float, default=60.0, help="Min. stavů za hodinu pro vyloučení")
+    parser.add_argument("--min-share", type=float, default=0.01, help="Min. podíl na velikosti pro vyloučení (0-1)")
+    parser.add_argument("--top", type=int, default=20, help="Počet největších položek v reportu")
+    args = parser.parse_args()
+
+    print("🔍 Home Assistant Recorder Bloat Analyzer")
+    print("=========================================")
+
+    analyzer = RecorderBloatAnalyzer(args.config, db_url=args.db_url, ha_stopped=args.ha_stopped,
+                                     rate_threshold=args.rate_threshold, min_share=args.min_share, top=args.top)
+    results = analyzer.run_analysis()
+    report_file = analyzer.generate_report(results)
+
+    print(f"\n📊 Databáze: {results['database_size'] / 1024 / 1024:.1f} MB, "
+          f"{results['total_rows']} řádků, {results['total_entities']} entit")
+    print(f"\n{results['exclude_block']}")
+    print(f"\n💾 Odhad úspory: {results['exclude_plan']['estimated_db_bytes'] / 1024 / 1024:.1f} MB")
+    print(f"\n✅ Podrobný report: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Recorder Workload Benchmark
+Přehraje syntetickou zátěž recorderu na kandidátském mountpointu:
+dávkové vkládání do states/state_attributes, commit v intervalu recorderu
+a purge mazání - s různým nastavením journal_mode/synchronous.
+Výsledkem je p50/p99 latence commitu a propustnost pro pořadí cílů migrace
+"""
+
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import storage_inventory
+from storage_benchmark import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULTS_FILE = Path.home() / ".cache" / "ha_recorder_benchmark.json"
+DEFAULT_DURATION = 5.0        # limit jedné varianty v sekundách
+
+ENTITIES = 300                # počet simulovaných entit
+EVENTS_PER_COMMIT = 200       # zápisů stavu za jeden commit_interval
+COMMIT_INTERVAL = 5           # výchozí commit_interval recorderu (s)
+NEW_ATTRIBUTES_RATIO = 0.2    # podíl zápisů s novými atributy (jinak se sdílí podle hash)
+PURGE_EVERY = 50              # purge po každých N commitech
+KEEP_COMMITS = 150            # okno uchovávání v počtu commitů (simuluje purge_keep_days)
+PURGE_BATCH = 998             # HA maže po dávkách kvůli limitu bind proměnných SQLite
+
+# (název, journal_mode, synchronous); první varianta odpovídá výchozímu nastavení HA
+VARIANTS: Tuple[Tuple[str, str, str], ...] = (
+    ("wal_normal", "WAL", "NORMAL"),
+    ("wal_full", "WAL", "FULL"),
+    ("delete_full", "DELETE", "FULL"),
+)
+HA_DEFAULT_VARIANT = VARIANTS[0][0]
+
+# Filesystémy v RAM - rychlé, ale databáze by restart nepřežila
+VOLATILE_FILESYSTEMS = {"tmpfs", "ramfs"}
+
+SCHEMA = """
+CREATE TABLE states_meta (
+    metadata_id INTEGER PRIMARY KEY,
+    entity_id VARCHAR(255)
+);
+CREATE UNIQUE INDEX ix_states_meta_entity_id ON states_meta (entity_id);
+CREATE TABLE state_attributes (
+    attributes_id INTEGER PRIMARY KEY,
+    hash BIGINT,
+    shared_attrs TEXT
+);
+CREATE INDEX ix_state_attributes_hash ON state_attributes (hash);
+CREATE TABLE states (
+    state_id INTEGER PRIMARY KEY,
+    state VARCHAR(255),
+    last_changed_ts FLOAT,
+    last_updated_ts FLOAT,
+    old_state_id INTEGER REFERENCES states (state_id),
+    attributes_id INTEGER REFERENCES state_attributes (attributes_id),
+    metadata_id INTEGER REFERENCES states_meta (metadata_id)
+);
+CREATE INDEX ix_states_metadata_id_last_updated_ts ON states (metadata_id, last_updated_ts);
+CREATE INDEX ix_states_last_updated_ts ON states (last_updated_ts);
+CREATE INDEX ix_states_old_state_id ON states (old_state_id);
+CREATE INDEX ix_states_attributes_id ON states (attributes_id);
+"""
+
+
+def _attributes(entity: int, revision: int) -> str:
+    return json.dumps({
+        "friendly_name": f"Benchmark sensor {entity}",
+        "unit_of_measurement": "°C",
+        "device_class": "temperature",
+        "state_class": "measurement",
+        "revision": revision
+    })
+
+
+def _purge(conn: sqlite3.Connection, before_ts: float) -> int:
+    """Purge jako recorder: odpojit old_state_id, smazat stavy po dávkách, pak osiřelé atributy"""
+    purged = 0
+    while True:
+        state_ids = [row[0] for row in conn.execute(
+            "SELECT state_id FROM states WHERE last_updated_ts < ? LIMIT ?", (before_ts, PURGE_BATCH)
+        )]
+        if not state_ids:
+            break
+        placeholders = ",".join("?" * len(state_ids))
+        conn.execute(f"UPDATE states SET old_state_id = NULL WHERE old_state_id IN ({placeholders})", state_ids)
+        conn.execute(f"DELETE FROM states WHERE state_id IN ({placeholders})", state_ids)
+        conn.commit()
+        purged += len(state_ids)
+
+    conn.execute(
+        "DELETE FROM state_attributes WHERE attributes_id NOT IN "
+        "(SELECT attributes_id FROM states WHERE attributes_id IS NOT NULL)"
+    )
+    conn.commit()
+    return purged
+
+
+def replay(db_path: Path, journal_mode: str, synchronous: str, duration: float) -> Dict:
+    """Přehraje zátěž recorderu na jedné databázi a vrátí latence commitů"""
+    conn = sqlite3.connect(db_path, isolation_level="DEFERRED")
+    try:
+        conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO states_meta (metadata_id, entity_id) VALUES (?, ?)",
+            [(entity + 1, f"sensor.benchmark_{entity}") for entity in range(ENTITIES)]
+        )
+        conn.commit()
+
+        rng = random.Random(0)
+        attribute_ids: Dict[int, int] = {}   # metadata_id -> attributes_id (jako LRU cache v HA)
+        last_state: Dict[int, int] = {}
+        revision = 0
+        clock = time.time()
+        latencies: List[float] = []
+        rows = purged = 0
+        purge_time = 0.0
+
+        start = time.perf_counter()
+        while time.perf_counter() - start < duration:
+            clock += COMMIT_INTERVAL
+            for _ in range(EVENTS_PER_COMMIT):
+                metadata_id = rng.randrange(ENTITIES) + 1
+                attributes_id = attribute_ids.get(metadata_id)
+                if attributes_id is None or rng.random() < NEW_ATTRIBUTES_RATIO:
+                    revision += 1
+                    shared_attrs = _attributes(metadata_id, revision)
+                    attributes_id = conn.execute(
+                        "INSERT INTO state_attributes (hash, shared_attrs) VALUES (?, ?)",
+                        (hash(shared_attrs) & 0xFFFFFFFF, shared_attrs)
+                    ).lastrowid
+                    attribute_ids[metadata_id] = attributes_id
+
+                timestamp = clock + rng.random() * COMMIT_INTERVAL
+                state_id = conn.execute(
+                    "INSERT INTO states (state, last_changed_ts, last_updated_ts, old_state_id, "
+                    "attributes_id, metadata_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    (f"{rng.uniform(15, 30):.1f}", None, timestamp, last_state.get(metadata_id),
+                     attributes_id, metadata_id)
+                ).lastrowid
+                last_state[metadata_id] = state_id
+            rows += EVENTS_PER_COMMIT
+
+            commit_start = time.perf_counter()
+            conn.commit()
+            latencies.append((time.perf_counter() - commit_start) * 1000)
+
+            if len(latencies) % PURGE_EVERY == 0:
+                purge_start = time.perf_counter()
+                purged += _purge(conn, clock - KEEP_COMMITS * COMMIT_INTERVAL)
+                purge_time += time.perf_counter() - purge_start
+                # Smazané stavy už nemohou být old_state_id
+                last_state = {key: value for key, value in last_state.items()
+                              if conn.execute("SELECT 1 FROM states WHERE state_id = ?", (value,)).fetchone()}
+
+        elapsed = time.perf_counter() - start
+    finally:
+        conn.close()
+
+    return {
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "commits": len(latencies),
+        "rows": rows,
+        "rows_per_second": int(rows / elapsed),
+        "commit_p50_ms": round(percentile(latencies, 50), 3),
+        "commit_p99_ms": round(percentile(latencies, 99), 3),
+        "purged_rows": purged,
+        "purge_seconds": round(purge_time, 3)
+    }
+
+
+def run_recorder_benchmark(mountpoint: str, duration: float = DEFAULT_DURATION,
+                           variants=VARIANTS) -> Dict:
+    """Spustí všechny varianty na mountpointu; testovací databáze se po běhu smažou"""
+    target = Path(mountpoint)
+    usage = storage_inventory.filesystem_usage(str(target))
+    logger.info(f"⏱️  Přehrávám zátěž recorderu na {mountpoint} ({len(variants)} variant, max {duration:g} s)...")
+
+    results = {}
+    for name, journal_mode, synchronous in variants:
+        db_path = target / f".ha_recorder_bench_{os.getpid()}_{name}.db"
+        try:
+            results[name] = replay(db_path, journal_mode, synchronous, duration)
+        finally:
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                try:
+                    os.unlink(f"{db_path}{suffix}")
+                except FileNotFoundError:
+                    pass
+
+    return {
+        "mountpoint": usage["mountpoint"],
+        "device": usage["filesystem"],
+        "fstype": usage["fstype"],
+        "timestamp": datetime.datetime.now().isoformat(),
+        "variants": results
+    }
+
+
+def rank_targets(results: Dict[str, Dict], variant: str = HA_DEFAULT_VARIANT) -> List[Dict]:
+    """Cíle seřazené podle p99 latence commitu (při shodě podle propustnosti), bez RAM filesystémů"""
+    measured = [
+        result for result in results.values()
+        if variant in result.get("variants", {}) and result.get("fstype") not in VOLATILE_FILESYSTEMS
+    ]
+    return sorted(
+        measured,
+        key=lambda result: (result["variants"][variant]["commit_p99_ms"],
+                            -result["variants"][variant]["rows_per_second"])
+    )
+
+
+def describe(result: Dict, variant: str = HA_DEFAULT_VARIANT) -> str:
+    """Jednořádkové shrnutí varianty pro report"""
+    measured = result["variants"][variant]
+    return (
+        f"commit p50 {measured['commit_p50_ms']} ms / p99 {measured['commit_p99_ms']} ms, "
+        f"{measured['rows_per_second']} zápisů/s ({measured['journal_mode']}, synchronous={measured['synchronous']})"
+    )
+
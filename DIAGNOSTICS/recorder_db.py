@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Recorder Access Layer
+Jednotný přístup k databázi recorderu (SQLite i MariaDB/MySQL):
+detekce verze schématu ze schema_changes, výběr odpovídajících dotazů
+a sdílený pool spojení pro všechny skenery
+"""
+
+import os
+import sys
+import queue
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from urllib.parse import urlparse, unquote, parse_qs
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+try:
+    import pymysql
+    import pymysql.cursors
+except ImportError:
+    pymysql = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from ha_yaml_engine import load_yaml
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_FILE = "home-assistant_v2.db"
+
+# Verze schématu recorderu, od kterých platí dané rozložení tabulek
+SCHEMA_STATE_ATTRIBUTES = 25   # sdílené atributy v state_attributes.shared_attrs
+SCHEMA_TIMESTAMPS = 32         # last_updated_ts / last_changed_ts jako float
+SCHEMA_STATES_META = 38        # entity_id přesunuto do states_meta
+
+
+def resolve_db_url(config_path: Path) -> str:
+    """Zjistí db_url recorderu z configuration.yaml / secrets.yaml (výchozí SQLite)"""
+    config_path = Path(config_path)
+    db_url = None
+
+    try:
+        with open(config_path / "configuration.yaml", 'r', encoding='utf-8') as f:
+            config = load_yaml(f) or {}
+        recorder = config.get("recorder") if isinstance(config, dict) else None
+        if isinstance(recorder, dict):
+            db_url = recorder.get("db_url")
+    except Exception as e:
+        logger.debug(f"Nelze načíst configuration.yaml: {e}")
+
+    if isinstance(db_url, str) and db_url.startswith("!secret "):
+        try:
+            with open(config_path / "secrets.yaml", 'r', encoding='utf-8') as f:
+                secrets = load_yaml(f) or {}
+            db_url = secrets.get(db_url.split(" ", 1)[1])
+        except Exception as e:
+            logger.warning(f"Nelze načíst secrets.yaml: {e}")
+            db_url = None
+
+    if not db_url:
+        db_url = f"sqlite:///{config_path / DEFAULT_DB_FILE}"
+
+    # URL z kontejneru (/config/...) přemapujeme na skutečnou cestu ke konfiguraci
+    if db_url.startswith("sqlite:////config/") and config_path != Path("/config"):
+        db_url = f"sqlite:///{config_path}/" + db_url[len("sqlite:////config/"):]
+
+    return db_url
+
+
+class RecorderDatabase:
+    """Recorder databáze s poolem spojení a detekcí rozložení schématu"""
+
+    def __init__(self, db_url: str, pool_size: int = 4, ha_stopped: bool = False):
+        self.db_url = db_url
+        self.ha_stopped = ha_stopped
+        self.dialect = self.parse_dialect(db_url)
+        self.pool_size = pool_size
+        self._pool = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._schema = None
+
+        if self.dialect == "mysql" and pymysql is None:
+            raise RuntimeError("Pro MariaDB/MySQL recorder nainstalujte PyMySQL: pip install pymysql")
+
+    @staticmethod
+    def parse_dialect(db_url: str) -> str:
+        scheme = urlparse(db_url).scheme.split("+")[0]
+        if scheme == "sqlite":
+            return "sqlite"
+        if scheme in ("mysql", "mariadb"):
+            return "mysql"
+        raise ValueError(f"Nepodporovaný recorder backend: {scheme}")
+
+    @property
+    def sqlite_path(self) -> Optional[Path]:
+        if self.dialect != "sqlite":
+            return None
+        return Path(self.db_url[len("sqlite:///"):])
+
+    def exists(self) -> bool:
+        return self.dialect != "sqlite" or self.sqlite_path.exists()
+
+    def _connect(self):
+        if self.dialect == "sqlite":
+            # Pouze pro čtení; immutable jen pokud HA neběží (jinak by se ignoroval WAL)
+            uri = f"file:{self.sqlite_path}?mode=ro"
+            if self.ha_stopped:
+                uri += "&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = 1")
+            return conn
+
+        url = urlparse(self.db_url)
+        options = parse_qs(url.query)
+        return pymysql.connect(
+            host=url.hostname or "localhost",
+            port=url.port or 3306,
+            user=unquote(url.username or ""),
+            password=unquote(url.password or ""),
+            database=url.path.lstrip("/"),
+            charset=options.get("charset", ["utf8mb4"])[0],
+            unix_socket=options.get("unix_socket", [None])[0],
+            read_timeout=300,
+            autocommit=True
+        )
+
+    @contextmanager
+    def connection(self):
+        """Zapůjčí spojení z poolu (vytvoří nové, pokud je pool prázdný)"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+            with self._lock:
+                self._created += 1
+
+        # Do poolu se vrací jen po řádném dokončení bloku - při výjimce i při
+        # GeneratorExit (stream() opuštěný před koncem, SSCursor nedočtený)
+        # může spojení držet rozečtený výsledek, proto se zavře
+        reusable = False
+        try:
+            yield conn
+            reusable = True
+        finally:
+            if reusable and self._pool.qsize() < self.pool_size:
+                self._pool.put(conn)
+            else:
+                conn.close()
+                with self._lock:
+                    self._created -= 1
+
+    def _sql(self, sql: str) -> str:
+        # Dotazy se píšou s '?' (sqlite3), PyMySQL používá '%s'
+        return sql.replace("?", "%s") if self.dialect == "mysql" else sql
+
+    def stream(self, sql: str, params: Tuple = ()) -> Iterator[Tuple]:
+        """Vrací řádky dotazu postupně (bez načtení celého výsledku do paměti)"""
+        with self.connection() as conn:
+            if self.dialect == "mysql":
+                cursor = conn.cursor(pymysql.cursors.SSCursor)
+            else:
+                cursor = conn.cursor()
+            try:
+                cursor.execute(self._sql(sql), params)
+                yield from cursor
+            finally:
+                cursor.close()
+
+    def query(self, sql: str, params: Tuple = ()) -> list:
+        return list(self.stream(sql, params))
+
+    def scalar(self, sql: str, params: Tuple = ()) -> Any:
+        rows = self.query(sql, params)
+        return rows[0][0] if rows else None
+
+    def tables(self) -> Dict[str, set]:
+        """Tabulky a jejich sloupce"""
+        if self.dialect == "sqlite":
+            names = [row[0] for row in self.query("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            return {name: {row[1] for row in self.query(f"PRAGMA table_info('{name}')")} for name in names}
+
+        tables = {}
+        for table, column in self.query(
+            "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = DATABASE()"
+        ):
+            tables.setdefault(table, set()).add(column)
+        return tables
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        """Verze schématu a z ní odvozené rozložení tabulek (ověřené introspekcí)"""
+        if self._schema is not None:
+            return self._schema
+
+        tables = self.tables()
+        version = None
+        if "schema_changes" in tables:
+            version = self.scalar("SELECT MAX(schema_version) FROM schema_changes")
+
+        states_columns = tables.get("states", set())
+        schema = {
+            "version": version,
+            "states_meta": "states_meta" in tables and "metadata_id" in states_columns,
+            "state_attributes": "state_attributes" in tables and "attributes_id" in states_columns,
+            "timestamps": "last_updated_ts" in states_columns,
+            "tables": set(tables)
+        }
+
+        if version is not None:
+            expected = {
+                "states_meta": version >= SCHEMA_STATES_META,
+                "state_attributes": version >= SCHEMA_STATE_ATTRIBUTES,
+                "timestamps": version >= SCHEMA_TIMESTAMPS
+            }
+            for feature, present in expected.items():
+                if present != schema[feature]:
+                    logger.warning(
+                        f"Schéma v{version}: '{feature}' neodpovídá verzi (migrace nedokončena?), "
+                        f"použije se skutečný stav tabulek"
+                    )
+
+        self._schema = schema
+        return schema
+
+    def entity_column(self) -> Tuple[str, str]:
+        """(JOIN, výraz) pro entity_id podle schématu"""
+        if self.schema["states_meta"]:
+            return "JOIN states_meta sm ON sm.metadata_id = s.metadata_id", "sm.entity_id"
+        return "", "s.entity_id"
+
+    def attributes_column(self) -> Tuple[str, str]:
+        """(JOIN, výraz) pro JSON atributů podle schématu"""
+        if self.schema["state_attributes"]:
+            return (
+                "LEFT JOIN state_attributes sa ON sa.attributes_id = s.attributes_id",
+                "COALESCE(sa.shared_attrs, s.attributes)"
+            )
+        return "", "s.attributes"
+
+    def timestamp_column(self, column: str = "last_updated") -> str:
+        """Výraz vracející čas jako unix timestamp (float) pro libovolné schéma"""
+        if self.schema["timestamps"]:
+            return f"s.{column}_ts"
+        if self.dialect == "mysql":
+            return f"UNIX_TIMESTAMP(s.{column})"
+        return f"CAST(strftime('%s', s.{column}) AS REAL)"
+
+    def latest_states(self, since_ts: float) -> Iterator[Tuple[str, str, Optional[str], float]]:
+        """Poslední stav každé entity změněné od since_ts: (entity_id, state, attributes, last_updated_ts)"""
+        attributes_join, attributes = self.attributes_column()
+
+        if self.schema["states_meta"] and self.schema["timestamps"]:
+            # Pro každou entitu jen nejnovější řádek přes index (metadata_id, last_updated_ts)
+            sql = f"""
+                SELECT sm.entity_id, s.state, {attributes}, s.last_updated_ts
+                FROM states_meta sm
+                JOIN states s ON s.state_id = (
+                    SELECT state_id FROM states
+                    WHERE metadata_id = sm.metadata_id AND last_updated_ts > ?
+                    ORDER BY last_updated_ts DESC
+                    LIMIT 1
+                )
+                {attributes_join}
+            """
+            return self.stream(sql, (since_ts,))
+
+        entity_join, entity = self.entity_column()
+        updated = self.timestamp_column()
+        sql = f"""
+            SELECT {entity}, s.state, {attributes}, {updated}
+            FROM states s
+            {entity_join}
+            {attributes_join}
+            WHERE s.state_id IN (
+                SELECT MAX(state_id) FROM states s
+                WHERE {updated} > ?
+                GROUP BY {"s.metadata_id" if self.schema["states_meta"] else "s.entity_id"}
+            )
+        """
+        return self.stream(sql, (since_ts,))
+
+    def state_change_counts(self, since_ts: float) -> Iterator[Tuple[str, int, int]]:
+        """Počty zápisů a skutečných změn stavu od since_ts: (entity_id, updates, changes)
+
+        Změna stavu je řádek, kde last_changed == last_updated (u nového
+        schématu je last_changed_ts NULL, pokud se rovná last_updated_ts).
+        """
+        entity_join, entity = self.entity_column()
+        updated = self.timestamp_column()
+        if self.schema["timestamps"]:
+            changed = "s.last_changed_ts IS NULL OR s.last_changed_ts = s.last_updated_ts"
+        else:
+            changed = "s.last_changed = s.last_updated"
+
+        return self.stream(f"""
+            SELECT {entity}, COUNT(*), SUM(CASE WHEN {changed} THEN 1 ELSE 0 END)
+            FROM states s
+            {entity_join}
+            WHERE {updated} > ?
+            GROUP BY {entity}
+        """, (since_ts,))
+
+    def entity_activity(self) -> Iterator[Tuple[str, int, int, float, float, float, int, int]]:
+        """Aktivita všech entit za celou dobu uchování v jednom průchodu (GROUP BY přes index):
+        (entity_id, řádky, změny stavu, první zápis, poslední změna, poslední zápis, bajty stavů,
+        bajty atributů)
+
+        Atributy: u sdílených state_attributes se každý blob entity počítá jednou
+        (distinct attributes_id), u starého schématu je blob v každém řádku.
+        """
+        updated = self.timestamp_column()
+        if self.schema["timestamps"]:
+            changed = "s.last_changed_ts IS NULL OR s.last_changed_ts = s.last_updated_ts"
+            last_changed = "COALESCE(s.last_changed_ts, s.last_updated_ts)"
+        else:
+            changed = "s.last_changed = s.last_updated"
+            last_changed = self.timestamp_column("last_changed")
+
+        # Agregace po metadata_id (index ix_states_metadata_id_last_updated_ts), entity_id se
+        # připojí až k výsledku - jeden řádek na entitu místo joinu na každý stav
+        key = "metadata_id" if self.schema["states_meta"] else "entity_id"
+        entity_join = "JOIN states_meta sm ON sm.metadata_id = a.metadata_id" if self.schema["states_meta"] else ""
+        entity = "sm.entity_id" if self.schema["states_meta"] else "a.entity_id"
+        if self.schema["state_attributes"]:
+            shared = "COALESCE(b.attribute_bytes, 0)"
+            shared_join = f"""
+                LEFT JOIN (
+                    SELECT d.{key} AS {key}, SUM(LENGTH(sa.shared_attrs)) AS attribute_bytes
+                    FROM (SELECT DISTINCT {key}, attributes_id FROM states WHERE attributes_id IS NOT NULL) d
+                    JOIN state_attributes sa ON sa.attributes_id = d.attributes_id
+                    GROUP BY d.{key}
+                ) b ON b.{key} = a.{key}"""
+        else:
+            shared, shared_join = "0", ""
+
+        return self.stream(f"""
+            SELECT {entity}, a.row_count, a.changes, a.first_updated, a.last_changed, a.last_updated,
+                   a.state_bytes, a.inline_attribute_bytes + {shared}
+            FROM (
+                SELECT s.{key} AS {key},
+                       COUNT(*) AS row_count,
+                       SUM(CASE WHEN {changed} THEN 1 ELSE 0 END) AS changes,
+                       MIN({updated}) AS first_updated,
+                       MAX({last_changed}) AS last_changed,
+                       MAX({updated}) AS last_updated,
+                       SUM(LENGTH(s.state)) AS state_bytes,
+                       COALESCE(SUM(LENGTH(s.attributes)), 0) AS inline_attribute_bytes
+                FROM states s
+                GROUP BY s.{key}
+            ) a
+            {shared_join}
+            {entity_join}
+        """)
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_shared: Dict[Tuple[str, bool], RecorderDatabase] = {}
+_shared_lock = threading.Lock()
+
+
+def get_recorder(config_path: Path = Path("/config"), db_url: str = None,
+                 ha_stopped: bool = False) -> RecorderDatabase:
+    """Sdílená instance recorderu (jeden pool spojení pro všechny skenery v procesu)"""
+    db_url = db_url or os.environ.get("HA_RECORDER_DB_URL") or resolve_db_url(config_path)
+    key = (db_url, ha_stopped)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = RecorderDatabase(db_url, ha_stopped=ha_stopped)
+        return _shared[key]
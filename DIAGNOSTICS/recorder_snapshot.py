@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Recorder Snapshot
+Konzistentní kopie běžící databáze recorderu bez zastavení HA:
+SQLite backup API po dávkách stránek s pauzami (zapisovatel HA nečeká),
+a přírůstkový režim pro WAL - přepíše jen stránky, které se od minulé
+kopie změnily (hlavní soubor + potvrzené rámce z -wal)
+"""
+
+import os
+import json
+import time
+import struct
+import sqlite3
+import logging
+import argparse
+import contextlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_STEP_PAGES = 1024     # stránek na jeden krok (4 MB při 4k stránkách)
+DEFAULT_SLEEP = 0.05          # s pauzy mezi kroky
+LOCK_TIMEOUT = 30             # s čekání na zámek zápisu (jen na dobu přečtení -wal)
+MAX_RESTARTS = 5              # restartů backup API (rollback journal) před kopií v jednom kroku
+MAX_WAL_BYTES = 256 * 1024 * 1024
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+WAL_MAGIC = (0x377f0682, 0x377f0683)
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+META_SUFFIX = ".snapshot.json"
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def is_wal_database(path: Path) -> bool:
+    """Režim WAL podle hlavičky souboru (verze zápisu/čtení = 2)"""
+    with open(path, 'rb') as f:
+        header = f.read(20)
+    return header[:16] == SQLITE_HEADER and header[18] == 2 and header[19] == 2
+
+
+def _wal_checksum(data: bytes, s0: int, s1: int, order: str) -> Tuple[int, int]:
+    words = struct.unpack(f"{order}{len(data) // 4}I", data)
+    for first, second in zip(words[0::2], words[1::2]):
+        s0 = (s0 + first + s1) & 0xFFFFFFFF
+        s1 = (s1 + second + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def parse_wal(data: bytes, page_size: int) -> Dict[int, bytes]:
+    """Poslední potvrzená verze každé stránky ve WAL (salt a kontrolní součty jako SQLite)"""
+    if len(data) < WAL_HEADER_SIZE:
+        return {}
+    magic, _, wal_page_size, _, salt1, salt2, check1, check2 = struct.unpack(">8I", data[:WAL_HEADER_SIZE])
+    if magic not in WAL_MAGIC or wal_page_size != page_size:
+        return {}
+    order = ">" if magic & 1 else "<"
+    s0, s1 = _wal_checksum(data[:24], 0, 0, order)
+    if (s0, s1) != (check1, check2):
+        return {}
+
+    pages: Dict[int, bytes] = {}
+    pending: Dict[int, bytes] = {}
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    offset = WAL_HEADER_SIZE
+    while offset + frame_size <= len(data):
+        pgno, commit, frame_salt1, frame_salt2, check1, check2 = struct.unpack(
+            ">6I", data[offset:offset + WAL_FRAME_HEADER_SIZE])
+        page = data[offset + WAL_FRAME_HEADER_SIZE:offset + frame_size]
+        # Rámce z předchozí generace WAL mají jiné salty, useknutý rámec nesedí v součtu
+        if (frame_salt1, frame_salt2) != (salt1, salt2):
+            break
+        s0, s1 = _wal_checksum(data[offset:offset + 8], s0, s1, order)
+        s0, s1 = _wal_checksum(page, s0, s1, order)
+        if (s0, s1) != (check1, check2):
+            break
+        pending[pgno] = page
+        if commit:
+            pages.update(pending)
+            pending.clear()
+        offset += frame_size
+    return pages
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    # Autocommit - transakce řídíme sami
+    return sqlite3.connect(str(path), timeout=LOCK_TIMEOUT, isolation_level=None)
+
+
+def _write_meta(target: Path, meta: Dict):
+    with open(f"{target}{META_SUFFIX}", 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_meta(target: Path) -> Optional[Dict]:
+    """Metadata dokončené kopie; chybí, pokud kopie nedoběhla"""
+    try:
+        with open(f"{target}{META_SUFFIX}", 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def full_snapshot(source: Path, target: Path, step_pages: int = DEFAULT_STEP_PAGES,
+                  sleep: float = DEFAULT_SLEEP) -> Dict:
+    """Kopie přes SQLite backup API po dávkách stránek s pauzami mezi nimi"""
+    tmp = target.with_name(target.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    wal = is_wal_database(source)
+    restarts = 0
+
+    src = _connect(source)
+    dst = sqlite3.connect(str(tmp))
+    try:
+        if wal:
+            # Otevřená čtecí transakce drží snímek: kopie je konzistentní, nerestartuje
+            # se po commitu HA a ve WAL zapisovatele neblokuje
+            src.execute("BEGIN")
+            src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+        last_remaining = None
+
+        def progress(status, remaining, total):
+            nonlocal last_remaining, restarts
+            if last_remaining is not None and remaining > last_remaining:
+                restarts += 1
+                if restarts > MAX_RESTARTS:
+                    raise _TooManyRestarts()
+            last_remaining = remaining
+            time.sleep(sleep)
+
+        try:
+            src.backup(dst, pages=step_pages, progress=progress)
+        except _TooManyRestarts:
+            # Rollback journal: HA zapisuje častěji, než stihneme dávky - jeden krok
+            logger.warning(f"⚠️  Kopie se {restarts}x restartovala kvůli zápisům, kopíruji v jednom kroku")
+            src.backup(dst, pages=-1)
+
+        page_size = src.execute("PRAGMA page_size").fetchone()[0]
+        page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        if wal:
+            src.execute("COMMIT")
+    finally:
+        dst.close()
+        src.close()
+
+    with open(tmp, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, target)
+    return {"mode": "full", "pages": page_count, "written_pages": page_count,
+            "page_size": page_size, "restarts": restarts}
+
+
+def _write_changed_pages(source: Path, target: Path, wal_pages: Dict[int, bytes], page_size: int,
+                         page_count: int, step_pages: int, sleep: float) -> int:
+    """Stránky zdroje (soubor + rámce z WAL) zapíše do kopie jen tam, kde se liší; vrací počet"""
+    # Stránky z WAL rozdělené podle kroků, ať se neprochází celý slovník v každém kroku
+    wal_steps: Dict[int, Dict[int, bytes]] = {}
+    for pgno, page in wal_pages.items():
+        wal_steps.setdefault((pgno - 1) // step_pages, {})[pgno] = page
+
+    written = 0
+    src_fd = os.open(source, os.O_RDONLY)
+    dst_fd = os.open(target, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        for first in range(1, page_count + 1, step_pages):
+            count = min(step_pages, page_count - first + 1)
+            offset = (first - 1) * page_size
+            source_block = bytearray(os.pread(src_fd, count * page_size, offset))
+            source_block.extend(bytes(count * page_size - len(source_block)))
+            for pgno, page in wal_steps.get((first - 1) // step_pages, {}).items():
+                position = (pgno - first) * page_size
+                source_block[position:position + page_size] = page
+            target_block = os.pread(dst_fd, count * page_size, offset)
+
+            for index in range(count):
+                start = index * page_size
+                page = source_block[start:start + page_size]
+                if page != target_block[start:start + page_size]:
+                    os.pwrite(dst_fd, page, offset + start)
+                    written += 1
+            if sleep:
+                time.sleep(sleep)
+
+        os.ftruncate(dst_fd, page_count * page_size)
+        os.fsync(dst_fd)
+    finally:
+        os.close(src_fd)
+        os.close(dst_fd)
+    return written
+
+
+def incremental_snapshot(source: Path, target: Path, step_pages: int = DEFAULT_STEP_PAGES,
+                         sleep: float = DEFAULT_SLEEP) -> Optional[Dict]:
+    """Přepíše v existující kopii jen změněné stránky; None, pokud to nejde (pak plná kopie)"""
+    wal_path = Path(f"{source}-wal")
+    if not is_wal_database(source):
+        return None
+    if wal_path.exists() and wal_path.stat().st_size > MAX_WAL_BYTES:
+        return None
+
+    writer = _connect(source)
+    reader = _connect(source)
+    try:
+        # Na dobu přečtení -wal podržíme zámek zápisu: snímek čtenáře pak přesně
+        # odpovídá obsahu WAL. Checkpoint po uvolnění nepřepíše stránky novější
+        # než snímek, dokud je čtecí transakce otevřená
+        writer.execute("BEGIN IMMEDIATE")
+        try:
+            reader.execute("BEGIN")
+            reader.execute("SELECT count(*) FROM sqlite_master").fetchone()
+            try:
+                with open(wal_path, 'rb') as f:
+                    wal_data = f.read()
+            except FileNotFoundError:
+                wal_data = b""
+        finally:
+            writer.execute("ROLLBACK")
+
+        page_size = reader.execute("PRAGMA page_size").fetchone()[0]
+        page_count = reader.execute("PRAGMA page_count").fetchone()[0]
+        wal_pages = parse_wal(wal_data, page_size)
+        del wal_data
+
+        if target.stat().st_size % page_size:
+            return None  # jiná velikost stránky - přírůstek nedává smysl
+        target_wal = Path(f"{target}-wal")
+        if target_wal.exists() and target_wal.stat().st_size:
+            return None  # kopii někdo otevřel a zapisoval - stránky v souboru neplatí
+
+        meta_path = Path(f"{target}{META_SUFFIX}")
+        if meta_path.exists():
+            meta_path.unlink()   # rozpracovaná kopie není platná
+
+        written = _write_changed_pages(source, target, wal_pages, page_size, page_count, step_pages, sleep)
+        reader.execute("COMMIT")
+    finally:
+        reader.close()
+        writer.close()
+
+    return {"mode": "incremental", "pages": page_count, "written_pages": written,
+            "page_size": page_size, "wal_pages": len(wal_pages)}
+
+
+def locked_snapshot(locked: sqlite3.Connection, source: Path, target: Path,
+                    step_pages: int = DEFAULT_STEP_PAGES) -> Dict:
+    """Kopie pod výhradním zámkem (viz exclusive_lock) - nikdo nezapisuje, soubor + WAL jsou stabilní
+
+    Backup API se spojením, které drží zápisovou transakci, nepracuje (čeká
+    na zámek sám na sebe), proto se stránky čtou přímo ze souboru a z -wal.
+    Existující platná kopie se jen doplní, jinak se zapíše celá.
+    """
+    page_size = locked.execute("PRAGMA page_size").fetchone()[0]
+    page_count = locked.execute("PRAGMA page_count").fetchone()[0]
+    try:
+        with open(f"{source}-wal", 'rb') as f:
+            wal_pages = parse_wal(f.read(), page_size)
+    except FileNotFoundError:
+        wal_pages = {}
+
+    target_wal = Path(f"{target}-wal")
+    usable = (target.exists() and load_meta(target) and target.stat().st_size % page_size == 0
+              and not (target_wal.exists() and target_wal.stat().st_size))
+    meta_path = Path(f"{target}{META_SUFFIX}")
+    if meta_path.exists():
+        meta_path.unlink()
+    if not usable:
+        for path in (target, target_wal, Path(f"{target}-shm")):
+            if path.exists():
+                path.unlink()
+
+    # Bez pauz - zámek drží Home Assistant mimo databázi, má trvat co nejkratší dobu
+    written = _write_changed_pages(source, target, wal_pages, page_size, page_count, step_pages, 0)
+    return {"mode": "locked" if usable else "locked-full", "pages": page_count, "written_pages": written,
+            "page_size": page_size, "wal_pages": len(wal_pages)}
+
+
+@contextlib.contextmanager
+def exclusive_lock(source: Path) -> Iterator[sqlite3.Connection]:
+    """Výhradní zámek databáze bez čekání; RuntimeError, pokud ji někdo používá
+
+    Ve WAL režimu BEGIN EXCLUSIVE nevylučuje nečinná spojení (HA drží spojení
+    otevřené i bez transakce), proto se navíc kontroluje, zda soubor nemá
+    otevřený jiný proces.
+    """
+    users = processes_using(source)
+    if users:
+        raise RuntimeError(f"{source} má otevřenou proces(y) {', '.join(map(str, users))}")
+    conn = sqlite3.connect(str(source), timeout=0, isolation_level=None)
+    try:
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError as e:
+            raise RuntimeError(f"{source} je zamčená jiným spojením ({e})") from e
+        try:
+            yield conn
+        finally:
+            conn.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+
+def processes_using(path: Path) -> List[int]:
+    """PID ostatních procesů, které mají soubor (nebo jeho -wal/-shm) otevřený - z /proc/*/fd"""
+    names = {os.path.realpath(f"{path}{suffix}") for suffix in ("", "-wal", "-shm", "-journal")}
+    users = []
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit() or int(pid) == os.getpid():
+            continue
+        fd_dir = f"/proc/{pid}/fd"
+        try:
+            for fd in os.listdir(fd_dir):
+                if os.readlink(f"{fd_dir}/{fd}") in names:
+                    users.append(int(pid))
+                    break
+        except OSError:
+            continue  # proces skončil nebo nemáme práva (bez roota vidíme jen své procesy)
+    return users
+
+
+def verify_snapshot(target: Path) -> bool:
+    # Zapisovatelné spojení: při zavření SQLite uklidí -wal/-shm kopie
+    conn = sqlite3.connect(str(target))
+    try:
+        return conn.execute("PRAGMA quick_check").fetchone()[0] == "ok"
+    finally:
+        conn.close()
+
+
+def snapshot_database(source: Path, target: Path, incremental: bool = True,
+                      step_pages: int = DEFAULT_STEP_PAGES, sleep: float = DEFAULT_SLEEP,
+                      verify: bool = True, locked: Optional[sqlite3.Connection] = None) -> Dict:
+    """Konzistentní kopie databáze za běhu; existující kopii jen doplní o změněné stránky
+
+    S locked (spojení z exclusive_lock) je kopie přesně aktuální ke chvíli zámku.
+    """
+    source, target = Path(source), Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    started = time.monotonic()
+
+    stats = None
+    if locked is not None:
+        stats = locked_snapshot(locked, source, target, step_pages)
+    elif incremental and target.exists() and load_meta(target):
+        stats = incremental_snapshot(source, target, step_pages, sleep)
+    if stats is None:
+        stats = full_snapshot(source, target, step_pages, sleep)
+
+    stats["seconds"] = round(time.monotonic() - started, 2)
+    stats["created"] = time.time()
+    stats["source"] = str(source)
+    if verify:
+        stats["verified"] = verify_snapshot(target)
+        if not stats["verified"]:
+            raise RuntimeError(f"Kopie {target} neprošla kontrolou integrity")
+    _write_meta(target, stats)
+
+    logger.info(
+        f"📸 Snímek {source.name} -> {target} ({stats['mode']}): "
+        f"zapsáno {stats['written_pages']}/{stats['pages']} stránek "
+        f"({stats['written_pages'] * stats['page_size'] / 1e6:.1f} MB) za {stats['seconds']} s"
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Recorder Snapshot")
+    parser.add_argument("source", type=Path, help="Databáze recorderu (home-assistant_v2.db)")
+    parser.add_argument("target", type=Path, help="Cílový soubor kopie")
+    parser.add_argument("--full", action="store_true", help="Vždy plná kopie (bez přírůstku)")
+    parser.add_argument("--step-pages", type=int, default=DEFAULT_STEP_PAGES,
+                        help=f"Stránek na krok (výchozí: {DEFAULT_STEP_PAGES})")
+    parser.add_argument("--sleep", type=float, default=DEFAULT_SLEEP,
+                        help=f"Pauza mezi kroky v sekundách (výchozí: {DEFAULT_SLEEP:g})")
+    parser.add_argument("--no-verify", action="store_true", help="Bez PRAGMA quick_check kopie")
+    args = parser.parse_args()
+
+    snapshot_database(args.source, args.target, incremental=not args.full,
+                      step_pages=args.step_pages, sleep=args.sleep, verify=not args.no_verify)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Registry Loader
+Načítání registrů z .storage (entity, zařízení, oblasti) - soubor přes mmap,
+orjson pokud je nainstalovaný, indexy id -> záznam až při prvním použití
+a perzistentní cache naparsovaného výsledku klíčovaná podle mtime
+v <config>/.storage (pickle se načte zhruba 2x rychleji než stdlib json
+stejného registru; čte se jen z adresáře 0700 vlastněného naším uživatelem)
+"""
+
+import os
+import stat
+import json
+import mmap
+import pickle
+import hashlib
+import argparse
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Vedle scan cache v <config>/.storage (ne v $HOME - skripty běží přes sudo)
+CACHE_DIR_NAME = "ha_registry_cache"
+
+# druh -> (soubor v .storage, klíč seznamu v "data", primární klíč záznamu)
+REGISTRIES = {
+    "entity": ("core.entity_registry", "entities", "entity_id"),
+    "device": ("core.device_registry", "devices", "id"),
+    "area": ("core.area_registry", "areas", "area_id"),
+}
+
+# Zvyšte při změně formátu cache - stará se zahodí
+CACHE_FORMAT = 1
+
+
+def parse_json_file(path: Path):
+    """Naparsuje JSON soubor namapovaný do paměti (orjson čte mmap bez kopie)"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"{path} je prázdný")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if orjson is not None:
+                view = memoryview(mm)
+                try:
+                    return orjson.loads(view)
+                finally:
+                    view.release()
+            return json.loads(mm[:])
+
+
+class Registry:
+    """Záznamy jednoho registru, indexy podle libovolného klíče se staví líně"""
+
+    def __init__(self, kind: str, records: List[Dict]):
+        self.kind = kind
+        self.records = records
+        self.primary_key = REGISTRIES[kind][2]
+        self._indexes: Dict[str, Dict[str, Dict]] = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(self.records)
+
+    def index(self, key: Optional[str] = None) -> Dict[str, Dict]:
+        """Index hodnota klíče -> záznam (výchozí primární klíč); poslední výskyt vyhrává"""
+        key = key or self.primary_key
+        index = self._indexes.get(key)
+        if index is None:
+            index = {record[key]: record for record in self.records if record.get(key) is not None}
+            self._indexes[key] = index
+        return index
+
+    def group(self, key: str) -> Dict[str, List[Dict]]:
+        """Seskupení záznamů podle nejednoznačného klíče (např. entity podle device_id)"""
+        groups = self._indexes.get(f"group:{key}")
+        if groups is None:
+            groups = {}
+            for record in self.records:
+                value = record.get(key)
+                if value is not None:
+                    groups.setdefault(value, []).append(record)
+            self._indexes[f"group:{key}"] = groups
+        return groups
+
+    def get(self, value: str, key: Optional[str] = None) -> Optional[Dict]:
+        return self.index(key).get(value)
+
+
+class RegistryLoader:
+    """Načítá registry z <config>/.storage, naparsovaný výsledek drží v cache mezi běhy"""
+
+    def __init__(self, config_path: Path = Path("/config"), use_cache: bool = True):
+        self.storage_dir = Path(config_path) / ".storage"
+        self.cache_dir = self.storage_dir / CACHE_DIR_NAME if use_cache else None
+        self._loaded: Dict[str, Registry] = {}
+        self.cache_hits = 0
+        self.parsed = 0
+
+    def cache_file(self, path: Path) -> Path:
+        digest = hashlib.sha1(str(path.resolve()).encode()).hexdigest()[:16]
+        return self.cache_dir / f"{path.name}-{digest}.pickle"
+
+    def _trusted(self, info: os.stat_result, mode: int) -> bool:
+        """Vlastní ho náš (efektivní) uživatel a nikdo jiný do něj nesmí zapisovat"""
+        return info.st_uid == os.geteuid() and not info.st_mode & mode
+
+    def _read_cache(self, path: Path, key: tuple) -> Optional[List[Dict]]:
+        # pickle spustí kód z dat - načte se jen z adresáře 0700 a souboru, který
+        # nemůže přepsat nikdo jiný (kontrola na otevřeném fd, bez symlinků)
+        try:
+            directory = os.lstat(self.cache_dir)
+            if not stat.S_ISDIR(directory.st_mode) or not self._trusted(directory, 0o077):
+                logger.warning(f"Cache registrů {self.cache_dir} nemá práva 0700 našeho uživatele - ignoruji")
+                return None
+            fd = os.open(self.cache_file(path), os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError:
+            return None
+        with os.fdopen(fd, 'rb') as f:
+            info = os.fstat(fd)
+            if not stat.S_ISREG(info.st_mode) or not self._trusted(info, 0o022):
+                logger.warning(f"Cache {self.cache_file(path)} může přepsat jiný uživatel - ignoruji")
+                return None
+            try:
+                cached_key, records = pickle.loads(f.read())
+            except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+                return None
+        return records if cached_key == key else None
+
+    def _write_cache(self, path: Path, key: tuple, records: List[Dict]):
+        target = self.cache_file(path)
+        temp = target.with_suffix(f".tmp{os.getpid()}")
+        try:
+            target.parent.mkdir(mode=0o700, exist_ok=True)
+            fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(pickle.dumps((key, records), protocol=pickle.HIGHEST_PROTOCOL))
+            os.replace(temp, target)
+        except OSError as e:
+            logger.debug(f"Cache registru {path.name} nelze uložit: {e}")
+            temp.unlink(missing_ok=True)
+
+    def load(self, kind: str) -> Registry:
+        """Registr daného druhu ('entity', 'device', 'area'); chybějící soubor = prázdný registr"""
+        registry = self._loaded.get(kind)
+        if registry is not None:
+            return registry
+
+        filename, list_key, _ = REGISTRIES[kind]
+        path = self.storage_dir / filename
+        records: List[Dict] = []
+        try:
+            info = path.stat()
+        except OSError:
+            logger.warning(f"Registr {filename} nebyl nalezen")
+        else:
+            # HA registry přepisuje atomicky (nový inode), mtime_ns + velikost stačí i na kopii
+            key = (CACHE_FORMAT, info.st_size, info.st_mtime_ns, info.st_ino)
+            cached = self._read_cache(path, key) if self.cache_dir else None
+            if cached is not None:
+                records = cached
+                self.cache_hits += 1
+            else:
+                try:
+                    records = parse_json_file(path).get("data", {}).get(list_key, [])
+                    self.parsed += 1
+                except (OSError, ValueError) as e:
+                    # orjson.JSONDecodeError je podtřída ValueError
+                    logger.error(f"Chyba při čtení registru {filename}: {e}")
+                else:
+                    if self.cache_dir:
+                        self._write_cache(path, key, records)
+
+        registry = Registry(kind, records)
+        self._loaded[kind] = registry
+        return registry
+
+    @property
+    def entities(self) -> Registry:
+        return self.load("entity")
+
+    @property
+    def devices(self) -> Registry:
+        return self.load("device")
+
+    @property
+    def areas(self) -> Registry:
+        return self.load("area")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Registry Loader")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--no-cache", action="store_true", help="Vždy parsovat znovu, cache nepoužít")
+    parser.add_argument("--get", metavar="ID", action="append", default=[],
+                        help="Vypsat záznam entity/zařízení/oblasti podle id (lze opakovat)")
+    args = parser.parse_args()
+
+    loader = RegistryLoader(args.config, use_cache=not args.no_cache)
+    print(f"📚 REGISTRY ({'orjson' if orjson is not None else 'json'}):")
+    for kind in REGISTRIES:
+        start = time.perf_counter()
+        registry = loader.load(kind)
+        print(f"   {kind}: {len(registry)} záznamů za {(time.perf_counter() - start) * 1000:.1f} ms")
+    print(f"   Z cache: {loader.cache_hits}, naparsováno: {loader.parsed}")
+
+    for value in args.get:
+        for kind in REGISTRIES:
+            record = loader.load(kind).get(value)
+            if record is not None:
+                print(f"\n🔎 {kind} {value}:")
+                print(json.dumps(record, indent=2, ensure_ascii=False))
+                break
+        else:
+            print(f"\n❌ {value} není v žádném registru")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Report Stream
+Streamovaný výstup reportů: generátory skenerů vrací události (sekce,
+řádky, text) a jeden průchod je rozešle do textového, JSON-lines a CSV
+výstupu přes bufferované zápisy - bez skládání celého reportu v paměti
+"""
+
+import csv
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, NamedTuple, Sequence
+
+# Velikost bufferu zápisu - tisíce malých řádků = jen pár syscallů
+WRITE_BUFFER = 1024 * 1024
+
+FORMATS = ("txt", "jsonl", "csv")
+
+
+class Text(NamedTuple):
+    """Volný text, jen pro textový výstup (nadpisy, legenda, prázdné řádky)"""
+    text: str
+
+
+class Section(NamedTuple):
+    """Začátek sekce reportu"""
+    key: str
+    text: str
+
+
+class Row(NamedTuple):
+    """Datový řádek: strukturovaná pole pro JSON/CSV a hotový text pro TXT"""
+    section: str
+    fields: Dict[str, Any]
+    text: str
+
+
+def section(key: str, title: str, width: int = 40, prefix: str = "") -> Section:
+    """Sekce s podtrženým nadpisem ve stylu ostatních reportů"""
+    return Section(key, f"{prefix}{title}\n" + "-" * width + "\n")
+
+
+class TextSink:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = open(self.path, 'w', encoding='utf-8', buffering=WRITE_BUFFER)
+
+    def write(self, event):
+        self.file.write(event.text)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesSink:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = open(self.path, 'w', encoding='utf-8', buffering=WRITE_BUFFER)
+
+    def write(self, event):
+        if isinstance(event, Row):
+            self.file.write(json.dumps({"section": event.section, **event.fields}, ensure_ascii=False, default=str))
+            self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+
+class CsvSink:
+    """Jeden CSV soubor na sekci (<základ>_<sekce>.csv), hlavička z prvního řádku"""
+
+    def __init__(self, path: Path):
+        self.base = Path(path)
+        self.path = self.base.with_name(f"{self.base.stem}_*.csv")
+        self.writers = {}
+
+    def write(self, event):
+        if not isinstance(event, Row):
+            return
+        writer = self.writers.get(event.section)
+        if writer is None:
+            section_path = self.base.with_name(f"{self.base.stem}_{event.section}.csv")
+            f = open(section_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER)
+            writer = csv.DictWriter(f, fieldnames=list(event.fields), extrasaction='ignore')
+            writer.writeheader()
+            writer.file = f
+            self.writers[event.section] = writer
+        writer.writerow(event.fields)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.file.close()
+
+
+_SINKS = {"txt": TextSink, "jsonl": JsonLinesSink, "csv": CsvSink}
+
+
+def write_report(events: Iterable, base_path: Path, formats: Sequence[str] = ("txt",)) -> Dict[str, str]:
+    """Zapíše proud událostí do všech požadovaných formátů v jednom průchodu
+
+    base_path je cesta bez přípony; vrací {formát: soubor}.
+    """
+    base_path = Path(base_path)
+    sinks = {}
+    try:
+        for fmt in formats:
+            if fmt not in _SINKS:
+                raise ValueError(f"Neznámý formát reportu: {fmt}")
+            sinks[fmt] = _SINKS[fmt](base_path.with_name(f"{base_path.name}.{fmt}"))
+
+        for event in events:
+            for sink in sinks.values():
+                sink.write(event)
+    finally:
+        for sink in sinks.values():
+            sink.close()
+
+    return {fmt: str(sink.path) for fmt, sink in sinks.items()}
+
+
+def parse_formats(value: str) -> Sequence[str]:
+    """Argument --formats (např. 'txt,jsonl,csv')"""
+    formats = [fmt.strip() for fmt in value.split(",") if fmt.strip()]
+    if not formats:
+        raise argparse.ArgumentTypeError(f"Zadejte aspoň jeden formát (podporované: {', '.join(FORMATS)})")
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"Neznámé formáty: {', '.join(unknown)} (podporované: {', '.join(FORMATS)})")
+    return formats
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Scan Cache
+Perzistentní cache výsledků analýzy souborů (SQLite) klíčovaná podle
+velikosti, mtime_ns, inode a hashe obsahu
+"""
+
+import json
+import fnmatch
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, Optional, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Zvyšte při změně formátu uložených výsledků - stará cache se zahodí
+CACHE_VERSION = 2
+
+
+# Vlastní výstupy diagnostických skriptů (cesty relativně ke konfiguraci) - mění se
+# každým během, sken konfigurace je proto nepočítá (historie skenů, diffy)
+SCANNER_ARTIFACTS = (
+    ".storage/ha_scanner_cache.db*",
+    ".storage/ha_scan_history.db*",
+    ".storage/ha_registry_cache",
+    ".storage/ha_registry_cache/*",
+    "ha_scan_report_*",
+    "device_structure_report_*",
+    "device_visual_map_*",
+    "recorder_analysis_report_*",
+    "storage_analysis_report_*",
+)
+
+
+def is_scanner_artifact(relative: str) -> bool:
+    return any(fnmatch.fnmatchcase(relative, pattern) for pattern in SCANNER_ARTIFACTS)
+
+
+def hash_content(data: bytes) -> str:
+    """Vrátí hash obsahu souboru"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ScanCache:
+    """Cache analýzy souborů uložená v SQLite (typicky /config/.storage)"""
+
+    def __init__(self, db_path: Path, namespace: str = "default"):
+        self.db_path = Path(db_path)
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_cache (
+                namespace TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (namespace, path)
+            )
+        """)
+        self._entries = {
+            row[0]: row[1:]
+            for row in self.conn.execute(
+                "SELECT path, size, mtime_ns, inode, content_hash, result FROM file_cache "
+                "WHERE namespace = ? AND version = ?",
+                (self.namespace, CACHE_VERSION)
+            )
+        }
+
+    def lookup(self, path: str, size: int, mtime_ns: int, inode: int) -> Optional[Any]:
+        """Vrátí uložený výsledek, pokud se soubor od posledního běhu nezměnil"""
+        entry = self._entries.get(path)
+        if entry and entry[:3] == (size, mtime_ns, inode):
+            self.hits += 1
+            return json.loads(entry[4])
+        return None
+
+    def lookup_by_hash(self, path: str, content_hash: str) -> Optional[Any]:
+        """Vrátí uložený výsledek, pokud má soubor stejný obsah (např. po touch/kopii)"""
+        entry = self._entries.get(path)
+        if entry and entry[3] == content_hash:
+            self.hits += 1
+            return json.loads(entry[4])
+        return None
+
+    def store(self, path: str, size: int, mtime_ns: int, inode: int, content_hash: str, result: Any):
+        """Uloží výsledek analýzy souboru"""
+        if self._entries.get(path, (None,) * 5)[3] != content_hash:
+            self.misses += 1
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        self._entries[path] = (size, mtime_ns, inode, content_hash, payload)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO file_cache "
+            "(namespace, path, size, mtime_ns, inode, content_hash, version, result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.namespace, path, size, mtime_ns, inode, content_hash, CACHE_VERSION, payload)
+        )
+
+    def prune(self, seen_paths: Iterable[str]):
+        """Odstraní záznamy souborů, které už neexistují"""
+        stale = set(self._entries) - set(seen_paths)
+        for path in stale:
+            del self._entries[path]
+        self.conn.executemany(
+            "DELETE FROM file_cache WHERE namespace = ? AND path = ?",
+            [(self.namespace, path) for path in stale]
+        )
+        self.conn.execute(
+            "DELETE FROM file_cache WHERE namespace = ? AND version != ?",
+            (self.namespace, CACHE_VERSION)
+        )
+
+    def close(self):
+        """Zapíše změny a zavře databázi"""
+        self.conn.commit()
+        self.conn.close()
+        logger.info(f"Scan cache: {self.hits} beze změny, {self.misses} znovu analyzováno")
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Scan History
+Historie skenů v SQLite - každý sken zapíše jen změněné položky
+(entity, zařízení, oblasti, soubory, adresáře) podle hashe obsahu,
+odstraněné položky jako náhrobek. Stav libovolného skenu se skládá
+z posledních verzí, diff porovná dva skeny. Velikost roste se změnami,
+ne s počtem skenů × počtem entit
+"""
+
+import json
+import sqlite3
+import argparse
+import datetime
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from scan_cache import hash_content, is_scanner_artifact
+from storage_inventory import format_size
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Ukládá se vedle scan cache v /config/.storage
+SCAN_HISTORY_FILE = "ha_scan_history.db"
+
+# Pořadí druhů ve výpisu diffu
+KINDS = ("area", "device", "entity", "directory", "file")
+
+
+def default_history_path(config_path: Path) -> Path:
+    return Path(config_path) / ".storage" / SCAN_HISTORY_FILE
+
+
+def encode_item(data: Dict) -> Tuple[str, str]:
+    """Kanonický JSON položky a jeho hash (nezávislý na pořadí klíčů)"""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return payload, hash_content(payload.encode())
+
+
+def device_scan_items(scanner) -> Dict[str, Dict[str, Dict]]:
+    """Položky z HomeAssistantDeviceScanner: oblasti, zařízení a entity
+
+    Stav entity se neukládá (mění se při každém skenu). Entity se berou
+    z registru i z recorderu, aby entita bez změny stavu v okně skenu
+    nevypadala jako odstraněná.
+    """
+    results = scanner.scan_results
+    areas = {area_id: {"name": area.name} for area_id, area in results["areas"].items()}
+    devices = {
+        device_id: {"name": device.name, "area_id": device.area_id,
+                    "model": device.model, "manufacturer": device.manufacturer}
+        for device_id, device in results["devices"].items()
+    }
+    entities = {}
+    for entity_id, entity in results["entities"].items():
+        entities[entity_id] = {"device_id": entity.device_id, "platform": None, "disabled_by": None}
+    for entry in scanner.registries.entities:
+        entities[entry["entity_id"]] = {
+            "device_id": entry.get("device_id"),
+            "platform": entry.get("platform"),
+            "disabled_by": entry.get("disabled_by")
+        }
+    return {"area": areas, "device": devices, "entity": entities}
+
+
+def file_scan_items(scanner) -> Dict[str, Dict[str, Dict]]:
+    """Položky z HomeAssistantScanner: soubory a adresáře ze stromu souborů (relativní cesty)
+
+    Výstupy skenerů (reporty, cache, tato historie - soubory i adresáře) se
+    vynechají a jejich velikost se odečte i z nadřazených adresářů - jinak by
+    každý sken zapsal nové soubory a "zvětšený" kořen.
+    """
+    root = str(scanner.config_path)
+    files, directories, artifacts = {}, {}, []
+    for path, node in scanner._tree_index.items():
+        key = path[len(root):].lstrip("/") or "."
+        if is_scanner_artifact(key):
+            artifacts.append((key, node["size"]))
+        elif node["type"] == "directory":
+            directories[key] = {"size": node["size"], "entries": len(node["children"])}
+        else:
+            files[key] = {"size": node["size"], "modified": node["modified"]}
+
+    for key, size in artifacts:
+        parent = key.rpartition("/")[0] or "."
+        if is_scanner_artifact(parent):
+            continue    # obsah vynechaného adresáře - odečetl se s ním
+        if parent in directories:
+            directories[parent]["entries"] -= 1
+        while True:
+            if parent in directories:
+                directories[parent]["size"] -= size
+            if parent == ".":
+                break
+            parent = parent.rpartition("/")[0] or "."
+    return {"directory": directories, "file": files}
+
+
+class ScanHistory:
+    """Append-only historie skenů: tabulka scans + verze položek (scan_id, kind, key)"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS scans (
+                scan_id INTEGER PRIMARY KEY,
+                scanned_at TEXT NOT NULL,
+                scanner TEXT NOT NULL,
+                kinds TEXT NOT NULL,
+                items INTEGER NOT NULL,
+                changed INTEGER NOT NULL
+            );
+            -- content_hash NULL = položka v tomto skenu zmizela
+            CREATE TABLE IF NOT EXISTS items (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                scan_id INTEGER NOT NULL,
+                content_hash TEXT,
+                data TEXT,
+                PRIMARY KEY (kind, key, scan_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS ix_items_scan_id ON items (scan_id);
+        """)
+
+    def _latest(self, kind: str, scan_id: int, columns: str) -> Iterator[tuple]:
+        """Poslední verze každé položky druhu kind do skenu scan_id (včetně náhrobků)
+
+        SQLite u MAX() vrací ostatní sloupce ze stejného řádku - jeden průchod
+        primárním klíčem (kind, key, scan_id) bez korelovaného poddotazu.
+        """
+        return self.conn.execute(
+            f"SELECT key, {columns}, MAX(scan_id) FROM items WHERE kind = ? AND scan_id <= ? GROUP BY key",
+            (kind, scan_id)
+        )
+
+    def record(self, scanner: str, items: Dict[str, Dict[str, Dict]]) -> Tuple[int, int]:
+        """Zapíše sken - jen nové, změněné a odstraněné položky; vrací (scan_id, počet změn)
+
+        Odstranění se detekuje jen u druhů, které sken pokrývá (sken souborů
+        neodstraní entity zapsané skenem zařízení).
+        """
+        kinds = sorted(items)
+        with self.conn:
+            scan_id = self.conn.execute(
+                "INSERT INTO scans (scanned_at, scanner, kinds, items, changed) VALUES (?, ?, ?, ?, 0)",
+                (datetime.datetime.now().isoformat(timespec="seconds"), scanner, ",".join(kinds),
+                 sum(len(kind_items) for kind_items in items.values()))
+            ).lastrowid
+
+            changes = []
+            for kind in kinds:
+                previous = {key: content_hash for key, content_hash, _ in self._latest(kind, scan_id, "content_hash")}
+                current = items[kind]
+                for key, data in current.items():
+                    payload, content_hash = encode_item(data)
+                    if previous.get(key) != content_hash:
+                        changes.append((kind, key, scan_id, content_hash, payload))
+                for key, content_hash in previous.items():
+                    if content_hash is not None and key not in current:
+                        changes.append((kind, key, scan_id, None, None))
+
+            self.conn.executemany(
+                "INSERT INTO items (kind, key, scan_id, content_hash, data) VALUES (?, ?, ?, ?, ?)", changes
+            )
+            self.conn.execute("UPDATE scans SET changed = ? WHERE scan_id = ?", (len(changes), scan_id))
+
+        logger.info(f"Historie skenů: sken #{scan_id} ({scanner}), uloženo {len(changes)} změn")
+        return scan_id, len(changes)
+
+    def scans(self, scanner: Optional[str] = None) -> List[Tuple]:
+        """(scan_id, scanned_at, scanner, kinds, items, changed) od nejstaršího"""
+        if scanner:
+            return self.conn.execute(
+                "SELECT * FROM scans WHERE scanner = ? ORDER BY scan_id", (scanner,)
+            ).fetchall()
+        return self.conn.execute("SELECT * FROM scans ORDER BY scan_id").fetchall()
+
+    def state(self, scan_id: int, kinds: Iterable[str] = KINDS) -> Dict[str, Dict[str, Dict]]:
+        """Stav všech položek ve skenu scan_id"""
+        state = {}
+        for kind in kinds:
+            state[kind] = {
+                key: json.loads(data)
+                for key, content_hash, data, _ in self._latest(kind, scan_id, "content_hash, data")
+                if content_hash is not None
+            }
+        return state
+
+    def diff(self, old_scan: int, new_scan: int, kinds: Iterable[str] = KINDS) -> Dict[str, Dict]:
+        """Změny mezi dvěma skeny: přidané, odstraněné a změněné položky s rozdílem polí
+
+        Porovnávají se jen položky zapsané mezi skeny - cena je úměrná počtu změn.
+        """
+        if old_scan > new_scan:
+            old_scan, new_scan = new_scan, old_scan
+        result = {}
+        for kind in kinds:
+            touched = [key for (key,) in self.conn.execute(
+                "SELECT DISTINCT key FROM items WHERE kind = ? AND scan_id > ? AND scan_id <= ?",
+                (kind, old_scan, new_scan)
+            )]
+            if not touched:
+                continue
+            added, removed, changed = {}, {}, {}
+            for key in touched:
+                before = self.item_at(kind, key, old_scan)
+                after = self.item_at(kind, key, new_scan)
+                if before is None and after is not None:
+                    added[key] = after
+                elif before is not None and after is None:
+                    removed[key] = before
+                elif before != after:
+                    changed[key] = {
+                        field: (before.get(field), after.get(field))
+                        for field in sorted(set(before) | set(after))
+                        if before.get(field) != after.get(field)
+                    }
+            if added or removed or changed:
+                result[kind] = {"added": added, "removed": removed, "changed": changed}
+        return result
+
+    def item_at(self, kind: str, key: str, scan_id: int) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT data FROM items WHERE kind = ? AND key = ? AND scan_id <= ? ORDER BY scan_id DESC LIMIT 1",
+            (kind, key, scan_id)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] is not None else None
+
+    def close(self):
+        self.conn.close()
+
+
+def record_scan(config_path: Path, scanner: str, items: Dict[str, Dict[str, Dict]]) -> Optional[int]:
+    """Zapíše sken do výchozí historie; chyba zápisu (např. read-only /config) sken neshodí"""
+    try:
+        history = ScanHistory(default_history_path(config_path))
+    except (OSError, sqlite3.Error) as e:
+        logger.warning(f"Historii skenů nelze otevřít: {e}")
+        return None
+    try:
+        scan_id, _ = history.record(scanner, items)
+        return scan_id
+    except sqlite3.Error as e:
+        logger.warning(f"Sken nelze zapsat do historie: {e}")
+        return None
+    finally:
+        history.close()
+
+
+def format_value(field: str, value) -> str:
+    if field == "size" and isinstance(value, int):
+        return format_size(value)
+    return str(value)
+
+
+def print_diff(diff: Dict[str, Dict], old_scan: int, new_scan: int, limit: int):
+    print(f"🔀 ROZDÍL SKENŮ #{old_scan} → #{new_scan}")
+    if not diff:
+        print("   ✅ Žádné změny")
+        return
+    for kind in KINDS:
+        if kind not in diff:
+            continue
+        changes = diff[kind]
+        print(f"\n{kind.upper()}: +{len(changes['added'])} -{len(changes['removed'])} ~{len(changes['changed'])}")
+        print("-" * 40)
+        for key in sorted(changes["added"])[:limit]:
+            print(f"   ➕ {key}")
+        for key in sorted(changes["removed"])[:limit]:
+            print(f"   ➖ {key}")
+
+        # Největší nárůst velikosti první (adresáře, soubory)
+        def growth(item):
+            before, after = item[1].get("size", (0, 0))
+            return (after or 0) - (before or 0)
+
+        for key, fields in sorted(changes["changed"].items(), key=growth, reverse=True)[:limit]:
+            parts = []
+            for field, (before, after) in fields.items():
+                part = f"{field}: {format_value(field, before)} → {format_value(field, after)}"
+                if field == "size" and isinstance(before, int) and isinstance(after, int):
+                    growth_bytes = after - before
+                    part += f" ({'+' if growth_bytes >= 0 else '-'}{format_size(abs(growth_bytes))})"
+                parts.append(part)
+            print(f"   ✏️  {key}: {', '.join(parts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Scan History")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--db", help=f"Databáze historie (výchozí: <config>/.storage/{SCAN_HISTORY_FILE})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="Seznam uložených skenů")
+    list_parser.add_argument("--scanner", help="Jen skeny daného skeneru (device_structure, complete)")
+
+    diff_parser = subparsers.add_parser("diff", help="Co se změnilo mezi dvěma skeny")
+    diff_parser.add_argument("old", type=int, nargs="?", help="Starší sken (výchozí: předposlední)")
+    diff_parser.add_argument("new", type=int, nargs="?", help="Novější sken (výchozí: poslední)")
+    diff_parser.add_argument("--scanner", help="Výchozí skeny vybírat jen z daného skeneru")
+    diff_parser.add_argument("--kind", action="append", choices=KINDS, help="Jen daný druh položek (lze opakovat)")
+    diff_parser.add_argument("--limit", type=int, default=50, help="Max. položek na druh a typ změny")
+    diff_parser.add_argument("--json", action="store_true", help="Výstup jako JSON")
+    args = parser.parse_args()
+
+    history = ScanHistory(Path(args.db) if args.db else default_history_path(args.config))
+    try:
+        if args.command == "list":
+            print("🗂️  HISTORIE SKENŮ:")
+            for scan_id, scanned_at, scanner, kinds, items, changed in history.scans(args.scanner):
+                print(f"   #{scan_id} {scanned_at} {scanner} ({kinds}): {items} položek, {changed} změn")
+            return
+
+        # "diff" = poslední dva skeny, "diff N" = sken N proti poslednímu
+        scan_ids = [scan[0] for scan in history.scans(args.scanner)]
+        new = args.new if args.new is not None else (scan_ids[-1] if scan_ids else None)
+        old = args.old
+        if old is None and new is not None:
+            earlier = [scan_id for scan_id in scan_ids if scan_id < new]
+            old = earlier[-1] if earlier else None
+        if old is None or new is None or old == new:
+            print("❌ Pro porovnání jsou potřeba alespoň dva skeny")
+            return
+
+        diff = history.diff(old, new, args.kind or KINDS)
+        if args.json:
+            print(json.dumps(diff, indent=2, ensure_ascii=False, default=str))
+        else:
+            print_diff(diff, min(old, new), max(old, new), args.limit)
+    finally:
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ Komplexní analýza úložišť, formátů a doporučení pro optimální rozdě
 
 import os
 import shutil
+import argparse
+import sqlite3
 import subprocess
 import json
 from pathlib import Path
@@ -13,14 +15,39 @@ import datetime
 import logging
 from typing import Dict, List, Any, Tuple
 
+from report_stream import Row, Text, section, write_report, parse_formats
+from device_probe import ProbeScheduler, DEFAULT_TIMEOUT, DEFAULT_TTL, DEFAULT_CACHE_FILE
+import storage_inventory
+import storage_benchmark
+import recorder_benchmark
+import io_telemetry
+import write_attribution
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Denní objem zápisů, nad kterým SD karta rychle opotřebovává buňky
+SD_CARD_WRITE_WARNING_GB_PER_DAY = 1.0
+
 class StorageAnalyzer:
-    def __init__(self):
+    def __init__(self, probe_timeout: float = DEFAULT_TIMEOUT, probe_ttl: float = DEFAULT_TTL,
+                 probe_jobs: int = None, probe_cache: Path = DEFAULT_CACHE_FILE,
+                 inventory: str = "auto", benchmark_file: Path = storage_benchmark.DEFAULT_RESULTS_FILE,
+                 recorder_benchmark_file: Path = recorder_benchmark.DEFAULT_RESULTS_FILE,
+                 telemetry_file: Path = io_telemetry.DEFAULT_RING_FILE,
+                 attribution_file: Path = write_attribution.DEFAULT_STATE_FILE):
+        self.inventory = inventory
+        self.attribution_file = attribution_file
+        self.telemetry_file = Path(telemetry_file)
+        self.benchmark_file = benchmark_file
+        self.benchmarks = storage_benchmark.load_results(benchmark_file)
+        self.recorder_benchmark_file = recorder_benchmark_file
+        self.recorder_benchmarks = storage_benchmark.load_results(recorder_benchmark_file)
+        self.potential_issues = []
         self.storage_info = {}
         self.analysis_results = {}
         self.recommendations = []
+        self.prober = ProbeScheduler(timeout=probe_timeout, ttl=probe_ttl, jobs=probe_jobs, cache_file=probe_cache)
         
     def get_storage_devices(self) -> List[Dict]:
         """Získá informace o všech úložných zařízeních"""
@@ -29,23 +56,41 @@ class StorageAnalyzer:
         devices = []
         
         try:
-            # Použití lsblk pro detailní informace
-            result = subprocess.run([
-                'lsblk', '-o', 'NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,LABEL,MODEL', '-J'
-            ], capture_output=True, text=True)
+            blockdevices = self.list_block_devices()
             
-            if result.returncode == 0:
-                lsblk_data = json.loads(result.stdout)
-                for device in lsblk_data.get('blockdevices', []):
-                    device_info = self.analyze_device(device)
-                    if device_info:
-                        devices.append(device_info)
+            # Všechny disky se prozkoumají najednou a paralelně, oddíly pak sdílí výsledek
+            self.prober.probe(device['name'] for device in blockdevices)
+            for device in blockdevices:
+                device_info = self.analyze_device(device)
+                if device_info:
+                    devices.append(device_info)
             
         except Exception as e:
             logger.error(f"Chyba při získávání informací o zařízeních: {e}")
         
         return devices
     
+    def list_block_devices(self) -> List[Dict]:
+        """Strom blokových zařízení - ze sysfs, lsblk jen jako záloha"""
+        if self.inventory in ("auto", "sysfs"):
+            try:
+                blockdevices = storage_inventory.block_devices()
+                if blockdevices or self.inventory == "sysfs":
+                    return blockdevices
+            except Exception as e:
+                if self.inventory == "sysfs":
+                    raise
+                logger.warning(f"Inventář ze sysfs selhal, použije se lsblk: {e}")
+        
+        # Použití lsblk pro detailní informace
+        result = subprocess.run([
+            'lsblk', '-o', 'NAME,SIZE,TYPE,MOUNTPOINT,FSTYPE,LABEL,MODEL', '-J'
+        ], capture_output=True, text=True)
+        
+        if result.returncode == 0:
+            return json.loads(result.stdout).get('blockdevices', [])
+        return []
+    
     def analyze_device(self, device: Dict) -> Dict:
         """Analyzuje jednotlivé úložné zařízení"""
         device_info = {
@@ -54,15 +99,20 @@ class StorageAnalyzer:
             'type': device.get('type'),
             'mountpoint': device.get('mountpoint'),
             'filesystem': device.get('fstype'),
-            'model': device.get('model', 'Neznámý'),
+            'model': device.get('model') or 'Neznámý',
             'children': []
         }
         
+        # Přesné údaje ze sysfs (u lsblk záložní cesty chybí)
+        for key in ('size_bytes', 'rotational', 'removable', 'serial', 'queue'):
+            if device.get(key) is not None:
+                device_info[key] = device[key]
+        
         # Detekce typu zařízení
         device_info['device_type'] = self.detect_device_type(device_info)
         
         # Získání detailních informací
-        device_info.update(self.get_device_details(device_info['name']))
+        device_info.update(self.get_device_details(device_info['name'], device_info['mountpoint']))
         
         # Analýza dětí (partitions)
         if device.get('children'):
@@ -75,8 +125,8 @@ class StorageAnalyzer:
     def detect_device_type(self, device: Dict) -> str:
         """Detekuje typ úložného zařízení"""
         name = device['name'].lower()
-        model = device['model'].lower()
-        mountpoint = device['mountpoint'] or ''
+        model = (device.get('model') or '').lower()
+        mountpoint = device.get('mountpoint') or ''
         
         # Detekce podle jména zařízení
         if 'mmcblk' in name or mountpoint == '/boot':
@@ -92,40 +142,40 @@ class StorageAnalyzer:
         else:
             return 'UNKNOWN'
     
-    def get_device_details(self, device_name: str) -> Dict:
+    def get_device_details(self, device_name: str, mountpoint: str = None) -> Dict:
         """Získá detailní informace o zařízení"""
         details = {}
         
         try:
-            # SMART data pro HDD/SSD
-            if not device_name.startswith('mmc'):
-                smart_result = subprocess.run([
-                    'sudo', 'smartctl', '-i', f'/dev/{device_name}'
-                ], capture_output=True, text=True)
-                
-                if smart_result.returncode == 0:
-                    details['smart_available'] = True
-                    # Extrahování užitečných informací
-                    for line in smart_result.stdout.split('\n'):
-                        if 'Model Family' in line:
-                            details['family'] = line.split(':')[1].strip()
-                        elif 'User Capacity' in line:
-                            details['capacity'] = line.split(':')[1].strip()
-                        elif 'Sector Size' in line:
-                            details['sector_size'] = line.split(':')[1].strip()
-                        elif 'Rotation Rate' in line:
-                            details['rotation_rate'] = line.split(':')[1].strip()
+            # SMART data pro HDD/SSD - z plánovače sond (jednou za disk, s timeoutem a cache)
+            details.update(self.prober.details(device_name))
             
             # Informace o výkonu
-            details.update(self.assess_performance(device_name))
+            details.update(self.assess_performance(device_name, mountpoint))
             
         except Exception as e:
             logger.warning(f"Nelze získat SMART data pro {device_name}: {e}")
         
         return details
     
-    def assess_performance(self, device_name: str) -> Dict:
-        """Odhadne výkon zařízení"""
+    def run_benchmark(self, mountpoint: str, size_mb: int = storage_benchmark.DEFAULT_SIZE_MB,
+                      duration: float = storage_benchmark.DEFAULT_DURATION) -> Dict:
+        """Změří úložiště na mountpointu a výsledek uloží pro další analýzy"""
+        result = storage_benchmark.run_benchmark(mountpoint, size_mb, duration)
+        self.benchmarks = storage_benchmark.save_result(result, self.benchmark_file)
+        logger.info(f"✅ {result['mountpoint']}: {storage_benchmark.describe(result)}")
+        return result
+    
+    def run_recorder_benchmark(self, mountpoint: str,
+                               duration: float = recorder_benchmark.DEFAULT_DURATION) -> Dict:
+        """Přehraje zátěž recorderu na mountpointu a výsledek uloží pro plán migrace"""
+        result = recorder_benchmark.run_recorder_benchmark(mountpoint, duration)
+        self.recorder_benchmarks = storage_benchmark.save_result(result, self.recorder_benchmark_file)
+        logger.info(f"✅ {result['mountpoint']}: {recorder_benchmark.describe(result)}")
+        return result
+    
+    def assess_performance(self, device_name: str, mountpoint: str = None) -> Dict:
+        """Odhadne výkon zařízení (změřený, pokud pro mountpoint existuje benchmark)"""
         performance = {
             'performance_tier': 'UNKNOWN',
             'recommended_use': [],
@@ -134,6 +184,11 @@ class StorageAnalyzer:
         
         device_type = self.detect_device_type({'name': device_name, 'model': ''})
         
+        benchmark = self.benchmarks.get(mountpoint) if mountpoint else None
+        if benchmark:
+            # Naměřená třída má přednost před odhadem podle jména zařízení
+            device_type = storage_benchmark.classify(benchmark)
+        
         if device_type == 'NVME':
             performance.update({
                 'performance_tier': 'VERY_HIGH',
@@ -165,6 +220,10 @@ class StorageAnalyzer:
                 'note': 'Pomalý přístup, vhodný pro data s nízkou frekvencí zápisu'
             })
         
+        if benchmark:
+            performance['speed_estimate'] = f"{storage_benchmark.describe(benchmark)} (změřeno)"
+            performance['benchmark'] = benchmark
+        
         return performance
     
     def analyze_filesystem(self, mountpoint: str) -> Dict:
@@ -172,6 +231,12 @@ class StorageAnalyzer:
         if not mountpoint:
             return {}
         
+        try:
+            # statvfs: přesné bajty bez fork/exec
+            return storage_inventory.filesystem_usage(mountpoint)
+        except OSError as e:
+            logger.debug(f"statvfs pro {mountpoint} selhal, použije se df: {e}")
+        
         try:
             result = subprocess.run(['df', '-h', mountpoint], capture_output=True, text=True)
             lines = result.stdout.strip().split('\n')
@@ -260,20 +325,31 @@ class StorageAnalyzer:
         optimal_layout = self.get_optimal_layout()
         current_setup = self.analyze_current_setup(devices)
         
-        # Doporučení pro každé zařízení
-        for device in devices:
+        # Doporučení pro každé připojené zařízení i oddíl
+        for device in self.iter_devices(devices):
             dev_type = device['device_type']
             mountpoint = device.get('mountpoint')
+            benchmark = self.benchmarks.get(mountpoint) if mountpoint else None
+            
+            # Se změřenými hodnotami se rozhoduje podle nich, ne podle typu zařízení
+            layout_type = storage_benchmark.classify(benchmark) if benchmark else dev_type
             
-            if dev_type in optimal_layout and mountpoint:
+            if layout_type in optimal_layout and mountpoint:
+                notes = optimal_layout[layout_type]['notes']
+                if benchmark:
+                    notes += f" | Změřeno: {storage_benchmark.describe(benchmark)}"
+                    if layout_type != dev_type:
+                        notes += f" | Chová se jako {layout_type}, ne {dev_type}"
+                
                 recommendation = {
                     'device': device['name'],
                     'type': dev_type,
                     'mountpoint': mountpoint,
                     'current_usage': self.get_current_usage(mountpoint),
-                    'recommended_usage': optimal_layout[dev_type]['recommended_use'],
-                    'avoid_usage': optimal_layout[dev_type]['avoid'],
-                    'notes': optimal_layout[dev_type]['notes']
+                    'recommended_usage': optimal_layout[layout_type]['recommended_use'],
+                    'avoid_usage': optimal_layout[layout_type]['avoid'],
+                    'notes': notes,
+                    'measured_type': layout_type if benchmark else None
                 }
                 
                 self.recommendations.append(recommendation)
@@ -281,6 +357,18 @@ class StorageAnalyzer:
         # Celková doporučení
         self.generate_overall_recommendations(current_setup)
     
+    def iter_devices(self, devices: List[Dict]):
+        """Zařízení včetně oddílů (do hloubky)"""
+        for device in devices:
+            yield device
+            yield from self.iter_devices(device.get('children', []))
+    
+    def generate_overall_recommendations(self, current_setup: Dict):
+        """Celková upozornění k současnému nastavení"""
+        self.potential_issues = current_setup['potential_issues']
+        for issue in self.potential_issues:
+            logger.warning(f"⚠️  {issue}")
+    
     def analyze_current_setup(self, devices: List[Dict]) -> Dict:
         """Analyzuje současné nastavení"""
         setup = {
@@ -355,17 +443,40 @@ class StorageAnalyzer:
             ]
         })
         
-        # Krok 2: Přesun recorder databáze
-        migration_steps.append({
-            'step': 2,
-            'title': 'Přesun recorder databáze na NVMe',
-            'actions': [
-                'Zastavte Home Assistant: docker stop home-assistant',
-                'Zálohujte současnou databázi',
-                'Upravte configuration.yaml: použijte MySQL nebo přesuňte SQLite na NVMe',
-                'Nastavte práva: sudo chown -R $USER:$USER /mnt/nvme/hass_data'
-            ]
-        })
+        # Krok 2: Přesun recorder databáze - cíl podle změřené zátěže recorderu, pokud existuje
+        ranking = recorder_benchmark.rank_targets(self.recorder_benchmarks)
+        if ranking:
+            best = ranking[0]['mountpoint']
+            # Vlastní adresář recorderu - práva se nemění na celém přípojném bodě
+            recorder_dir = f"{best.rstrip('/')}/hass_data"
+            migration_steps.append({
+                'step': 2,
+                'title': f'Přesun recorder databáze na {best} (nejlepší změřený cíl)',
+                'actions': [
+                    f'Vytvořte adresář recorderu: sudo mkdir -p {recorder_dir}',
+                    f'Snímek databáze za běhu HA: python3 DIAGNOSTICS/recorder_snapshot.py '
+                    f'/config/home-assistant_v2.db {recorder_dir}/home-assistant_v2.db',
+                    'Zastavte Home Assistant a spusťte stejný příkaz znovu (dopíšou se jen změněné stránky)',
+                    f'Upravte recorder.db_url v configuration.yaml na sqlite:///{recorder_dir}/home-assistant_v2.db',
+                    f'Nastavte práva: sudo chown -R homeassistant:homeassistant {recorder_dir}'
+                ] + [
+                    f'Pořadí {position}: {result["mountpoint"]} ({result.get("device") or "?"}) - '
+                    f'{recorder_benchmark.describe(result)}'
+                    for position, result in enumerate(ranking, 1)
+                ]
+            })
+        else:
+            migration_steps.append({
+                'step': 2,
+                'title': 'Přesun recorder databáze na NVMe',
+                'actions': [
+                    'Snímek databáze za běhu HA: python3 DIAGNOSTICS/recorder_snapshot.py '
+                    '/config/home-assistant_v2.db /mnt/nvme/hass_data/home-assistant_v2.db',
+                    'Zastavte Home Assistant a spusťte stejný příkaz znovu (dopíšou se jen změněné stránky)',
+                    'Upravte configuration.yaml: použijte MySQL nebo SQLite z /mnt/nvme/hass_data',
+                    'Nastavte práva: sudo chown -R homeassistant:homeassistant /mnt/nvme/hass_data'
+                ]
+            })
         
         # Krok 3: Optimalizace SD karty
         migration_steps.append({
@@ -381,12 +492,52 @@ class StorageAnalyzer:
         
         return migration_steps
     
+    def analyze_io_telemetry(self, devices: List[Dict]) -> List[Dict]:
+        """Zápisy z I/O telemetrie přiřazené připojeným zařízením a jejich využití v HA"""
+        if not self.telemetry_file.exists():
+            return []
+        
+        try:
+            ring = io_telemetry.RingBuffer(self.telemetry_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Nelze načíst I/O telemetrii: {e}")
+            return []
+        try:
+            summary = io_telemetry.summarize(ring)
+        finally:
+            ring.close()
+        
+        telemetry = []
+        for device in self.iter_devices(devices):
+            measured = summary.get(device['name'])
+            if not measured:
+                continue
+            mountpoint = device.get('mountpoint')
+            entry = {
+                'device': device['name'],
+                'type': device['device_type'],
+                'mountpoint': mountpoint,
+                'usage': self.get_current_usage(mountpoint) if mountpoint else [],
+                **measured
+            }
+            if device['device_type'] == 'SD_CARD' and measured['write_gb_per_day'] >= SD_CARD_WRITE_WARNING_GB_PER_DAY:
+                self.potential_issues.append(
+                    f"SD karta {device['name']} ({mountpoint or 'nepřipojeno'}) zapisuje "
+                    f"{measured['write_gb_per_day']} GB/den - přesuňte zapisující data na SSD/NVMe"
+                )
+            telemetry.append(entry)
+        
+        telemetry.sort(key=lambda entry: entry['write_bytes'], reverse=True)
+        return telemetry
+    
     def run_analysis(self):
         """Provede kompletní analýzu"""
         logger.info("🔍 Spouštím analýzu úložišť...")
         
         devices = self.get_storage_devices()
         self.generate_recommendations(devices)
+        io_telemetry_summary = self.analyze_io_telemetry(devices)
+        attribution = write_attribution.load_state(self.attribution_file)
         migration_plan = self.generate_migration_plan()
         
         results = {
@@ -394,75 +545,186 @@ class StorageAnalyzer:
             'devices': devices,
             'recommendations': self.recommendations,
             'optimal_layout': self.get_optimal_layout(),
-            'migration_plan': migration_plan
+            'migration_plan': migration_plan,
+            'potential_issues': self.potential_issues,
+            'io_telemetry': io_telemetry_summary,
+            'top_writers': write_attribution.top_writers_per_device(attribution) if attribution else {}
         }
         
         return results
     
-    def generate_report(self, results: Dict, output_file: str = None):
-        """Vygeneruje podrobný report"""
+    def iter_report(self, results: Dict):
+        """Události reportu (sekce a řádky) pro report_stream"""
+        yield Text("=" * 80 + "\n")
+        yield Text("HOME ASSISTANT - ANALÝZA ÚLOŽIŠŤ A DOPORUČENÍ\n")
+        yield Text("=" * 80 + "\n\n")
+        
+        # Přehled zařízení
+        yield section("devices", "📊 PŘEHLED ÚLOŽNÝCH ZAŘÍZENÍ:", width=50)
+        for device in results['devices']:
+            yield Row(
+                "devices",
+                {"name": device['name'], "device_type": device['device_type'], "size": device['size'],
+                 "filesystem": device.get('filesystem'), "mountpoint": device.get('mountpoint'),
+                 "model": device.get('model'), "performance_tier": device.get('performance_tier')},
+                f"\n🔧 {device['name']} ({device['device_type']})\n"
+                f"   Velikost: {device['size']}\n"
+                f"   Filesystem: {device.get('filesystem', 'N/A')}\n"
+                f"   Mountpoint: {device.get('mountpoint', 'Nepřipojeno')}\n"
+                f"   Model: {device.get('model', 'Neznámý')}\n"
+                f"   Odhad výkonu: {device.get('performance_tier', 'Neznámý')}\n"
+            )
+        
+        # Doporučení
+        yield section("recommendations", "💡 DOPORUČENÍ PRO ROZDĚLENÍ:", width=50, prefix="\n")
+        for rec in results['recommendations']:
+            text = f"\n📍 {rec['device']} ({rec['type']}) - {rec['mountpoint']}\n"
+            text += "   Doporučené použití:\n"
+            text += "".join(f"   ✅ {use}\n" for use in rec['recommended_usage'])
+            text += "   Nevhodné použití:\n"
+            text += "".join(f"   ❌ {avoid}\n" for avoid in rec['avoid_usage'])
+            text += f"   Poznámka: {rec['notes']}\n"
+            yield Row(
+                "recommendations",
+                {"device": rec['device'], "type": rec['type'], "mountpoint": rec['mountpoint'],
+                 "recommended_usage": "; ".join(rec['recommended_usage']),
+                 "avoid_usage": "; ".join(rec['avoid_usage']), "notes": rec['notes']},
+                text
+            )
+        
+        # Plán migrace
+        yield section("migration_plan", "🔄 PLÁN MIGRACE NA OPTIMÁLNÍ NASTAVENÍ:", width=50, prefix="\n")
+        for step in results['migration_plan']:
+            yield Text(f"\nKrok {step['step']}: {step['title']}\n")
+            for action in step['actions']:
+                yield Row(
+                    "migration_plan",
+                    {"step": step['step'], "title": step['title'], "action": action},
+                    f"   • {action}\n"
+                )
+        
+        # Zápisy podle I/O telemetrie
+        if results.get('io_telemetry'):
+            yield section("io_telemetry", "💾 ZÁPISY PODLE ZAŘÍZENÍ (I/O TELEMETRIE):", width=50, prefix="\n")
+            for entry in results['io_telemetry']:
+                yield Row(
+                    "io_telemetry",
+                    {key: entry[key] for key in (
+                        'device', 'type', 'mountpoint', 'write_bytes', 'write_bps', 'peak_write_bps',
+                        'iops', 'await_ms', 'queue_depth', 'write_gb_per_day', 'seconds')},
+                    f"\n📍 {entry['device']} ({entry['type']}) - {entry['mountpoint'] or 'Nepřipojeno'}\n"
+                    f"   Využití: {', '.join(entry['usage']) or 'Neznámé'}\n"
+                    f"   Zapsáno: {entry['write_bytes'] / 1e6:.1f} MB ({entry['write_gb_per_day']} GB/den)\n"
+                    f"   Zápis: průměr {entry['write_bps'] / 1e3:.1f} kB/s, špička {entry['peak_write_bps'] / 1e3:.1f} kB/s\n"
+                    f"   IOPS: {entry['iops']}, await: {entry['await_ms']} ms, fronta: {entry['queue_depth']}\n"
+                )
+        
+        # Největší zapisovatelé (procesy/kontejnery)
+        if results.get('top_writers'):
+            yield section("top_writers", "✍️  NEJVĚTŠÍ ZAPISOVATELÉ PODLE ZAŘÍZENÍ:", width=50, prefix="\n")
+            for device, writers in sorted(results['top_writers'].items()):
+                yield Text(f"\n{device}:\n")
+                for writer in writers:
+                    estimate = " (odhad)" if writer['estimated'] else ""
+                    yield Row(
+                        "top_writers",
+                        {"device": device, **writer},
+                        f"   {'🐳' if writer['kind'] == 'container' else '🖥️ '} {writer['name']}: "
+                        f"{writer['write_bytes'] / 1e6:.1f} MB, {writer['write_bps'] / 1e3:.1f} kB/s{estimate}\n"
+                    )
+        
+        # Optimální layout
+        yield section("optimal_layout", "🎯 OPTIMÁLNÍ ROZDĚLENÍ PODLE TYPU ZAŘÍZENÍ:", width=50, prefix="\n")
+        for dev_type, layout in results['optimal_layout'].items():
+            text = f"\n{dev_type}:\n"
+            text += f"   Priorita: {layout['priority']}\n"
+            text += "   Doporučené použití:\n"
+            text += "".join(f"   • {use}\n" for use in layout['recommended_use'])
+            yield Row(
+                "optimal_layout",
+                {"device_type": dev_type, "priority": layout['priority'],
+                 "recommended_use": "; ".join(layout['recommended_use'])},
+                text
+            )
+    
+    def generate_report(self, results: Dict, output_file: str = None, formats=("txt",)):
+        """Vygeneruje podrobný report (jeden průchod do všech formátů)"""
         if not output_file:
             output_file = f"storage_analysis_report_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("HOME ASSISTANT - ANALÝZA ÚLOŽIŠŤ A DOPORUČENÍ\n")
-            f.write("=" * 80 + "\n\n")
-            
-            # Přehled zařízení
-            f.write("📊 PŘEHLED ÚLOŽNÝCH ZAŘÍZENÍ:\n")
-            f.write("-" * 50 + "\n")
-            for device in results['devices']:
-                f.write(f"\n🔧 {device['name']} ({device['device_type']})\n")
-                f.write(f"   Velikost: {device['size']}\n")
-                f.write(f"   Filesystem: {device.get('filesystem', 'N/A')}\n")
-                f.write(f"   Mountpoint: {device.get('mountpoint', 'Nepřipojeno')}\n")
-                f.write(f"   Model: {device.get('model', 'Neznámý')}\n")
-                f.write(f"   Odhad výkonu: {device.get('performance_tier', 'Neznámý')}\n")
-            
-            # Doporučení
-            f.write("\n💡 DOPORUČENÍ PRO ROZDĚLENÍ:\n")
-            f.write("-" * 50 + "\n")
-            for rec in results['recommendations']:
-                f.write(f"\n📍 {rec['device']} ({rec['type']}) - {rec['mountpoint']}\n")
-                f.write(f"   Doporučené použití:\n")
-                for use in rec['recommended_usage']:
-                    f.write(f"   ✅ {use}\n")
-                f.write(f"   Nevhodné použití:\n")
-                for avoid in rec['avoid_usage']:
-                    f.write(f"   ❌ {avoid}\n")
-                f.write(f"   Poznámka: {rec['notes']}\n")
-            
-            # Plán migrace
-            f.write("\n🔄 PLÁN MIGRACE NA OPTIMÁLNÍ NASTAVENÍ:\n")
-            f.write("-" * 50 + "\n")
-            for step in results['migration_plan']:
-                f.write(f"\nKrok {step['step']}: {step['title']}\n")
-                for action in step['actions']:
-                    f.write(f"   • {action}\n")
-            
-            # Optimální layout
-            f.write("\n🎯 OPTIMÁLNÍ ROZDĚLENÍ PODLE TYPU ZAŘÍZENÍ:\n")
-            f.write("-" * 50 + "\n")
-            for dev_type, layout in results['optimal_layout'].items():
-                f.write(f"\n{dev_type}:\n")
-                f.write(f"   Priorita: {layout['priority']}\n")
-                f.write("   Doporučené použití:\n")
-                for use in layout['recommended_use']:
-                    f.write(f"   • {use}\n")
-        
-        logger.info(f"✅ Report uložen do: {output_file}")
-        return output_file
+        files = write_report(self.iter_report(results), Path(output_file).with_suffix(""), formats)
+        for path in files.values():
+            logger.info(f"✅ Report uložen do: {path}")
+        return files.get("txt") or next(iter(files.values()))
 
 def main():
     """Hlavní funkce"""
+    parser = argparse.ArgumentParser(description="Home Assistant Storage Analyzer")
+    parser.add_argument("--output", help="Soubor reportu (výchozí: storage_analysis_report_<čas>.txt)")
+    parser.add_argument(
+        "--formats", type=parse_formats, default=["txt"],
+        help="Formáty reportu oddělené čárkou: txt,jsonl,csv (výchozí: txt)"
+    )
+    parser.add_argument("--probe-timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Časový limit jedné sondy (smartctl) v sekundách (výchozí: {DEFAULT_TIMEOUT:g})")
+    parser.add_argument("--probe-ttl", type=float, default=DEFAULT_TTL,
+                        help=f"Platnost cache sond podle sériového čísla v sekundách, 0 = bez cache (výchozí: {DEFAULT_TTL})")
+    parser.add_argument("--probe-jobs", type=int, default=None,
+                        help="Počet paralelních sond (výchozí: počet disků, max. 8)")
+    parser.add_argument("--probe-cache", type=Path, default=DEFAULT_CACHE_FILE,
+                        help=f"Soubor cache sond (výchozí: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--benchmark", action="append", default=[], metavar="MOUNTPOINT",
+                        help="Před analýzou změří úložiště na mountpointu (lze opakovat)")
+    parser.add_argument("--bench-size-mb", type=int, default=storage_benchmark.DEFAULT_SIZE_MB,
+                        help=f"Velikost testovacího souboru v MB (výchozí: {storage_benchmark.DEFAULT_SIZE_MB})")
+    parser.add_argument("--bench-duration", type=float, default=storage_benchmark.DEFAULT_DURATION,
+                        help=f"Limit jedné fáze testu v sekundách (výchozí: {storage_benchmark.DEFAULT_DURATION:g})")
+    parser.add_argument("--bench-results", type=Path, default=storage_benchmark.DEFAULT_RESULTS_FILE,
+                        help=f"Soubor s uloženými výsledky měření (výchozí: {storage_benchmark.DEFAULT_RESULTS_FILE})")
+    parser.add_argument("--recorder-benchmark", action="append", default=[], metavar="MOUNTPOINT",
+                        help="Přehraje zátěž recorderu na kandidátském mountpointu (lze opakovat)")
+    parser.add_argument("--recorder-duration", type=float, default=recorder_benchmark.DEFAULT_DURATION,
+                        help=f"Limit jedné varianty zátěže v sekundách (výchozí: {recorder_benchmark.DEFAULT_DURATION:g})")
+    parser.add_argument("--recorder-results", type=Path, default=recorder_benchmark.DEFAULT_RESULTS_FILE,
+                        help=f"Soubor s výsledky zátěže recorderu (výchozí: {recorder_benchmark.DEFAULT_RESULTS_FILE})")
+    parser.add_argument("--telemetry", type=Path, default=io_telemetry.DEFAULT_RING_FILE,
+                        help=f"Soubor I/O telemetrie z io_telemetry.py run (výchozí: {io_telemetry.DEFAULT_RING_FILE})")
+    parser.add_argument("--write-attribution", type=Path, default=write_attribution.DEFAULT_STATE_FILE,
+                        help=f"Stav sběru zápisů z write_attribution.py run (výchozí: {write_attribution.DEFAULT_STATE_FILE})")
+    parser.add_argument("--inventory", choices=["auto", "sysfs", "lsblk"], default="auto",
+                        help="Zdroj inventáře zařízení (výchozí: auto = sysfs, při selhání lsblk)")
+    args = parser.parse_args()
+    
     print("🔍 Home Assistant Storage Analyzer")
     print("===================================")
     
-    analyzer = StorageAnalyzer()
+    analyzer = StorageAnalyzer(
+        probe_timeout=args.probe_timeout,
+        probe_ttl=args.probe_ttl,
+        probe_jobs=args.probe_jobs,
+        probe_cache=args.probe_cache,
+        inventory=args.inventory,
+        benchmark_file=args.bench_results,
+        recorder_benchmark_file=args.recorder_results,
+        telemetry_file=args.telemetry,
+        attribution_file=args.write_attribution
+    )
+    
+    for mountpoint in args.benchmark:
+        try:
+            analyzer.run_benchmark(mountpoint, args.bench_size_mb, args.bench_duration)
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Měření {mountpoint} selhalo: {e}")
+    
+    for mountpoint in args.recorder_benchmark:
+        try:
+            analyzer.run_recorder_benchmark(mountpoint, args.recorder_duration)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Zátěž recorderu na {mountpoint} selhala: {e}")
+    
     results = analyzer.run_analysis()
     
-    report_file = analyzer.generate_report(results)
+    report_file = analyzer.generate_report(results, args.output, formats=args.formats)
     
     # Zobrazení souhrnu
     print(f"\n📊 SOUHRN ANALÝZY:")
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Storage Benchmark
+Krátký měřicí test úložiště na zvoleném mountpointu: sekvenční čtení/zápis,
+náhodné 4k IOPS přes O_DIRECT a latence fsync (to, co platí commit SQLite).
+Velikost i délka testu jsou omezené, výsledky se ukládají pro doporučení
+"""
+
+import os
+import json
+import mmap
+import time
+import random
+import logging
+import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import storage_inventory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULTS_FILE = Path.home() / ".cache" / "ha_storage_benchmark.json"
+DEFAULT_SIZE_MB = 64
+DEFAULT_DURATION = 3.0   # limit jedné fáze testu v sekundách
+
+SEQ_BLOCK = 1024 * 1024
+RANDOM_BLOCK = 4096
+MAX_FSYNC_SAMPLES = 1000
+
+# Prahy pro zařazení změřeného úložiště do třídy z get_optimal_layout()
+NVME_MIN_RANDOM_READ_IOPS = 20000
+NVME_MIN_SEQ_READ_MBPS = 800
+HDD_MAX_RANDOM_READ_IOPS = 400          # mechanický disk je omezen vystavováním hlaviček
+SSD_MIN_SEQ_WRITE_MBPS = 100
+SSD_MIN_RANDOM_WRITE_IOPS = 1000
+SSD_MAX_FSYNC_P99_MS = 20
+
+
+def _open(path: Path, flags: int, direct: bool) -> int:
+    if direct:
+        return os.open(path, flags | os.O_DIRECT, 0o600)
+    return os.open(path, flags, 0o600)
+
+
+def _drop_cache(fd: int):
+    # Bez O_DIRECT aspoň zahodíme stránky z page cache, ať čtení jde z disku
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except (AttributeError, OSError):
+        pass
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percent / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def _supports_direct(path: Path) -> bool:
+    """O_DIRECT nemusí být podporován (tmpfs, některé FUSE/síťové filesystémy)"""
+    try:
+        fd = _open(path, os.O_WRONLY | os.O_CREAT, True)
+    except OSError:
+        return False
+    try:
+        buffer = mmap.mmap(-1, RANDOM_BLOCK)
+        os.pwritev(fd, [buffer], 0)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
+
+
+def sequential_write(path: Path, size: int, duration: float, direct: bool) -> Dict:
+    buffer = mmap.mmap(-1, SEQ_BLOCK)  # zarovnaný na stránku - nutné pro O_DIRECT
+    buffer.write(os.urandom(SEQ_BLOCK))  # nekomprimovatelná data
+    fd = _open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, direct)
+    written = 0
+    start = time.perf_counter()
+    try:
+        while written < size and time.perf_counter() - start < duration:
+            written += os.pwritev(fd, [buffer], written)
+        os.fsync(fd)
+    finally:
+        elapsed = time.perf_counter() - start
+        os.close(fd)
+    return {"bytes": written, "mbps": round(written / elapsed / 1e6, 1)}
+
+
+def sequential_read(path: Path, size: int, duration: float, direct: bool) -> Dict:
+    buffer = mmap.mmap(-1, SEQ_BLOCK)
+    fd = _open(path, os.O_RDONLY, direct)
+    if not direct:
+        _drop_cache(fd)
+    read = 0
+    start = time.perf_counter()
+    try:
+        while read < size and time.perf_counter() - start < duration:
+            count = os.preadv(fd, [buffer], read)
+            if count <= 0:
+                break
+            read += count
+    finally:
+        elapsed = time.perf_counter() - start
+        os.close(fd)
+    return {"bytes": read, "mbps": round(read / elapsed / 1e6, 1)}
+
+
+def random_io(path: Path, size: int, duration: float, direct: bool, write: bool) -> Dict:
+    """Náhodné 4k operace na zarovnaných offsetech v rámci testovacího souboru"""
+    buffer = mmap.mmap(-1, RANDOM_BLOCK)
+    if write:
+        buffer.write(os.urandom(RANDOM_BLOCK))
+    blocks = max(1, size // RANDOM_BLOCK)
+    fd = _open(path, os.O_WRONLY if write else os.O_RDONLY, direct)
+    if not direct:
+        _drop_cache(fd)
+    operation = os.pwritev if write else os.preadv
+    operations = 0
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < duration:
+            # Dávka 64 operací mezi kontrolami času
+            for _ in range(64):
+                operation(fd, [buffer], random.randrange(blocks) * RANDOM_BLOCK)
+            operations += 64
+        if write:
+            os.fsync(fd)
+    finally:
+        elapsed = time.perf_counter() - start
+        os.close(fd)
+    return {"operations": operations, "iops": int(operations / elapsed)}
+
+
+def fsync_latency(path: Path, duration: float) -> Dict:
+    """Zápis 4k + fdatasync opakovaně - odpovídá commitu SQLite v režimu WAL"""
+    data = os.urandom(RANDOM_BLOCK)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    latencies = []
+    start = time.perf_counter()
+    try:
+        while len(latencies) < MAX_FSYNC_SAMPLES and time.perf_counter() - start < duration:
+            op_start = time.perf_counter()
+            os.write(fd, data)
+            os.fdatasync(fd)
+            latencies.append((time.perf_counter() - op_start) * 1000)
+    finally:
+        os.close(fd)
+    return {
+        "samples": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p99_ms": round(percentile(latencies, 99), 3)
+    }
+
+
+def run_benchmark(mountpoint: str, size_mb: int = DEFAULT_SIZE_MB, duration: float = DEFAULT_DURATION) -> Dict:
+    """Změří úložiště na mountpointu; testovací soubory se po běhu smažou"""
+    target = Path(mountpoint)
+    usage = storage_inventory.filesystem_usage(str(target))
+
+    # Nikdy nezabereme víc než čtvrtinu volného místa
+    size = min(size_mb * 1024 * 1024, usage["available"] // 4)
+    size -= size % SEQ_BLOCK
+    if size < SEQ_BLOCK:
+        raise RuntimeError(f"Na {mountpoint} není dost volného místa pro test")
+
+    data_file = target / f".ha_storage_bench_{os.getpid()}"
+    sync_file = target / f".ha_storage_bench_{os.getpid()}_fsync"
+    logger.info(f"⏱️  Měřím úložiště {mountpoint} ({size // (1024 * 1024)} MB, max {duration:g} s na fázi)...")
+
+    try:
+        direct = _supports_direct(data_file)
+        if not direct:
+            logger.warning(f"{mountpoint}: O_DIRECT není podporován, měří se přes page cache")
+
+        seq_write = sequential_write(data_file, size, duration, direct)
+        # Další fáze pracují jen se skutečně zapsanou částí souboru
+        size = seq_write["bytes"] - seq_write["bytes"] % RANDOM_BLOCK
+        seq_read = sequential_read(data_file, size, duration, direct)
+        rand_read = random_io(data_file, size, duration, direct, write=False)
+        rand_write = random_io(data_file, size, duration, direct, write=True)
+        fsync = fsync_latency(sync_file, duration)
+    finally:
+        for path in (data_file, sync_file):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    return {
+        "mountpoint": usage["mountpoint"],
+        "device": usage["filesystem"],
+        "timestamp": datetime.datetime.now().isoformat(),
+        "size_bytes": size,
+        "direct_io": direct,
+        "seq_write_mbps": seq_write["mbps"],
+        "seq_read_mbps": seq_read["mbps"],
+        "rand_read_iops": rand_read["iops"],
+        "rand_write_iops": rand_write["iops"],
+        "fsync_p50_ms": fsync["p50_ms"],
+        "fsync_p99_ms": fsync["p99_ms"],
+        "fsync_samples": fsync["samples"]
+    }
+
+
+def load_results(results_file: Path = DEFAULT_RESULTS_FILE) -> Dict[str, Dict]:
+    """Uložené výsledky podle mountpointu"""
+    try:
+        with open(results_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_result(result: Dict, results_file: Path = DEFAULT_RESULTS_FILE) -> Dict[str, Dict]:
+    results = load_results(results_file)
+    results[result["mountpoint"]] = result
+    results_file = Path(results_file)
+    results_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = results_file.with_suffix(".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp, results_file)
+    return results
+
+
+def classify(result: Dict) -> str:
+    """Třída úložiště (klíč get_optimal_layout) podle naměřených hodnot místo jména zařízení"""
+    if (result["rand_read_iops"] >= NVME_MIN_RANDOM_READ_IOPS
+            and result["seq_read_mbps"] >= NVME_MIN_SEQ_READ_MBPS):
+        return 'NVME'
+    if result["rand_read_iops"] < HDD_MAX_RANDOM_READ_IOPS and result["seq_read_mbps"] >= 60:
+        return 'HDD'
+    if (result["seq_write_mbps"] >= SSD_MIN_SEQ_WRITE_MBPS
+            and result["rand_write_iops"] >= SSD_MIN_RANDOM_WRITE_IOPS
+            and result["fsync_p99_ms"] <= SSD_MAX_FSYNC_P99_MS):
+        return 'USB_SSD'
+    return 'SD_CARD'
+
+
+def describe(result: Dict) -> str:
+    """Jednořádkové shrnutí měření pro report"""
+    return (
+        f"čtení {result['seq_read_mbps']} MB/s, zápis {result['seq_write_mbps']} MB/s, "
+        f"4k {result['rand_read_iops']}/{result['rand_write_iops']} IOPS (čtení/zápis), "
+        f"fsync p50 {result['fsync_p50_ms']} ms / p99 {result['fsync_p99_ms']} ms"
+    )
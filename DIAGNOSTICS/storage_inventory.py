@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Storage Inventory
+Inventář úložišť přímo ze sysfs/procfs bez spouštění lsblk/df:
+/sys/class/block (velikost, rotace, parametry fronty, model),
+/proc/self/mountinfo a os.statvfs - přesné hodnoty v bajtech
+"""
+
+import os
+import re
+import sys
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+SYS_CLASS_BLOCK = Path("/sys/class/block")
+MOUNTINFO = Path("/proc/self/mountinfo")
+UDEV_DATA = Path("/run/udev/data")
+DISK_BY_UUID = Path("/dev/disk/by-uuid")
+
+SECTOR_SIZE = 512  # /sys/.../size je vždy v 512B sektorech
+
+# Hlavní čísla zařízení, která lsblk ve výchozím stavu nevypisuje (ramdisky)
+IGNORED_MAJORS = {1}
+
+# Parametry fronty, které nás zajímají pro odhad výkonu
+QUEUE_ATTRIBUTES = (
+    "rotational", "logical_block_size", "physical_block_size", "discard_max_bytes",
+    "nr_requests", "read_ahead_kb", "scheduler"
+)
+
+_MOUNTINFO_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _read_int(path: Path) -> Optional[int]:
+    value = _read(path)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _unescape(value: str) -> str:
+    # mountinfo kóduje mezery apod. oktalově (\040)
+    return _MOUNTINFO_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), value)
+
+
+def format_size(size: int) -> str:
+    """Velikost ve stylu lsblk (základ 1024, jedno desetinné místo), např. '476.9G'"""
+    value = float(size)
+    for unit in ("B", "K", "M", "G", "T", "P"):
+        if value < 1024 or unit == "P":
+            if unit == "B":
+                return f"{int(value)}B"
+            return f"{value:.1f}".rstrip("0").rstrip(".") + unit
+        value /= 1024
+    return f"{size}B"
+
+
+def read_mounts() -> Dict[str, List[Dict]]:
+    """Připojení z /proc/self/mountinfo podle major:minor zařízení"""
+    mounts: Dict[str, List[Dict]] = {}
+    try:
+        with open(MOUNTINFO, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                try:
+                    separator = fields.index("-", 6)
+                except ValueError:
+                    continue
+                mounts.setdefault(fields[2], []).append({
+                    "mountpoint": _unescape(fields[4]),
+                    "root": _unescape(fields[3]),
+                    "options": fields[5],
+                    "fstype": fields[separator + 1],
+                    "source": _unescape(fields[separator + 2]) if len(fields) > separator + 2 else None
+                })
+    except OSError:
+        pass
+    return mounts
+
+
+def udev_properties(dev: str) -> Dict[str, str]:
+    """Vlastnosti z udev databáze (ID_FS_TYPE, ID_FS_LABEL, ID_SERIAL...) bez blkid"""
+    properties = {}
+    try:
+        with open(UDEV_DATA / f"b{dev}", 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                if line.startswith("E:"):
+                    key, _, value = line[2:].rstrip("\n").partition("=")
+                    properties[key] = value
+    except OSError:
+        pass
+    return properties
+
+
+def filesystem_uuid(name: str, udev: Dict[str, str]) -> Optional[str]:
+    """UUID filesystemu z udev, případně z odkazů /dev/disk/by-uuid"""
+    if udev.get("ID_FS_UUID"):
+        return udev["ID_FS_UUID"]
+    try:
+        for link in DISK_BY_UUID.iterdir():
+            if os.path.basename(os.readlink(link)) == name:
+                return link.name
+    except OSError:
+        pass
+    return None
+
+
+def queue_parameters(disk_path: Path) -> Dict:
+    queue = {}
+    for attribute in QUEUE_ATTRIBUTES:
+        value = _read(disk_path / "queue" / attribute)
+        if value is None:
+            continue
+        if attribute == "scheduler":
+            # "mq-deadline [none] kyber" -> aktivní plánovač v hranatých závorkách
+            match = re.search(r'\[(\S+)\]', value)
+            queue[attribute] = match.group(1) if match else value
+        else:
+            queue[attribute] = int(value) if value.isdigit() else value
+    return queue
+
+
+def device_type(name: str, path: Path) -> str:
+    """Typ zařízení v terminologii lsblk"""
+    if (path / "partition").exists():
+        return "part"
+    if name.startswith("loop"):
+        return "loop"
+    if name.startswith("sr"):
+        return "rom"
+    if name.startswith("md"):
+        return "raid"
+    if name.startswith("dm-"):
+        uuid = _read(path / "dm" / "uuid") or ""
+        return "crypt" if uuid.startswith("CRYPT-") else "lvm"
+    return "disk"
+
+
+def read_block_device(name: str, mounts: Dict[str, List[Dict]]) -> Optional[Dict]:
+    path = SYS_CLASS_BLOCK / name
+    dev = _read(path / "dev")
+    sectors = _read_int(path / "size")
+    if not dev or not sectors or int(dev.split(":")[0]) in IGNORED_MAJORS:
+        return None
+
+    dev_type = device_type(name, path)
+    disk_path = path.resolve().parent if dev_type == "part" else path
+    device_mounts = mounts.get(dev, [])
+    udev = udev_properties(dev)
+
+    model = _read(disk_path / "device" / "model") or _read(disk_path / "device" / "name")
+    if dev_type == "part":
+        model = None  # lsblk uvádí model jen u disku
+
+    queue = queue_parameters(disk_path)
+    return {
+        "name": name,
+        "dev": dev,
+        "size": format_size(sectors * SECTOR_SIZE),
+        "size_bytes": sectors * SECTOR_SIZE,
+        "type": dev_type,
+        "mountpoint": device_mounts[0]["mountpoint"] if device_mounts else None,
+        "mountpoints": [mount["mountpoint"] for mount in device_mounts],
+        "fstype": (device_mounts[0]["fstype"] if device_mounts else None) or udev.get("ID_FS_TYPE"),
+        "label": udev.get("ID_FS_LABEL"),
+        "uuid": filesystem_uuid(name, udev),
+        "model": model,
+        "serial": udev.get("ID_SERIAL_SHORT") or _read(disk_path / "device" / "serial"),
+        "removable": _read(disk_path / "removable") == "1",
+        "read_only": _read(path / "ro") == "1",
+        "rotational": queue.get("rotational") == 1 if "rotational" in queue else None,
+        "queue": queue,
+        "children": []
+    }
+
+
+def block_devices() -> List[Dict]:
+    """Strom blokových zařízení ve tvaru lsblk -J (disky s oddíly a holdery jako děti)"""
+    mounts = read_mounts()
+    try:
+        names = sorted(entry.name for entry in SYS_CLASS_BLOCK.iterdir())
+    except OSError:
+        return []
+
+    devices = {}
+    for name in names:
+        device = read_block_device(name, mounts)
+        if device:
+            devices[name] = device
+
+    # Rodiče: oddíl -> disk, dm/md -> podřízená zařízení (slaves)
+    parents: Dict[str, List[str]] = {}
+    for name, device in devices.items():
+        path = SYS_CLASS_BLOCK / name
+        if device["type"] == "part":
+            parents[name] = [path.resolve().parent.name]
+        else:
+            try:
+                parents[name] = sorted(entry.name for entry in (path / "slaves").iterdir())
+            except OSError:
+                parents[name] = []
+
+    roots = []
+    for name, device in devices.items():
+        linked = [parent for parent in parents[name] if parent in devices]
+        for parent in linked:
+            devices[parent]["children"].append(device)
+        if not linked:
+            roots.append(device)
+
+    for device in devices.values():
+        if not device["children"]:
+            del device["children"]
+    return roots
+
+
+def filesystem_usage(mountpoint: str) -> Dict:
+    """Využití filesystemu přes os.statvfs (přesně v bajtech, bez df)"""
+    stats = os.statvfs(mountpoint)
+    size = stats.f_blocks * stats.f_frsize
+    free = stats.f_bfree * stats.f_frsize
+    available = stats.f_bavail * stats.f_frsize
+    used = size - free
+
+    # Filesystem, na kterém cesta leží = nejdelší odpovídající přípojný bod (jako df)
+    path = os.path.realpath(mountpoint)
+    source, fstype, mount_path = None, None, "/"
+    for device_mounts in read_mounts().values():
+        for mount in device_mounts:
+            candidate = mount["mountpoint"]
+            if (path == candidate or path.startswith(candidate.rstrip("/") + "/")) \
+                    and len(candidate) >= len(mount_path):
+                source, fstype, mount_path = mount["source"], mount["fstype"], candidate
+
+    # Procento jako df: used / (used + available), zaokrouhleno nahoru
+    usable = used + available
+    use_percent = -(-used * 100 // usable) if usable else 0
+    return {
+        "filesystem": source,
+        "size": size,
+        "used": used,
+        "available": available,
+        "use_percent": f"{use_percent}%",
+        "mountpoint": mount_path,
+        "fstype": fstype,
+        "inodes": stats.f_files,
+        "inodes_free": stats.f_ffree
+    }
+
+
+def main():
+    start = time.perf_counter()
+    devices = block_devices()
+    elapsed = (time.perf_counter() - start) * 1000
+    json.dump({"blockdevices": devices, "elapsed_ms": round(elapsed, 2)}, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,38 +4,68 @@ Skript pro optimalizaci úložišť podle doporučení
 """
 
 import os
+import sqlite3
+import logging
+import argparse
 import subprocess
 from pathlib import Path
 
+import storage_inventory
+from migration_engine import MigrationEngine
+from backup_engine import DEFAULT_EXCLUDE, RETENTION, run_tiered_backup, tier_directories
+from recorder_snapshot import exclusive_lock, snapshot_database
+from io_throttle import DEFAULT_MAX_FSYNC_MS, FsyncProbe, Throttle, set_idle_priority
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Definice optimální struktury
+STORAGE_LAYOUT = {
+    '/mnt/nvme': [
+        'hass_data',           # Recorder databáze
+        'hass_media',          # Media soubory
+        'hass_recordings',     # Nahrávky kamer
+        'hass_tts',           # TTS cache
+        'mariadb/data',       # MySQL data
+        'mosquitto/data',     # MQTT data
+        'backups/daily'       # Denní zálohy
+    ],
+    '/mnt/sdcard': [
+        'backups/weekly',     # Týdenní zálohy
+        'backups/monthly',    # Měsíční zálohy
+        'logs/archive',       # Archivované logy
+        'temp'                # Dočasné soubory
+    ],
+    '/mnt/hdd': [
+        'backups/yearly',     # Roční zálohy
+        'media_archive',      # Archiv médií
+        'recordings_archive'  # Archiv nahrávek
+    ]
+}
+
+RECORDER_DB = 'home-assistant_v2.db'
+RECORDER_SNAPSHOT_DIR = 'recorder_snapshot'   # v adresáři denních záloh
+
+# Co se přesouvá z konfigurace do struktury (zdroj relativně ke /config, cíl)
+MIGRATIONS = [
+    (RECORDER_DB, '/mnt/nvme/hass_data'),
+    ('media', '/mnt/nvme/hass_media'),
+    ('tts', '/mnt/nvme/hass_tts'),
+]
+
+# Jaká zařízení patří na který přípojný bod, pokud ještě nejsou připojena
+MOUNT_DEVICE_PREFIXES = {
+    '/mnt/nvme': ('nvme',),
+    '/mnt/sdcard': ('mmcblk',),
+    '/mnt/hdd': ('sd',),
+}
+
 def optimize_storage_layout():
     """Vytvoří optimální adresářovou strukturu"""
-    
+
     print("🔄 Vytvářím optimální adresářovou strukturu...")
-    
-    # Definice optimální struktury
-    structure = {
-        '/mnt/nvme': [
-            'hass_data',           # Recorder databáze
-            'hass_media',          # Media soubory
-            'hass_recordings',     # Nahrávky kamer
-            'hass_tts',           # TTS cache
-            'mariadb/data',       # MySQL data
-            'mosquitto/data',     # MQTT data
-            'backups/daily'       # Denní zálohy
-        ],
-        '/mnt/sdcard': [
-            'backups/weekly',     # Týdenní zálohy
-            'backups/monthly',    # Měsíční zálohy
-            'logs/archive',       # Archivované logy
-            'temp'                # Dočasné soubory
-        ],
-        '/mnt/hdd': [
-            'backups/yearly',     # Roční zálohy
-            'media_archive',      # Archiv médií
-            'recordings_archive'  # Archiv nahrávek
-        ]
-    }
-    
+
+    structure = STORAGE_LAYOUT
+
     # Vytvoření adresářů
     for base_path, directories in structure.items():
         if os.path.exists(base_path):
@@ -43,28 +73,104 @@ def optimize_storage_layout():
                 full_path = os.path.join(base_path, directory)
                 os.makedirs(full_path, exist_ok=True)
                 print(f"✅ Vytvořeno: {full_path}")
-                
+
                 # Nastavení správných oprávnění
                 uid = os.getuid()
                 gid = os.getgid()
                 os.chown(full_path, uid, gid)
         else:
             print(f"⚠️  Základní cesta neexistuje: {base_path}")
-    
+
     print("🎯 Optimální struktura vytvořena!")
+    return structure
+
+def iter_partitions(devices):
+    """Všechna zařízení stromu včetně oddílů"""
+    for device in devices:
+        yield device
+        yield from iter_partitions(device.get('children', []))
+
+def detect_mount_devices(layout):
+    """Najde skutečná zařízení pro přípojné body layoutu (připojená, nebo podle typu)"""
+    partitions = []
+    system_partitions = set()
+    for disk in storage_inventory.block_devices():
+        disk_partitions = list(iter_partitions([disk]))
+        # Disk se systémem (/) se pro data nenavrhuje - ani jeho volné oddíly
+        if any('/' in device.get('mountpoints', []) for device in disk_partitions):
+            system_partitions.update(device['name'] for device in disk_partitions)
+        partitions.extend(
+            device for device in disk_partitions
+            if device.get('fstype') and device.get('uuid') and device['fstype'] != 'swap'
+        )
+
+    detected = {}
+    used = set()
+
+    # Co už je na přípojném bodu připojené, tam zůstane
+    for base_path in layout:
+        for device in partitions:
+            if base_path in device.get('mountpoints', []):
+                detected[base_path] = device
+                used.add(device['name'])
+
+    # Zbytek podle typu zařízení - největší nepoužitý datový oddíl
+    for base_path in layout:
+        if base_path in detected:
+            continue
+        # Oddíl připojený jinam (/home, /var/lib/docker, /media/usb...) patří někomu jinému
+        candidates = [
+            device for device in partitions
+            if device['name'].startswith(MOUNT_DEVICE_PREFIXES.get(base_path, ()))
+            and device['name'] not in used
+            and device['name'] not in system_partitions
+            and not any(mountpoint and mountpoint != base_path for mountpoint in device.get('mountpoints', []))
+        ]
+        if candidates:
+            device = max(candidates, key=lambda candidate: candidate['size_bytes'])
+            detected[base_path] = device
+            used.add(device['name'])
+
+    return detected
+
+def setup_auto_mount(layout=STORAGE_LAYOUT, dry_run=False):
+    """Nastaví automatické připojování disků podle detekovaných zařízení"""
+
+    try:
+        with open('/etc/fstab', 'r') as f:
+            fstab = f.read()
+    except OSError:
+        fstab = ''
+
+    configured = set()
+    for line in fstab.splitlines():
+        fields = line.split()
+        if len(fields) >= 2 and not fields[0].startswith('#'):
+            configured.update((fields[0], fields[1]))
+
+    fstab_entries = []
+    for base_path, device in detect_mount_devices(layout).items():
+        source = f"UUID={device['uuid']}"
+        if source in configured or base_path in configured:
+            print(f"ℹ️  {base_path} už je v /etc/fstab")
+            continue
+        options = 'defaults,noatime,nofail' if device['fstype'] in ('ext4', 'xfs', 'btrfs', 'f2fs') else 'defaults,nofail'
+        fstab_entries.append(f"# {device['name']} ({device.get('label') or device['fstype']})")
+        fstab_entries.append(f"{source} {base_path} {device['fstype']} {options} 0 2")
+
+    if not fstab_entries:
+        print("ℹ️  Žádné nové záznamy pro /etc/fstab")
+        return []
+
+    fstab_entries.insert(0, "# Home Assistant optimal storage layout")
+
+    if dry_run:
+        print("📝 Navržené záznamy pro /etc/fstab:")
+        print('\n'.join(fstab_entries))
+        return fstab_entries
 
-def setup_auto_mount():
-    """Nastaví automatické připojování disků"""
-    
-    fstab_entries = [
-        "# Home Assistant optimal storage layout",
-        "/dev/disk/by-id/nvme-SAMSUNG_MZVL2512HCJQ-00BL7_CXCS1R2NC0XXXX /mnt/nvme ext4 defaults,nofail 0 2",
-        "/dev/disk/by-id/mmc-SD32G_0x97cdeae4 /mnt/sdcard ext4 defaults,nofail 0 2",
-        "/dev/disk/by-id/usb-Samsung_SSD_860_EVO_500GB_S4AZNF0N123456X /mnt/hdd ext4 defaults,nofail 0 2"
-    ]
-    
     print("📝 Přidávám záznamy do /etc/fstab...")
-    
+
     try:
         with open('/etc/fstab', 'a') as f:
             f.write('\n'.join(fstab_entries) + '\n')
@@ -72,26 +178,188 @@ def setup_auto_mount():
     except PermissionError:
         print("❌ Nelze upravit /etc/fstab - spusťte skript jako root")
 
+    return fstab_entries
+
+def plan_migrations(layout=STORAGE_LAYOUT, config_path='/config'):
+    """Dvojice (zdroj, cíl) pro existující data a připravený cíl"""
+    plan = []
+    for source, target in MIGRATIONS:
+        source_path = Path(config_path) / source
+        base_path = next((base for base in layout if target.startswith(base + '/')), None)
+        if source_path.exists() and base_path and os.path.ismount(base_path):
+            plan.append((source_path, Path(target)))
+    return plan
+
+def recorder_directory(config_path='/config'):
+    """Adresář, kde právě leží databáze recorderu (po migraci už na NVMe)"""
+    for source, target in MIGRATIONS:
+        if source == RECORDER_DB and (Path(target) / source).exists():
+            return Path(target)
+    return Path(config_path)
+
+def create_throttle(bwlimit_mb=None, idle=False, adaptive=False, max_fsync_ms=DEFAULT_MAX_FSYNC_MS,
+                    recorder_dir=None):
+    """Omezení kopie za běhu HA; None, pokud se nemá nic omezovat"""
+    if idle:
+        if set_idle_priority():
+            print("🐢 Kopie běží v idle I/O třídě")
+        else:
+            print("⚠️  Nelze nastavit idle I/O třídu (ioprio_set ani ionice)")
+
+    probe = None
+    if adaptive:
+        try:
+            probe = FsyncProbe(recorder_dir)
+            print(f"🐢 Adaptivní omezení: fsync v {recorder_dir} nad {max_fsync_ms:g} ms zpomalí kopii")
+        except OSError as e:
+            print(f"⚠️  Nelze měřit fsync v {recorder_dir}: {e}")
+
+    if not bwlimit_mb and not probe:
+        return None
+    return Throttle(bwlimit_mb * 1e6 if bwlimit_mb else None, probe, max_fsync_ms)
+
+def migrate_data(layout=STORAGE_LAYOUT, config_path='/config', jobs=4, verify=True,
+                 remove_source=False, dry_run=False, throttle=None):
+    """Přesune data podle layoutu migračním enginem (s žurnálem, lze přerušit a spustit znovu)"""
+    plan = plan_migrations(layout, config_path)
+    if not plan:
+        print("ℹ️  Nic k migraci (chybí zdroj nebo připojený cíl)")
+        return []
+
+    results = []
+    for source, target in plan:
+        if dry_run:
+            print(f"🔄 {source} -> {target}")
+            continue
+
+        if source.name == RECORDER_DB:
+            results.append((source, target, migrate_recorder(source, target, remove_source)))
+            continue
+
+        engine = MigrationEngine(source, target, jobs=jobs, verify=verify, throttle=throttle)
+        stats = engine.run()
+        if remove_source and verify and not stats['failed']:
+            engine.remove_source()
+        results.append((source, target, stats))
+
+    if throttle and throttle.backoffs:
+        print(f"🐢 Kopie kvůli latenci recorderu zpomalena {throttle.backoffs}x")
+    return results
+
+def migrate_recorder(source, target, remove_source=False):
+    """Databáze recorderu konzistentním snímkem i za běhu HA; další spuštění dopíše jen změněné stránky
+
+    Zdroj se smaže jen po poslední kopii pořízené pod výhradním zámkem
+    (BEGIN EXCLUSIVE bez čekání, soubor nemá otevřený žádný jiný proces).
+    """
+    target_db = Path(target) / source.name
+    if not remove_source:
+        return snapshot_database(source, target_db)
+
+    try:
+        with exclusive_lock(source) as locked:
+            stats = snapshot_database(source, target_db, locked=locked)
+            # Pořád pod zámkem - mezi kopií a smazáním nemůže nic zapsat
+            for path in (source, Path(f"{source}-wal"), Path(f"{source}-shm")):
+                if path.exists():
+                    path.unlink()
+    except RuntimeError as e:
+        print(f"⚠️  Zdroj {source} se nesmaže: {e}")
+        stats = snapshot_database(source, target_db)
+        print(f"📸 {source} zkopírována za běhu HA - zastavte Home Assistant a spusťte znovu, dopíšou se jen změny")
+        return stats
+
+    print(f"🗑️  Zdroj {source} smazán (kopie pořízena pod výhradním zámkem)")
+    return stats
+
+def backup_config(layout=STORAGE_LAYOUT, config_path='/config', jobs=4):
+    """Deduplikovaná záloha konfigurace; databáze recorderu jako snímek za běhu místo živého souboru
+
+    Bez snímku (chybí adresář úrovně, snímek selhal) se databáze ze zálohy
+    vynechá - kopie živého souboru i s -wal by mohla být roztržená.
+    """
+    tiers = tier_directories(layout)
+    substitutes = {}
+    exclude = DEFAULT_EXCLUDE
+    database = recorder_directory(config_path) / RECORDER_DB
+    primary = next((tiers[tier] for tier in RETENTION if tier in tiers), None)
+    if database.exists():
+        snapshot = None
+        if primary:
+            snapshot = primary / RECORDER_SNAPSHOT_DIR / RECORDER_DB
+            try:
+                snapshot_database(database, snapshot)
+            except (RuntimeError, OSError, sqlite3.Error) as e:
+                print(f"⚠️  Snímek databáze recorderu selhal: {e}")
+                snapshot = None
+        if snapshot is None:
+            print(f"⚠️  Databáze recorderu {database} se bez snímku nezálohuje (vynechána i -wal/-shm)")
+            exclude = DEFAULT_EXCLUDE + tuple(f"{RECORDER_DB}{suffix}" for suffix in ("", "-wal", "-shm", "-journal"))
+        elif database.parent == Path(config_path):
+            substitutes[RECORDER_DB] = snapshot
+        else:
+            substitutes[f"{database.parent.name}/{RECORDER_DB}"] = snapshot
+    return run_tiered_backup(config_path, tiers, jobs=jobs, exclude=exclude, substitutes=substitutes)
+
 def generate_migration_commands():
     """Vygeneruje příkazy pro migraci dat"""
-    
+
     commands = [
-        "# Migrace recorder databáze na NVMe",
+        "# Migrace recorder databáze a media souborů na NVMe (s ověřením, lze přerušit a spustit znovu)",
+        "# 1. Za běhu HA: snímek databáze a kopie médií - omezeně, s ohledem na latenci recorderu",
+        "sudo python3 DIAGNOSTICS/storage_optimizer.py --migrate --config /config --idle --adaptive --bwlimit 20",
+        "# 2. Krátká odstávka: dopíšou se jen stránky databáze změněné od snímku",
         "sudo systemctl stop home-assistant",
-        "cp /config/home-assistant_v2.db /mnt/nvme/hass_data/",
+        "sudo python3 DIAGNOSTICS/storage_optimizer.py --migrate --config /config",
         "sudo chown homeassistant:homeassistant /mnt/nvme/hass_data/home-assistant_v2.db",
-        
-        "# Migrace media souborů",
-        "cp -r /config/media/* /mnt/nvme/hass_media/",
-        
-        "# Nastavení zálohování",
-        "echo '0 2 * * * tar -czf /mnt/sdcard/backups/daily/ha_backup_$(date +%Y%m%d).tar.gz /config' | crontab -"
+
+        "# Nastavení zálohování (deduplikované - každou noc se zapíšou jen změněné bloky)",
+        f"echo '0 2 * * * ionice -c 3 nice -n 19 python3 {Path(__file__).resolve()} --backup --config /config' | crontab -"
     ]
-    
+
     print("🔄 PŘÍKAZY PRO MIGRACI DAT:")
     print("\n".join(commands))
 
+def main():
+    parser = argparse.ArgumentParser(description="Optimalizace úložišť Home Assistant")
+    parser.add_argument("--config", default="/config", help="Cesta ke konfiguraci Home Assistant")
+    parser.add_argument("--migrate", action="store_true", help="Přesune data podle layoutu (migrační engine)")
+    parser.add_argument("--backup", action="store_true",
+                        help="Deduplikovaná záloha konfigurace do úrovní backups/ (denní/týdenní/měsíční)")
+    parser.add_argument("--remove-source", action="store_true", help="Po ověřené migraci smaže zdroj")
+    parser.add_argument("--no-verify", action="store_true", help="Bez ověření kontrolních součtů")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Počet vláken pro ověření / kompresi (výchozí: 4)")
+    parser.add_argument("--dry-run", action="store_true", help="Jen vypíše, co by se udělalo")
+    parser.add_argument("--bwlimit", type=float, default=None, help="Strop rychlosti kopie v MB/s")
+    parser.add_argument("--idle", action="store_true", help="Kopie v idle I/O třídě (ionice -c 3)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Zpomalit kopii, když roste latence fsync na zařízení recorderu")
+    parser.add_argument("--max-fsync-ms", type=float, default=DEFAULT_MAX_FSYNC_MS,
+                        help=f"Práh latence fsync recorderu pro --adaptive (výchozí: {DEFAULT_MAX_FSYNC_MS:g} ms)")
+    parser.add_argument("--recorder-dir", type=Path, default=None,
+                        help="Adresář databáze recorderu pro měření fsync (výchozí: podle umístění databáze)")
+    args = parser.parse_args()
+
+    if args.backup:
+        backup_config(STORAGE_LAYOUT, args.config, jobs=args.jobs)
+        return
+
+    layout = STORAGE_LAYOUT if args.dry_run else optimize_storage_layout()
+    setup_auto_mount(layout, dry_run=args.dry_run)
+
+    if args.migrate:
+        throttle = None
+        if not args.dry_run:
+            throttle = create_throttle(args.bwlimit, args.idle, args.adaptive, args.max_fsync_ms,
+                                       args.recorder_dir or recorder_directory(args.config))
+        try:
+            migrate_data(layout, args.config, jobs=args.jobs, verify=not args.no_verify,
+                         remove_source=args.remove_source, dry_run=args.dry_run, throttle=throttle)
+        finally:
+            if throttle:
+                throttle.close()
+    else:
+        generate_migration_commands()
+
 if __name__ == "__main__":
-    optimize_storage_layout()
-    setup_auto_mount()
-    generate_migration_commands()
\ No newline at end of file
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Write Attribution
+Kdo zapisuje na disk: vzorkuje write_bytes z /proc/<pid>/io, procesy
+přiřadí Docker kontejnerům podle cgroup (homeassistant, mosquitto,
+zigbee2mqtt, nodered...) a zápisy rozpočítá na zařízení jejich svazků
+"""
+
+import os
+import re
+import json
+import time
+import signal
+import logging
+import argparse
+import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PROC = Path("/proc")
+DOCKER_CONTAINERS = Path("/var/lib/docker/containers")
+DOCKER_ROOT = Path("/var/lib/docker")
+SYS_DEV_BLOCK = Path("/sys/dev/block")
+
+DEFAULT_STATE_FILE = Path.home() / ".cache" / "ha_write_attribution.json"
+DEFAULT_INTERVAL = 60          # s
+DEFAULT_FLUSH_INTERVAL = 600   # stav na disk jen jednou za 10 minut (vlastní zápisy)
+
+# docker-<id>.scope (systemd), /docker/<id> (cgroupfs), libpod-<id> (podman)
+_CONTAINER_RE = re.compile(r'(?:docker-|docker/|libpod-)([0-9a-f]{64})')
+
+# Přípojné body kontejneru, které nejsou datovými svazky
+_IGNORED_MOUNT_PREFIXES = ("/run", "/var/run", "/etc/localtime", "/dev", "/proc", "/sys")
+
+
+def _read_write_bytes(pid: str) -> Optional[int]:
+    try:
+        with open(PROC / pid / "io", 'rb') as f:
+            for line in f:
+                if line.startswith(b"write_bytes:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def container_id(pid: str) -> Optional[str]:
+    try:
+        cgroup = (PROC / pid / "cgroup").read_text()
+    except OSError:
+        return None
+    match = _CONTAINER_RE.search(cgroup)
+    return match.group(1) if match else None
+
+
+def device_of(path: str) -> Optional[str]:
+    """Jméno blokového zařízení, na kterém cesta leží (st_dev -> /sys/dev/block)"""
+    try:
+        st_dev = os.stat(path).st_dev
+    except OSError:
+        return None
+    try:
+        return (SYS_DEV_BLOCK / f"{os.major(st_dev)}:{os.minor(st_dev)}").resolve().name
+    except OSError:
+        return None
+
+
+class WriteAttribution:
+    """Kumulované zápisy po skupinách (kontejner nebo hostitelský proces)"""
+
+    def __init__(self, state_file: Path = DEFAULT_STATE_FILE):
+        self.state_file = Path(state_file)
+        self.previous: Dict[str, int] = {}        # pid -> write_bytes
+        self.groups: Dict[str, str] = {}          # pid -> skupina (cache, cgroup se čte jen jednou)
+        self.containers: Dict[str, Dict] = {}     # id -> {"name", "devices"}
+        self.writers: Dict[str, Dict] = {}
+        self.started = time.time()
+        self.host_device = device_of("/")
+
+    def container_info(self, cid: str) -> Dict:
+        """Jméno kontejneru a zařízení jeho zapisovatelných svazků (z config.v2.json)"""
+        info = self.containers.get(cid)
+        if info is not None:
+            return info
+
+        name, sources = cid[:12], []
+        try:
+            with open(DOCKER_CONTAINERS / cid / "config.v2.json", 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            name = config.get("Name", "").lstrip("/") or name
+            for mount in (config.get("MountPoints") or {}).values():
+                destination = mount.get("Destination", "")
+                if mount.get("RW") and mount.get("Source") and not destination.startswith(_IGNORED_MOUNT_PREFIXES):
+                    sources.append(mount["Source"])
+        except (OSError, ValueError):
+            pass
+
+        # Bez datových svazků zapisuje kontejner do své vrstvy v /var/lib/docker
+        devices = sorted({device for device in map(device_of, sources) if device}) or \
+            [device for device in [device_of(str(DOCKER_ROOT))] if device]
+        info = self.containers[cid] = {"name": name, "devices": devices}
+        return info
+
+    def group_of(self, pid: str) -> Tuple[str, str, List[str]]:
+        """(klíč, druh, zařízení) pro proces"""
+        cid = container_id(pid)
+        if cid:
+            info = self.container_info(cid)
+            return info["name"], "container", info["devices"]
+        try:
+            comm = (PROC / pid / "comm").read_text().strip()
+        except OSError:
+            comm = "?"
+        return f"host:{comm}", "host", [self.host_device] if self.host_device else []
+
+    def sample(self, initial: bool = False):
+        """Jedno kolo: delty write_bytes všech procesů připsané jejich skupinám"""
+        current = {}
+        for entry in os.scandir(PROC):
+            pid = entry.name
+            if not pid.isdigit():
+                continue
+            write_bytes = _read_write_bytes(pid)
+            if write_bytes is None:
+                continue
+            current[pid] = write_bytes
+            if initial:
+                continue
+
+            # Proces, který vznikl po startu sběru, započítáme celý
+            delta = write_bytes - self.previous.get(pid, 0)
+            if delta <= 0:
+                continue
+
+            if pid not in self.groups:
+                key, kind, devices = self.group_of(pid)
+                self.groups[pid] = key
+                if key not in self.writers:
+                    self.writers[key] = {"name": key, "kind": kind, "devices": devices, "write_bytes": 0}
+            self.writers[self.groups[pid]]["write_bytes"] += delta
+
+        # Ukončené procesy zapomeneme (pid se může znovu použít)
+        for pid in set(self.groups) - set(current):
+            del self.groups[pid]
+        self.previous = current
+
+    def to_dict(self) -> Dict:
+        return {
+            "started": self.started,
+            "updated": time.time(),
+            "writers": self.writers
+        }
+
+    def save(self):
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, self.state_file)
+
+    def run(self, interval: float = DEFAULT_INTERVAL, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+            samples: int = None):
+        running = True
+
+        def stop(signum, frame):
+            nonlocal running
+            running = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.sample(initial=True)
+        next_tick = time.monotonic() + interval
+        last_flush = time.monotonic()
+        taken = 0
+        try:
+            while running and (samples is None or taken < samples):
+                time.sleep(max(0.0, next_tick - time.monotonic()))
+                next_tick += interval
+                if not running:
+                    break
+                self.sample()
+                taken += 1
+                if time.monotonic() - last_flush >= flush_interval:
+                    self.save()
+                    last_flush = time.monotonic()
+        finally:
+            self.save()
+
+
+def load_state(state_file: Path = DEFAULT_STATE_FILE) -> Optional[Dict]:
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def top_writers_per_device(state: Dict, limit: int = 5) -> Dict[str, List[Dict]]:
+    """Zařízení -> největší zapisovatelé; zápisy skupiny s více zařízeními se dělí rovným dílem"""
+    per_device: Dict[str, List[Dict]] = {}
+    for writer in state.get("writers", {}).values():
+        devices = writer.get("devices") or ["?"]
+        for device in devices:
+            per_device.setdefault(device, []).append({
+                "name": writer["name"],
+                "kind": writer["kind"],
+                "write_bytes": writer["write_bytes"] // len(devices),
+                "estimated": len(devices) > 1
+            })
+
+    elapsed = max(1.0, state.get("updated", 0) - state.get("started", 0))
+    for device, writers in per_device.items():
+        writers.sort(key=lambda writer: writer["write_bytes"], reverse=True)
+        del writers[limit:]
+        for writer in writers:
+            writer["write_bps"] = round(writer["write_bytes"] / elapsed, 1)
+    return per_device
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home Assistant Write Attribution")
+    parser.add_argument("--state", type=Path, default=DEFAULT_STATE_FILE,
+                        help=f"Soubor se stavem sběru (výchozí: {DEFAULT_STATE_FILE})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Spustí sběr")
+    run.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                     help=f"Interval vzorkování v sekundách (výchozí: {DEFAULT_INTERVAL})")
+    run.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                     help=f"Jak často ukládat stav na disk v sekundách (výchozí: {DEFAULT_FLUSH_INTERVAL})")
+    run.add_argument("--samples", type=int, default=None, help="Ukončit po N vzorcích")
+
+    report = subparsers.add_parser("report", help="Největší zapisovatelé podle zařízení")
+    report.add_argument("--top", type=int, default=5, help="Počet zapisovatelů na zařízení (výchozí: 5)")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        logger.info(f"✍️  Sběr zápisů procesů každých {args.interval:g} s do {args.state}")
+        WriteAttribution(args.state).run(args.interval, args.flush_interval, args.samples)
+        return
+
+    state = load_state(args.state)
+    if not state:
+        print(f"❌ Stav {args.state} neexistuje - spusťte nejdřív 'run'")
+        return
+
+    duration = datetime.timedelta(seconds=int(state["updated"] - state["started"]))
+    print(f"✍️  NEJVĚTŠÍ ZAPISOVATELÉ PODLE ZAŘÍZENÍ (za {duration})")
+    print("-" * 40)
+    for device, writers in sorted(top_writers_per_device(state, args.top).items()):
+        print(f"{device}:")
+        for writer in writers:
+            estimate = " (odhad)" if writer["estimated"] else ""
+            print(f"   {writer['name']}: {writer['write_bytes'] / 1e6:.1f} MB, "
+                  f"{writer['write_bps'] / 1e3:.1f} kB/s{estimate}")
+
+
+if __name__ == "__main__":
+    main()
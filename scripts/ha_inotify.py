@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Config Watcher
+Sledování změn v /config přes inotify (čistý ctypes binding, bez závislostí),
+s fallbackem na periodický stat tam, kde inotify není k dispozici
+"""
+
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Dict, Set
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_watched_file(name: str) -> bool:
+    """Zajímají nás jen YAML soubory (bez skrytých a dočasných souborů editorů)"""
+    return name.endswith(('.yaml', '.yml')) and not name.startswith('.')
+
+
+class InotifyWatcher:
+    """Rekurzivní inotify watcher nad adresářem (skryté adresáře jako .storage se přeskakují)"""
+
+    def __init__(self, root: str):
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "inotify není podporováno")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 selhalo")
+
+        self.root = os.path.abspath(root)
+        self.watches: Dict[int, str] = {}
+        self.add_tree(self.root)
+
+    def add_watch(self, path: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise OSError(err, f"inotify_add_watch selhalo pro {path}")
+        self.watches[wd] = path
+
+    def add_tree(self, directory: str):
+        """Přidá watch na adresář a všechny jeho (neskryté) podadresáře"""
+        for root, dirs, _files in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            self.add_watch(root)
+
+    def wait_changes(self, timeout: float = None, debounce: float = 0.05) -> Set[str]:
+        """Počká na změny a vrátí cesty změněných YAML souborů
+
+        Po první události se ještě krátce (debounce) sbírají další, aby se
+        jedno uložení z editoru (zápis + přejmenování) zpracovalo najednou.
+        """
+        changed = set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            if changed:
+                wait = debounce
+            elif deadline is None:
+                wait = None
+            else:
+                wait = max(0.0, deadline - time.monotonic())
+
+            ready, _, _ = select.select([self.fd], [], [], wait)
+            if not ready:
+                return changed
+            changed |= self.read_events()
+
+    def read_events(self) -> Set[str]:
+        changed = set()
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Fronta přetekla - ohlásíme celý strom jako změněný
+                changed.add(self.root)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    self.add_tree(path)
+                # Přesun/smazání adresáře může ovlivnit !include_dir_*
+                changed.add(path)
+            elif is_watched_file(name):
+                changed.add(path)
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback bez inotify - porovnává mtime YAML souborů v intervalu"""
+
+    def __init__(self, root: str, interval: float = 1.0):
+        self.root = os.path.abspath(root)
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self) -> Dict[str, int]:
+        snapshot = {}
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for name in files:
+                if is_watched_file(name):
+                    path = os.path.join(root, name)
+                    try:
+                        snapshot[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        continue
+        return snapshot
+
+    def wait_changes(self, timeout: float = None, debounce: float = 0.05) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            time.sleep(self.interval)
+            snapshot = self.take_snapshot()
+            changed = {
+                path for path in set(snapshot) | set(self.snapshot)
+                if snapshot.get(path) != self.snapshot.get(path)
+            }
+            self.snapshot = snapshot
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(root: str):
+    """Vrátí inotify watcher, případně polling fallback"""
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError):
+        return PollingWatcher(root)
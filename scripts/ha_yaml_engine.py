@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Home Assistant YAML Parsing Engine
+Společné parsování YAML pro validate_ha_config.py a DIAGNOSTICS skenery:
+C loader (libyaml) pokud je dostupný, HA tagy (!include, !secret, ...)
+a paralelní parsování více souborů přes ProcessPoolExecutor
+"""
+
+import os
+import yaml
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# CSafeLoader je řádově rychlejší, čistý Python jen jako fallback
+BaseSafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+HAS_LIBYAML = BaseSafeLoader is not yaml.SafeLoader
+
+HA_TAGS = (
+    '!include',
+    '!secret',
+    '!include_dir_merge_named',
+    '!include_dir_merge_list',
+    '!include_dir_named',
+    '!include_dir_list',
+)
+SECRETS_FILE = "secrets.yaml"
+
+
+class HomeAssistantYAMLLoader(BaseSafeLoader):
+    """Custom YAML loader that recognizes Home Assistant tags"""
+
+    def __init__(self, stream):
+        super().__init__(stream)
+        # Odkazy (tag, hodnota, řádek) nalezené v dokumentu - pro include graf
+        self.ha_refs = []
+
+
+def ha_tag_constructor(loader, node):
+    """Handle Home Assistant tags - vrací zástupný text '<tag> <hodnota>'"""
+    value = loader.construct_scalar(node)
+    loader.ha_refs.append((node.tag, value, node.start_mark.line + 1))
+    return f"{node.tag} {value}"
+
+
+for _tag in HA_TAGS:
+    HomeAssistantYAMLLoader.add_constructor(_tag, ha_tag_constructor)
+
+
+class ParseResult(NamedTuple):
+    """Výsledek parsování jednoho souboru"""
+    path: str
+    data: Any
+    error: Optional[str]
+    is_yaml_error: bool
+    refs: tuple = ()
+
+
+def load_yaml_with_refs(stream) -> Tuple[Any, list]:
+    """Načte YAML a vrátí i seznam HA odkazů (!include, !secret, ...)"""
+    loader = HomeAssistantYAMLLoader(stream)
+    try:
+        return loader.get_single_data(), loader.ha_refs
+    finally:
+        loader.dispose()
+
+
+def load_yaml(stream) -> Any:
+    """Načte YAML (řetězec nebo soubor) s podporou HA tagů"""
+    return load_yaml_with_refs(stream)[0]
+
+
+def parse_file(path: str, return_data: bool = True) -> ParseResult:
+    """Naparsuje jeden soubor; chyby vrací ve výsledku místo vyhození"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data, refs = load_yaml_with_refs(f)
+        return ParseResult(str(path), data if return_data else None, None, False, tuple(refs))
+    except yaml.YAMLError as e:
+        return ParseResult(str(path), None, str(e), True)
+    except Exception as e:
+        return ParseResult(str(path), None, str(e), False)
+
+
+def _parse_file_without_data(path: str) -> ParseResult:
+    return parse_file(path, return_data=False)
+
+
+def _parse_graph_file(path: str) -> ParseResult:
+    # Data potřebujeme jen ze secrets.yaml (vyhledávání klíčů)
+    return parse_file(path, return_data=os.path.basename(path) == SECRETS_FILE)
+
+
+def default_jobs() -> int:
+    """Výchozí počet procesů - počet dostupných jader"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def parse_files(paths: Iterable[str], jobs: int = None, return_data: bool = True,
+                worker: Callable[[str], ParseResult] = None) -> Iterator[ParseResult]:
+    """Naparsuje soubory paralelně, výsledky vrací ve stejném pořadí jako vstup"""
+    paths = [str(path) for path in paths]
+    jobs = min(jobs or default_jobs(), len(paths))
+    if worker is None:
+        worker = parse_file if return_data else _parse_file_without_data
+
+    if jobs <= 1:
+        for path in paths:
+            yield worker(path)
+        return
+
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(worker, paths, chunksize=chunksize)
+
+
+def add_jobs_argument(parser):
+    """Přidá do argparse společnou volbu --jobs"""
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help=f"Počet paralelních procesů pro parsování YAML (výchozí: {default_jobs()})"
+    )
+
+
+def find_include_dir_files(directory: str) -> List[str]:
+    """Soubory načítané přes !include_dir_* (rekurzivně *.yaml, bez skrytých)"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        found.extend(
+            os.path.join(root, name)
+            for name in sorted(files)
+            if name.endswith('.yaml') and not name.startswith('.')
+        )
+    return found
+
+
+class IncludeGraph:
+    """Graf !include/!secret odkazů od configuration.yaml
+
+    Každý soubor se naparsuje právě jednou (sdílená cache výsledků), i když
+    ho includuje více rodičů. Soubory se parsují po vlnách paralelně.
+    Po změně souborů refresh() znovu naparsuje jen změněné soubory.
+    """
+
+    def __init__(self, config_dir: str, jobs: int = None):
+        self.config_dir = os.path.abspath(config_dir)
+        self.jobs = jobs
+        self.root = None
+        self.results: Dict[str, ParseResult] = {}
+        self.edges: Dict[str, List[str]] = {}
+        self.missing_by_file: Dict[str, List[str]] = {}
+        self.cycles: List[List[str]] = []
+
+    @property
+    def missing(self) -> List[str]:
+        """Všechny chybějící cíle (soubory, adresáře, secrets)"""
+        return [item for items in self.missing_by_file.values() for item in items]
+
+    def parse(self, paths: Iterable[str]):
+        """Naparsuje soubory, které ještě nejsou v cache"""
+        todo = [path for path in dict.fromkeys(paths) if path not in self.results]
+        for result in parse_files(todo, jobs=self.jobs, worker=_parse_graph_file):
+            self.results[result.path] = result
+
+    def resolve(self, root: str) -> "IncludeGraph":
+        """Projde celý graf od kořenového souboru"""
+        self.root = os.path.abspath(root)
+        self.refresh()
+        return self
+
+    def refresh(self, changed: Iterable[str] = ()) -> List[str]:
+        """Přepočítá graf po změně souborů, vrací dotčené soubory (změněné + jejich includery)
+
+        Parsují se znovu jen změněné soubory, hrany se přepočítají z uložených
+        odkazů (stačí stat cílů), takže i velký graf se obnoví v milisekundách.
+        """
+        changed = [os.path.abspath(path) for path in changed]
+        for path in changed:
+            self.results.pop(path, None)
+
+        old_edges, old_missing = self.edges, self.missing_by_file
+        self.edges = {}
+        self.missing_by_file = {}
+        self.cycles = []
+        if not os.path.isfile(self.root):
+            self.missing_by_file[self.root] = [f"Kořenový soubor neexistuje: {self.root}"]
+            return [self.root]
+
+        wave = [self.root]
+        while wave:
+            self.parse(wave)
+            next_wave = []
+            for path in wave:
+                if path in self.edges:
+                    continue
+                self.edges[path] = self.resolve_refs(path)
+                next_wave.extend(child for child in self.edges[path] if child not in self.edges)
+            wave = list(dict.fromkeys(next_wave))
+
+        self.find_cycles(self.root)
+
+        # Soubory, kterým se změnily odkazy (např. smazaný nebo nový cíl include)
+        relinked = [
+            path for path in self.edges
+            if self.edges[path] != old_edges.get(path)
+            or self.missing_by_file.get(path) != old_missing.get(path)
+        ]
+        return self.affected_by(changed + relinked)
+
+    def affected_by(self, changed: Iterable[str]) -> List[str]:
+        """Změněné soubory v grafu a všechny soubory, které je (i nepřímo) includují"""
+        reverse = self.includers()
+        affected = {}
+        stack = [path for path in changed if path in self.edges]
+        while stack:
+            path = stack.pop()
+            if path not in affected:
+                affected[path] = True
+                stack.extend(reverse.get(path, ()))
+        return list(affected)
+
+    def resolve_refs(self, path: str) -> List[str]:
+        """Převede odkazy v souboru na hrany grafu, chybějící cíle zaznamená"""
+        children = []
+        base_dir = os.path.dirname(path)
+
+        missing = []
+
+        for tag, value, line in self.results[path].refs:
+            location = f"{path}:{line}"
+            if tag == '!secret':
+                secrets_file = self.find_secret(path, value)
+                if secrets_file:
+                    children.append(secrets_file)
+                else:
+                    missing.append(f"Chybí secret '{value}' ({location})")
+                continue
+
+            target = os.path.normpath(os.path.join(base_dir, value))
+            if tag == '!include':
+                if os.path.isfile(target):
+                    children.append(target)
+                else:
+                    missing.append(f"Chybí soubor {value} ({location})")
+            elif os.path.isdir(target):
+                children.extend(find_include_dir_files(target))
+            else:
+                missing.append(f"Chybí adresář {value} pro {tag} ({location})")
+
+        if missing:
+            self.missing_by_file[path] = missing
+        return list(dict.fromkeys(children))
+
+    def find_secret(self, path: str, key: str) -> Optional[str]:
+        """Najde secrets.yaml s klíčem - od adresáře souboru nahoru po config_dir"""
+        directory = os.path.dirname(path)
+        while True:
+            secrets_file = os.path.join(directory, SECRETS_FILE)
+            if os.path.isfile(secrets_file):
+                self.parse([secrets_file])
+                data = self.results[secrets_file].data
+                if isinstance(data, dict) and key in data:
+                    return secrets_file
+            if directory == self.config_dir or os.path.dirname(directory) == directory:
+                return None
+            directory = os.path.dirname(directory)
+
+    def find_cycles(self, root: str):
+        """Najde cykly v include grafu (iterativní DFS)"""
+        state = {}
+        stack = [(root, iter(self.edges.get(root, ())))]
+        trail = [root]
+        state[root] = 1
+
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[node] = 2
+                stack.pop()
+                trail.pop()
+            elif state.get(child) == 1:
+                self.cycles.append(trail[trail.index(child):] + [child])
+            elif child not in state:
+                state[child] = 1
+                trail.append(child)
+                stack.append((child, iter(self.edges.get(child, ()))))
+
+    def includers(self) -> Dict[str, List[str]]:
+        """Obrácený graf: soubor -> soubory, které ho includují"""
+        reverse = {}
+        for parent, children in self.edges.items():
+            for child in children:
+                reverse.setdefault(child, []).append(parent)
+        return reverse
@@ -4,81 +4,151 @@ Home Assistant Configuration YAML Validator
 Handles custom Home Assistant tags (!include, !secret, etc.)
 """
 
+import os
 import sys
-import yaml
+import json
+import time
+import argparse
+from datetime import datetime
 from pathlib import Path
 
-class HomeAssistantYAMLLoader(yaml.SafeLoader):
-    """Custom YAML loader that recognizes Home Assistant tags"""
-    pass
+from ha_yaml_engine import IncludeGraph, parse_file, parse_files, add_jobs_argument
+from ha_inotify import open_watcher
 
-# Register Home Assistant custom tags
-def include_constructor(loader, node):
-    """Handle !include tag"""
-    return f"<{node.value}>"
+def validate_yaml_file(filepath):
+    """Validate a YAML file with Home Assistant custom tags support"""
+    result = parse_file(filepath, return_data=False)
+    return result.error is None, result.error
+
+def report_graph(graph, paths, json_lines=False):
+    """Print validation results for the given files of an include graph"""
+    all_valid = True
+    timestamp = datetime.now().isoformat(timespec='milliseconds')
+
+    for path in sorted(paths):
+        result = graph.results.get(path)
+        error = result.error if result else None
+        missing = graph.missing_by_file.get(path, [])
+        all_valid = all_valid and error is None and not missing
+
+        if json_lines:
+            print(json.dumps({
+                "time": timestamp,
+                "file": path,
+                "valid": error is None and not missing,
+                "error": error,
+                "missing": missing
+            }, ensure_ascii=False), flush=True)
+            continue
 
-def secret_constructor(loader, node):
-    """Handle !secret tag"""
-    return f"<secret: {node.value}>"
+        name = os.path.relpath(path, graph.config_dir)
+        if error is None:
+            print(f"✅ {name} - Validní YAML")
+        else:
+            print(f"❌ {name} - Chyba YAML:")
+            print(f"   {error}")
+        for item in missing:
+            print(f"❌ {item}")
 
-def include_dir_merge_named_constructor(loader, node):
-    """Handle !include_dir_merge_named tag"""
-    return f"<include_dir_merge_named: {node.value}>"
+    for cycle in graph.cycles:
+        all_valid = False
+        if json_lines:
+            print(json.dumps({"time": timestamp, "cycle": cycle}, ensure_ascii=False), flush=True)
+        else:
+            print(f"❌ Cyklický include: {' -> '.join(cycle)}")
 
-def include_dir_merge_list_constructor(loader, node):
-    """Handle !include_dir_merge_list tag"""
-    return f"<include_dir_merge_list: {node.value}>"
+    sys.stdout.flush()
+    return all_valid
 
-def include_dir_named_constructor(loader, node):
-    """Handle !include_dir_named tag"""
-    return f"<include_dir_named: {node.value}>"
+def validate_include_graph(root, jobs=None, json_lines=False):
+    """Validate configuration.yaml together with everything it includes"""
+    root = Path(root)
+    graph = IncludeGraph(root.parent, jobs=jobs).resolve(root)
 
-def include_dir_list_constructor(loader, node):
-    """Handle !include_dir_list tag"""
-    return f"<include_dir_list: {node.value}>"
+    if not json_lines:
+        print(f"🔗 Include graf: {len(graph.edges)} souborů od {root}")
+    return report_graph(graph, set(graph.edges) | set(graph.missing_by_file), json_lines)
 
-# Register constructors
-HomeAssistantYAMLLoader.add_constructor('!include', include_constructor)
-HomeAssistantYAMLLoader.add_constructor('!secret', secret_constructor)
-HomeAssistantYAMLLoader.add_constructor('!include_dir_merge_named', include_dir_merge_named_constructor)
-HomeAssistantYAMLLoader.add_constructor('!include_dir_merge_list', include_dir_merge_list_constructor)
-HomeAssistantYAMLLoader.add_constructor('!include_dir_named', include_dir_named_constructor)
-HomeAssistantYAMLLoader.add_constructor('!include_dir_list', include_dir_list_constructor)
+def watch_include_graph(root, jobs=None, json_lines=False):
+    """Re-validate changed files (and files including them) on every save"""
+    root = Path(root)
+    graph = IncludeGraph(root.parent, jobs=jobs).resolve(root)
+    watcher = open_watcher(graph.config_dir)
+
+    if not json_lines:
+        print(f"👀 Sleduji {graph.config_dir} ({type(watcher).__name__}), ukončete Ctrl+C")
+    report_graph(graph, set(graph.edges) | set(graph.missing_by_file), json_lines)
 
-def validate_yaml_file(filepath):
-    """Validate a YAML file with Home Assistant custom tags support"""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            yaml.load(f, Loader=HomeAssistantYAMLLoader)
-        return True, None
-    except yaml.YAMLError as e:
-        return False, str(e)
-    except Exception as e:
-        return False, str(e)
+        while True:
+            changed = watcher.wait_changes()
+            if not changed:
+                continue
+            started = time.monotonic()
+
+            # Změna adresáře (nebo přetečení fronty) zneplatní vše pod ním
+            for path in [p for p in changed if not p.endswith(('.yaml', '.yml'))]:
+                prefix = path.rstrip(os.sep) + os.sep
+                changed.update(p for p in graph.results if p.startswith(prefix))
+
+            affected = graph.refresh(changed)
+            if not json_lines:
+                elapsed = (time.monotonic() - started) * 1000
+                print(f"\n🔄 {datetime.now():%H:%M:%S} - {len(affected)} dotčených souborů ({elapsed:.1f} ms)")
+            report_graph(graph, affected, json_lines)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: validate_ha_config.py <yaml_file> [yaml_file2 ...]")
-        sys.exit(1)
-    
+    parser = argparse.ArgumentParser(
+        usage="validate_ha_config.py [-j N] [--resolve | --watch [--json]] <yaml_file> [yaml_file2 ...]",
+        description="Home Assistant Configuration YAML Validator"
+    )
+    parser.add_argument("files", nargs="+", help="YAML soubory k validaci")
+    parser.add_argument(
+        "--resolve", action="store_true",
+        help="Projít celý include graf od zadaného souboru (typicky configuration.yaml)"
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Sledovat změny (inotify) a validovat změněné soubory a soubory, které je includují"
+    )
+    parser.add_argument("--json", action="store_true", help="Výstup jako JSON lines (pro --resolve/--watch)")
+    add_jobs_argument(parser)
+    args = parser.parse_args()
+
+    if args.watch:
+        if len(args.files) != 1:
+            parser.error("--watch vyžaduje právě jeden kořenový soubor (configuration.yaml)")
+        watch_include_graph(args.files[0], jobs=args.jobs, json_lines=args.json)
+        sys.exit(0)
+
+    if args.resolve:
+        results = [validate_include_graph(root, jobs=args.jobs, json_lines=args.json) for root in args.files]
+        sys.exit(0 if all(results) else 1)
+
     all_valid = True
-    
-    for filepath in sys.argv[1:]:
-        path = Path(filepath)
-        if not path.exists():
+    existing = []
+
+    for filepath in args.files:
+        if not Path(filepath).exists():
             print(f"❌ Soubor neexistuje: {filepath}")
             all_valid = False
             continue
-        
-        is_valid, error = validate_yaml_file(filepath)
-        
-        if is_valid:
+        existing.append(filepath)
+
+    for result in parse_files(existing, jobs=args.jobs, return_data=False):
+        path = Path(result.path)
+
+        if result.error is None:
             print(f"✅ {path.name} - Validní YAML")
         else:
             print(f"❌ {path.name} - Chyba YAML:")
-            print(f"   {error}")
+            print(f"   {result.error}")
             all_valid = False
-    
+
     sys.exit(0 if all_valid else 1)
 
 if __name__ == '__main__':